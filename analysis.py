@@ -0,0 +1,130 @@
+import argparse
+import numpy as np
+
+DENSITY_BINS = 64
+DENSITY_WINDOW = 1000  # ms
+MIN_INTERVAL = 30  # ms
+
+
+def get_note_arrays(notes: dict) -> tuple:
+    """Used to turn the notes of a difficulty into timing and lane arrays.
+
+    Parameters
+    ----------
+    notes : dict
+        Note timings mapped to lane strings, as stored in difficulty JSON.
+
+    Returns
+    ----------
+    tuple
+        Sorted note timings, lanes of every note and timings of every chord.
+    """
+    assert isinstance(notes, dict), "notes must be a dict."
+    if not notes:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    chord_timings = np.fromiter((int(timing) for timing in notes), np.int64, len(notes))
+    keys = len(next(iter(notes.values())))
+    pressed = (
+        np.frombuffer("".join(notes.values()).encode(), dtype=np.uint8).reshape(
+            -1, keys
+        )
+        == ord("1")
+    )
+    order = np.argsort(chord_timings, kind="stable")
+    chord_timings = chord_timings[order]
+    chords, lanes = np.nonzero(pressed[order])
+    return chord_timings[chords], lanes, chord_timings
+
+
+def get_strain(intervals: np.ndarray) -> float:
+    """Used to get the strain of a sequence of note intervals.
+
+    The strain is the 95th percentile of the tap rate, so a few short bursts
+    count but a single flam does not dominate.
+
+    Parameters
+    ----------
+    intervals : np.ndarray
+        Intervals between notes in milliseconds.
+
+    Returns
+    ----------
+    float
+        Strain in taps per second.
+    """
+    if intervals.size == 0:
+        return 0.0
+    rates = 1000 / np.maximum(intervals, MIN_INTERVAL)
+    return float(np.percentile(rates, 95))
+
+
+def analyze_notes(notes: dict) -> dict:
+    """Used to compute density and strain values of a difficulty.
+
+    Parameters
+    ----------
+    notes : dict
+        Note timings mapped to lane strings, as stored in difficulty JSON.
+
+    Returns
+    ----------
+    dict
+        Notes per second, peak density and its timing, per-lane jack strain,
+        stream strain, density graph and the computed difficulty rating.
+    """
+    timings, lanes, chord_timings = get_note_arrays(notes)
+    keys = len(next(iter(notes.values()))) if notes else 0
+    if timings.size == 0:
+        return {
+            "nps": 0.0,
+            "peak_density": 0,
+            "peak_time": 0,
+            "jack_strain": [0.0] * keys,
+            "stream_strain": 0.0,
+            "density": [0] * DENSITY_BINS,
+            "stars": 0.0,
+        }
+
+    duration = max(int(timings[-1] - timings[0]), DENSITY_WINDOW)
+    nps = timings.size * 1000 / duration
+
+    window_ends = np.searchsorted(timings, timings + DENSITY_WINDOW, side="left")
+    window_counts = window_ends - np.arange(timings.size)
+    peak = int(np.argmax(window_counts))
+
+    order = np.lexsort((timings, lanes))
+    lane_timings = timings[order]
+    lane_intervals = np.diff(lane_timings)
+    same_lane = np.diff(lanes[order]) == 0
+    jack_strain = [
+        get_strain(lane_intervals[same_lane & (lanes[order][1:] == lane)])
+        for lane in range(keys)
+    ]
+    stream_strain = get_strain(np.diff(chord_timings))
+
+    density, _ = np.histogram(timings, bins=DENSITY_BINS)
+    stars = np.sqrt(
+        0.5 * window_counts[peak] + 0.3 * max(jack_strain) + 0.2 * stream_strain
+    )
+    return {
+        "nps": round(float(nps), 2),
+        "peak_density": int(window_counts[peak]),
+        "peak_time": int(timings[peak]),
+        "jack_strain": [round(strain, 2) for strain in jack_strain],
+        "stream_strain": round(stream_strain, 2),
+        "density": density.tolist(),
+        "stars": round(float(stars), 2),
+    }
+
+
+if __name__ == "__main__":
+    import chart
+
+    parser = argparse.ArgumentParser(description="Analyze all installed charts.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    arguments = parser.parse_args()
+    index = chart.ChartIndex(auto_rebuild=False)
+    index.rebuild(workers=arguments.workers)
+    index.save()
+    print(f"Analyzed {len(index.charts)} charts.")
@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+
+CHUNK_SIZE = 1 << 20
+
+
+def get_file_hash(file_path: str) -> str:
+    """Used to get the SHA-256 hash of a file's content.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file.
+
+    Returns
+    ----------
+    str
+        Hexadecimal hash of the file.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as stream:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AssetStore:
+    """The class used to represent a content-addressed store of chart assets.
+
+    Every audio and background file is stored once under src/assets, keyed by
+    the SHA-256 hash of its content plus the original file extension. Charts
+    reference these keys instead of carrying their own copies.
+
+    Methods
+    -------
+    get_path(key)
+        Used to get the location of a stored asset.
+    contains(key)
+        Used to check if an asset is stored.
+    put_file(file_path)
+        Used to add a file to the store.
+    put_stream(stream, extension)
+        Used to add the content of a binary stream to the store.
+    migrate_chart(chart_name)
+        Used to move the assets of a chart folder into the store.
+    migrate()
+        Used to move the assets of all chart folders into the store.
+    """
+
+    def __init__(self) -> None:
+        self.root = os.path.join(os.path.dirname(__file__), "src", "assets")
+        self.charts_directory = os.path.join(os.path.dirname(__file__), "src", "charts")
+
+    def get_path(self, key: str) -> str:
+        """Used to get the location of a stored asset.
+
+        Parameters
+        ----------
+        key : str
+            Asset key.
+
+        Returns
+        ----------
+        str
+            Path to the asset file.
+        """
+        assert isinstance(key, str), "key must be str."
+        return os.path.join(self.root, key[:2], key)
+
+    def contains(self, key: str) -> bool:
+        """Used to check if an asset is stored.
+
+        Parameters
+        ----------
+        key : str
+            Asset key.
+
+        Returns
+        ----------
+        bool
+            The asset is stored.
+        """
+        return os.path.isfile(self.get_path(key))
+
+    def put_file(self, file_path: str) -> str:
+        """Used to add a file to the store.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to the file.
+
+        Returns
+        ----------
+        str
+            Asset key.
+        """
+        assert isinstance(file_path, str), "file_path must be str."
+        with open(file_path, "rb") as stream:
+            return self.put_stream(stream, os.path.splitext(file_path)[1])
+
+    def put_stream(self, stream, extension: str) -> str:
+        """Used to add the content of a binary stream to the store.
+
+        The content is hashed while it is written to a temporary file, which is
+        then renamed to its key, so concurrent imports of the same file are safe.
+
+        Parameters
+        ----------
+        stream : io.BufferedIOBase
+            Binary stream with the asset content.
+        extension : str
+            File extension of the asset, including the dot.
+
+        Returns
+        ----------
+        str
+            Asset key.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.root)
+        try:
+            with os.fdopen(descriptor, "wb") as temporary_file:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    temporary_file.write(chunk)
+            key = digest.hexdigest() + extension.lower()
+            if self.contains(key):
+                os.remove(temporary_path)
+            else:
+                os.makedirs(os.path.dirname(self.get_path(key)), exist_ok=True)
+                os.replace(temporary_path, self.get_path(key))
+        except OSError:
+            if os.path.isfile(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return key
+
+    def migrate_chart(self, chart_name: str) -> int:
+        """Used to move the assets of a chart folder into the store.
+
+        Every difficulty of the chart gets an audio_blob and background_blob
+        reference, and the folder copies are removed afterwards.
+
+        Parameters
+        ----------
+        chart_name : str
+            The name of the chart folder.
+
+        Returns
+        ----------
+        int
+            Number of bytes removed from the chart folder.
+        """
+        assert isinstance(chart_name, str), "chart_name must be str."
+        chart_directory = os.path.join(self.charts_directory, chart_name)
+        keys = dict()
+        for file_name in os.listdir(chart_directory):
+            if not file_name.endswith(".json"):
+                continue
+            json_location = os.path.join(chart_directory, file_name)
+            with open(json_location, "r") as read_difficulty:
+                data = json.load(read_difficulty)
+            general = data["general"]
+            for field in ("audio", "background"):
+                asset_name = general.get(field)
+                asset_location = os.path.join(chart_directory, str(asset_name))
+                if asset_name and asset_name not in keys:
+                    if not os.path.isfile(asset_location):
+                        continue
+                    keys[asset_name] = self.put_file(asset_location)
+                if asset_name in keys:
+                    general[f"{field}_blob"] = keys[asset_name]
+            with open(json_location, "w") as write_difficulty:
+                json.dump(data, write_difficulty)
+
+        freed = 0
+        for asset_name in keys:
+            asset_location = os.path.join(chart_directory, asset_name)
+            freed += os.path.getsize(asset_location)
+            os.remove(asset_location)
+        return freed
+
+    def migrate(self) -> int:
+        """Used to move the assets of all chart folders into the store.
+
+        Returns
+        ----------
+        int
+            Number of bytes removed from chart folders.
+        """
+        freed = 0
+        for entry in os.scandir(self.charts_directory):
+            if entry.is_dir():
+                freed += self.migrate_chart(entry.name)
+        return freed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the chart asset store.")
+    parser.add_argument("command", choices=["migrate"], help="command to run")
+    arguments = parser.parse_args()
+    store = AssetStore()
+    freed = store.migrate()
+    print(f"Moved chart assets into the store, {freed / (1 << 20):.1f} MiB freed.")
@@ -1,5 +1,329 @@
+from collections import OrderedDict
 from pygame import mixer
+import pygame
+import io
 import os
+import queue
+import threading
+import time
+
+SONG_CACHE_BUDGET = 64 * 1024 * 1024  # bytes
+CALIBRATION_BUFFERS = (4096, 2048, 1024, 512, 256, 128, 64)
+HITSOUND_VOICES = 8
+
+
+class HitsoundPool:
+    """Class used to play hit sounds on reserved mixer channels.
+
+    The channels are handed out round-robin, so at most `voices` hit sounds
+    play at once and the oldest one is cut first, which counts as stolen.
+    Triggers within the same millisecond are merged into one sound.
+
+    Methods
+    -------
+    play()
+        Used to play the hit sound.
+    get_stats()
+        Used to get played, merged and stolen hit counters.
+    """
+
+    def __init__(self, sound: mixer.Sound, voices: int = HITSOUND_VOICES) -> None:
+        """
+        Parameters
+        ----------
+        sound : mixer.Sound
+            Hit sound.
+        voices : int
+            Number of reserved channels, the maximum number of hit sounds
+            playing at once.
+
+        Raises
+        ------
+        AssertionError
+            voices is not a positive integer.
+        """
+        assert isinstance(voices, int) and voices > 0, "voices must be positive."
+        if mixer.get_num_channels() < voices * 2:
+            mixer.set_num_channels(voices * 2)
+        mixer.set_reserved(voices)
+        self.sound = sound
+        self.channels = [mixer.Channel(index) for index in range(voices)]
+        self.next_channel = 0
+        self.last_trigger = -1
+        self.played = 0
+        self.merged = 0
+        self.stolen = 0
+
+    def play(self) -> bool:
+        """Used to play the hit sound.
+
+        Returns
+        ----------
+        bool
+            The sound was played, False if it was merged with the previous one.
+        """
+        now = time.perf_counter_ns() // 1_000_000
+        if now == self.last_trigger:
+            self.merged += 1
+            return False
+        self.last_trigger = now
+        channel = self.channels[self.next_channel]
+        if channel.get_busy():
+            self.stolen += 1
+        channel.play(self.sound)
+        self.next_channel = (self.next_channel + 1) % len(self.channels)
+        self.played += 1
+        return True
+
+    def get_stats(self) -> dict:
+        """Used to get played, merged and stolen hit counters.
+
+        Returns
+        ----------
+        dict
+            Played and merged hits, hits that cut a still playing one and the
+            number of busy channels.
+        """
+        return {
+            "played": self.played,
+            "merged": self.merged,
+            "stolen": self.stolen,
+            "busy": sum(channel.get_busy() for channel in self.channels),
+        }
+
+
+class AudioCache:
+    """Class used to keep audio in memory between players.
+
+    The hit sound is decoded once per process. Song files are kept in memory,
+    least recently used first out, within a memory budget, so retrying or
+    switching back to a chart does not read the file again.
+
+    Methods
+    -------
+    get_hit_sound()
+        Used to get the decoded hit sound.
+    get_hitsound_pool()
+        Used to get the pool of reserved hit sound channels.
+    get_song(song_source)
+        Used to get a stream with the content of a song file.
+    get_stats()
+        Used to get cache hit and miss counters.
+    """
+
+    def __init__(self, memory_budget: int = SONG_CACHE_BUDGET) -> None:
+        """
+        Parameters
+        ----------
+        memory_budget : int
+            Maximum number of bytes of song data kept in memory.
+        """
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+        self.hit_sound = None
+        self.hitsound_pool = None
+        self.songs = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_hit_sound(self) -> mixer.Sound:
+        """Used to get the decoded hit sound.
+
+        Returns
+        ----------
+        mixer.Sound
+            Hit sound.
+        """
+        if self.hit_sound is None:
+            self.misses += 1
+            self.hit_sound = mixer.Sound(os.path.join("src", "hitsounds", "hit.wav"))
+        else:
+            self.hits += 1
+        return self.hit_sound
+
+    def get_hitsound_pool(self) -> HitsoundPool:
+        """Used to get the pool of reserved hit sound channels.
+
+        Returns
+        ----------
+        HitsoundPool
+            Hit sound channel pool.
+        """
+        if self.hitsound_pool is None:
+            self.hitsound_pool = HitsoundPool(self.get_hit_sound())
+        return self.hitsound_pool
+
+    def get_song(self, song_source: str) -> io.BytesIO:
+        """Used to get a stream with the content of a song file.
+
+        Parameters
+        ----------
+        song_source : str
+            Song file location.
+
+        Returns
+        ----------
+        io.BytesIO
+            Stream with the song file content.
+        """
+        with self.lock:
+            if song_source in self.songs:
+                self.hits += 1
+                self.songs.move_to_end(song_source)
+                return io.BytesIO(self.songs[song_source])
+            self.misses += 1
+
+        with open(song_source, "rb") as song_file:
+            data = song_file.read()
+        with self.lock:
+            if song_source not in self.songs:
+                self.songs[song_source] = data
+                self.memory_used += len(data)
+            while self.memory_used > self.memory_budget and len(self.songs) > 1:
+                _, evicted = self.songs.popitem(last=False)
+                self.memory_used -= len(evicted)
+        return io.BytesIO(data)
+
+    def get_stats(self) -> dict:
+        """Used to get cache hit and miss counters.
+
+        Returns
+        ----------
+        dict
+            Hits, misses, number of cached songs and bytes used.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "songs": len(self.songs),
+            "memory_used": self.memory_used,
+        }
+
+
+cache = AudioCache()
+
+
+class PreviewPlayer:
+    """Class used to play song previews in the chart select menu.
+
+    Song files are read by a worker thread, so the main thread only hands the
+    loaded data to the mixer. Every request gets a generation number; a request
+    that is replaced before it is loaded is dropped.
+
+    Methods
+    -------
+    request(song_source, start)
+        Used to request a preview of a song.
+    fade_out()
+        Used to fade out the playing preview.
+    stop(fade=True)
+        Used to stop the preview and cancel pending requests.
+    load_previews()
+        Used by the worker thread to load requested songs.
+    update(volume)
+        Used to start the preview once its song is loaded.
+    """
+
+    fade_time = 600  # ms
+    hover_delay = 150  # ms
+
+    def __init__(self) -> None:
+        self.generation = 0
+        self.requested = None
+        self.loaded = None
+        self.playing_source = None
+        self.fade_end = 0.0
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self.load_previews, daemon=True)
+        self.worker.start()
+
+    def request(self, song_source: str, start: int) -> None:
+        """Used to request a preview of a song.
+
+        Parameters
+        ----------
+        song_source : str
+            Song file location.
+        start : int
+            Preview start in milliseconds.
+        """
+        self.generation += 1
+        self.loaded = None
+        if song_source == self.playing_source:
+            self.requested = None
+            return
+        self.requested = (self.generation, song_source, start, time.perf_counter())
+        self.fade_out()
+
+    def fade_out(self) -> None:
+        """Used to fade out the playing preview."""
+        if self.playing_source is not None:
+            mixer.music.fadeout(self.fade_time)
+            self.fade_end = time.perf_counter() + self.fade_time / 1000
+            self.playing_source = None
+
+    def stop(self, fade: bool = True) -> None:
+        """Used to stop the preview and cancel pending requests.
+
+        Parameters
+        ----------
+        fade : bool
+            Fade the preview out instead of stopping it at once.
+        """
+        self.generation += 1
+        self.requested = None
+        self.loaded = None
+        if fade:
+            self.fade_out()
+        elif self.playing_source is not None:
+            mixer.music.stop()
+            self.playing_source = None
+
+    def load_previews(self) -> None:
+        """Used by the worker thread to load requested songs."""
+        while True:
+            generation, song_source, start = self.requests.get()
+            if generation != self.generation:
+                continue
+            try:
+                song_stream = cache.get_song(song_source)
+            except OSError:
+                continue
+            if generation == self.generation:
+                self.loaded = (generation, song_source, start, song_stream)
+
+    def update(self, volume: float) -> None:
+        """Used to start the preview once its song is loaded.
+
+        Parameters
+        ----------
+        volume : float
+            Playback volume.
+        """
+        if self.requested is not None:
+            generation, song_source, start, requested_at = self.requested
+            if (time.perf_counter() - requested_at) * 1000 >= self.hover_delay:
+                self.requests.put((generation, song_source, start))
+                self.requested = None
+
+        loaded = self.loaded
+        if loaded is None or loaded[0] != self.generation:
+            return
+        if time.perf_counter() < self.fade_end:
+            return
+        self.loaded = None
+        _, song_source, start, song_stream = loaded
+        try:
+            mixer.music.load(song_stream, song_source)
+            mixer.music.set_volume(volume)
+            mixer.music.play(start=max(start, 0) / 1000, fade_ms=self.fade_time)
+        except pygame.error as error:
+            print(f"Caught {type(error)}: error")
+            return
+        AudioPlayer.song_stream = song_stream
+        AudioPlayer.loaded_source = song_source
+        self.playing_source = song_source
 
 
 class AudioPlayer:
@@ -10,17 +334,24 @@ class AudioPlayer:
 
     Methods
     -------
-    on_execute(frequency=44100, size=16, channels=2, buffer=4096, volume=0.1)
-        Used to set playback parameters and initialize the audio player.
+    configure_mixer(frequency=44100, buffer=512, size=-16, channels=2)
+        Used to set playback parameters before the mixer is initialized.
+    load_song()
+        Used to load the song into the mixer.
     change_volume(song_volume)
         Used to set the playback volume.
-    play_song()
+    play_song(start)
         Used for playing music.
+    play_hitsound()
+        Used to play the hit sound on a reserved channel.
     update()
         Used to update the playback timer.
     """
 
-    def __init__(self, song_bpm: float, song_source: str) -> None:
+    loaded_source = None
+    song_stream = None
+
+    def __init__(self, song_bpm: float, song_source: str, offset: int = 0) -> None:
         """
         Parameters
         ----------
@@ -28,37 +359,51 @@ class AudioPlayer:
             BPM of the song to be played.
         song_source : str
             Song file location.
+        offset : int
+            Audio offset in milliseconds, subtracted from the playback position.
         """
         self.mixer = mixer
-        self.hitSound = self.mixer.Sound(os.path.join("src", "hitsounds", "hit.wav"))
+        self.offset = offset
+        self.hitSound = cache.get_hit_sound()
+        self.hitsounds = cache.get_hitsound_pool()
         self.song_bpm = song_bpm
         self.songPosition = 0
+        self.start_position = 0
         self.song_source = song_source
-        self.mixer.music.load(self.song_source)
+        self.load_song()
 
-    def on_execute(self, frequency=44100, size=16, channels=2, buffer=4096, volume=0.1):
-        """Used to set playback parameters and initialize the audio player.
+    def load_song(self) -> None:
+        """Used to load the song into the mixer.
 
-        If no parameters are passed, the default settings are used.
+        The song is not loaded again if it is already the current music.
+        """
+        if AudioPlayer.loaded_source == self.song_source:
+            return
+        AudioPlayer.song_stream = cache.get_song(self.song_source)
+        self.mixer.music.load(AudioPlayer.song_stream, self.song_source)
+        AudioPlayer.loaded_source = self.song_source
+
+    @staticmethod
+    def configure_mixer(frequency=44100, buffer=512, size=-16, channels=2) -> None:
+        """Used to set playback parameters before the mixer is initialized.
+
+        It must be called before pg.init, which initializes the mixer with
+        these parameters.
 
         Parameters
         ----------
         frequency : int
             Audio file playback frequency.
+        buffer : int
+            Buffer size (in samples). Smaller buffers lower the hit sound latency.
         size : int
-            Number of bits to represent audio data.
+            Number of bits to represent audio data, negative for signed samples.
         channels : int
             Number of audio channels
-        buffer : int
-            Buffer size (in bytes)
-        volume : int
-            Playback volume.
         """
-        self.mixer.pre_init(
+        mixer.pre_init(
             frequency=frequency, size=size, channels=channels, buffer=buffer
         )
-        self.mixer.init()
-        self.change_volume(volume)
 
     def change_volume(self, song_volume: float):
         """Used to set the playback volume.
@@ -83,10 +428,103 @@ class AudioPlayer:
             )
         self.mixer.music.set_volume(song_volume)
 
-    def play_song(self):
-        """Used for playing music."""
-        self.mixer.music.play()
+    def play_song(self, start: int = 0):
+        """Used for playing music.
+
+        Parameters
+        ----------
+        start : int
+            Song position to start from in milliseconds.
+        """
+        self.start_position = start
+        self.mixer.music.play(start=start / 1000)
+
+    def play_hitsound(self):
+        """Used to play the hit sound on a reserved channel."""
+        self.hitsounds.play()
 
     def update(self):
         """Used to update the playback timer."""
-        self.songPosition = self.mixer.music.get_pos() + 800
+        self.songPosition = (
+            self.mixer.music.get_pos() + self.start_position - self.offset
+        )
+
+
+def measure_buffer_stability(frequency: int, buffer: int, duration: float) -> bool:
+    """Used to check if the mixer plays without underruns with a buffer size.
+
+    A looped sound is played while the music position is compared with a
+    monotonic clock. If the position stalls for much longer than one buffer, or
+    falls behind the clock, the audio callback could not keep up.
+
+    Parameters
+    ----------
+    frequency : int
+        Audio playback frequency.
+    buffer : int
+        Buffer size (in samples).
+    duration : float
+        Measurement time in seconds.
+
+    Returns
+    ----------
+    bool
+        The buffer size is stable.
+    """
+    buffer_time = buffer / frequency * 1000
+    mixer.quit()
+    cache.hit_sound = None
+    cache.hitsound_pool = None
+    AudioPlayer.configure_mixer(frequency=frequency, buffer=buffer)
+    mixer.init()
+    mixer.music.load(os.path.join("src", "hitsounds", "hit.wav"))
+    mixer.music.set_volume(0)
+    mixer.music.play(loops=-1)
+
+    start = time.perf_counter()
+    last_position = mixer.music.get_pos()
+    last_change = start
+    longest_stall = 0.0
+    now = start
+    while now - start < duration:
+        time.sleep(0.001)
+        now = time.perf_counter()
+        position = mixer.music.get_pos()
+        if position != last_position:
+            longest_stall = max(longest_stall, (now - last_change) * 1000)
+            last_position = position
+            last_change = now
+    drift = (now - start) * 1000 - last_position
+    mixer.music.stop()
+    mixer.music.unload()
+    AudioPlayer.loaded_source = None
+    return longest_stall <= 3 * buffer_time + 15 and abs(drift) <= 2 * buffer_time + 20
+
+
+def calibrate_buffer(frequency=44100, buffers=CALIBRATION_BUFFERS, duration=1.5):
+    """Used to find the smallest buffer size that plays without underruns.
+
+    Buffer sizes are tried from the largest to the smallest, and the search
+    stops at the first unstable one.
+
+    Parameters
+    ----------
+    frequency : int
+        Audio playback frequency.
+    buffers : tuple
+        Buffer sizes to try, in decreasing order.
+    duration : float
+        Measurement time for each buffer size in seconds.
+
+    Returns
+    ----------
+    int or None
+        Smallest stable buffer size, or None if no buffer size is stable.
+    """
+    stable_buffer = None
+    for buffer in buffers:
+        if not measure_buffer_stability(frequency, buffer, duration):
+            break
+        stable_buffer = buffer
+    mixer.quit()
+    return stable_buffer
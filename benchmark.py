@@ -0,0 +1,101 @@
+import argparse
+import os
+import time
+
+from pygame import mixer
+
+import audioplayer
+import settings
+
+
+def benchmark_hitsounds(rate: int, duration: float) -> dict:
+    """Used to fire hit sounds at a fixed rate and measure how the mixer keeps up.
+
+    Hits are scheduled on a monotonic clock while a muted song loops. The
+    report contains the cost of each trigger, how late the triggers ran, how
+    long the song position stalled and the hit sound pool counters, including
+    the hits that cut off a still playing one.
+
+    Parameters
+    ----------
+    rate : int
+        Hits per second.
+    duration : float
+        Benchmark time in seconds.
+
+    Returns
+    ----------
+    dict
+        Benchmark results.
+    """
+    assert isinstance(rate, int) and rate > 0, "rate must be a positive integer."
+    pool = audioplayer.cache.get_hitsound_pool()
+    mixer.music.load(os.path.join("src", "hitsounds", "hit.wav"))
+    mixer.music.set_volume(0)
+    mixer.music.play(loops=-1)
+
+    interval = 1 / rate
+    trigger_times = []
+    lateness = []
+    max_busy = 0
+    last_position = mixer.music.get_pos()
+    start = time.perf_counter()
+    last_change = start
+    longest_stall = 0.0
+    next_hit = start
+    while next_hit - start < duration:
+        now = time.perf_counter()
+        if now < next_hit:
+            continue
+        lateness.append((now - next_hit) * 1000)
+        pool.play()
+        trigger_times.append((time.perf_counter() - now) * 1_000_000)
+        next_hit += interval
+
+        position = mixer.music.get_pos()
+        if position != last_position:
+            longest_stall = max(longest_stall, (now - last_change) * 1000)
+            last_position = position
+            last_change = now
+        max_busy = max(max_busy, pool.get_stats()["busy"])
+    mixer.music.stop()
+
+    trigger_times.sort()
+    lateness.sort()
+    stats = pool.get_stats()
+    return {
+        "hits": len(trigger_times),
+        "played": stats["played"],
+        "merged": stats["merged"],
+        "stolen": stats["stolen"],
+        "max_busy_voices": max_busy,
+        "voices": len(pool.channels),
+        "trigger_p50_us": trigger_times[len(trigger_times) // 2],
+        "trigger_p99_us": trigger_times[int(len(trigger_times) * 0.99)],
+        "lateness_p99_ms": lateness[int(len(lateness) * 0.99)],
+        "longest_stall_ms": longest_stall,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Koli Rhythm benchmarks.")
+    parser.add_argument("benchmark", choices=["hitsounds"], help="benchmark to run")
+    parser.add_argument("--rate", type=int, default=5000, help="hits per second")
+    parser.add_argument("--seconds", type=float, default=3.0, help="benchmark time")
+    arguments = parser.parse_args()
+
+    game_settings = settings.Settings()
+    audioplayer.AudioPlayer.configure_mixer(
+        frequency=game_settings.audio_frequency, buffer=game_settings.audio_buffer
+    )
+    mixer.init()
+    results = benchmark_hitsounds(arguments.rate, arguments.seconds)
+    for name, value in results.items():
+        print(f"{name}: {round(value, 2)}")
+    if results["stolen"]:
+        share = results["stolen"] / results["played"] * 100
+        print(f"{results['stolen']} hit sounds ({share:.1f}%) cut off a playing one.")
+    buffer_time = game_settings.audio_buffer / game_settings.audio_frequency * 1000
+    if results["longest_stall_ms"] > 3 * buffer_time + 15:
+        print("FAILED: the audio thread did not keep up.")
+    mixer.quit()
@@ -1,5 +1,29 @@
-from json import load
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+from json import dump, dumps, load
 import os
+import analysis
+import assets
+
+INDEX_VERSION = 3
+MIN_ONSET_CONFIDENCE = 3.0  # standard deviations
+
+
+def get_note_hash(notes: dict) -> str:
+    """Used to get the hash that identifies the notes of a difficulty.
+
+    Parameters
+    ----------
+    notes : dict
+        Note timings mapped to lane strings, as stored in difficulty JSON.
+
+    Returns
+    ----------
+    str
+        Hexadecimal SHA-256 hash of the notes in a canonical form.
+    """
+    canonical = dumps(notes, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
 
 
 class Difficulty:
@@ -14,12 +38,16 @@ class Difficulty:
         Gets difficulty data from a JSON file.
     """
 
-    def __init__(self, json_name: str) -> None:
+    def __init__(self, json_name: str, cached_entry=None) -> None:
         """
         Parameters
         ----------
         json_name : str
             The name of the json
+        cached_entry : dict, optional
+            Entry of the difficulty in the chart index. The note hash is
+            reused while the file is unchanged, and the analysis while the
+            notes are unchanged. Both are computed if missing.
 
         Raises
         ----------
@@ -27,11 +55,24 @@ class Difficulty:
             json_name is not string.
         """
         assert isinstance(json_name, str), "json_name must be str."
+        cached_entry = cached_entry or dict()
         self.map_directory = os.path.join(os.path.dirname(__file__), "src", "charts")
         self.json_location = os.path.join(
             os.path.dirname(__file__), "src", "charts", json_name
         )
         self.get_difficulty_data(self.json_location)
+        self.mtime = os.path.getmtime(self.json_location)
+        unchanged = cached_entry.get("mtime") == self.mtime
+        self.hash = cached_entry.get("note_hash") if unchanged else None
+        if self.hash is None:
+            self.hash = get_note_hash(self.notes)
+        cached_analysis = None
+        if unchanged or cached_entry.get("note_hash") == self.hash:
+            cached_analysis = cached_entry.get("analysis")
+        if cached_analysis is None:
+            cached_analysis = analysis.analyze_notes(self.notes)
+        self.analysis = cached_analysis
+        self.stars = self.analysis["stars"]
 
     def get_difficulty_data(self, json_location: str) -> None:
         """Gets difficulty data from a JSON file.
@@ -59,8 +100,12 @@ class Difficulty:
                 self.difficulty = data["metadata"]["difficulty"]
                 self.rating = data["metadata"]["rating"]
                 self.notes = data["notes"]
+                self.timing_points = data.get("timing_points", [])
                 self.audio = os.path.join(data["general"]["audio"])
                 self.background = data["general"]["background"]
+                self.audio_blob = data["general"].get("audio_blob")
+                self.background_blob = data["general"].get("background_blob")
+                self.preview = data["general"].get("preview", -1)
         except FileNotFoundError as error:
             print(f"Caught {type(error)}: error")
 
@@ -79,14 +124,20 @@ class Chart:
         Used to get all difficulties sorted by rating.
     get_difficulty_names()
         Used to get all difficulty names.
+    get_asset_location(file_name, blob)
+        Used to get the location of an audio or background file.
+    get_hash()
+        Used to get the hash that identifies the song of the chart.
     """
 
-    def __init__(self, chart_name: str) -> None:
+    def __init__(self, chart_name: str, cached_entry=None) -> None:
         """
         Parameters
         ----------
         chart_name : str
             The name of the chart.
+        cached_entry : dict, optional
+            Entry of the chart in the chart index, used to reuse analyses.
 
         Raises
         ------
@@ -94,6 +145,8 @@ class Chart:
             chart_name is not string.
         """
         assert isinstance(chart_name, str), "chart_name must be str."
+        self.chart_name = chart_name
+        self.cached_entry = cached_entry or dict()
         self.map_absolute_path = os.path.join(
             os.path.dirname(__file__), "src", "charts", chart_name
         )
@@ -102,10 +155,13 @@ class Chart:
         self.artist = self.difficulties[0].artist
         self.mapper = self.difficulties[0].mapper
         self.bpm = self.difficulties[0].bpm
-        self.audio = os.path.join(self.map_absolute_path, self.difficulties[0].audio)
-        self.background = os.path.join(
-            self.map_absolute_path, self.difficulties[0].background
+        self.audio = self.get_asset_location(
+            self.difficulties[0].audio, self.difficulties[0].audio_blob
         )
+        self.background = self.get_asset_location(
+            self.difficulties[0].background, self.difficulties[0].background_blob
+        )
+        self.hash = None
 
     def get_all_json_files(self) -> list:
         """Searches for a JSON files in a map directory.
@@ -129,7 +185,10 @@ class Chart:
             print(f"Caught {type(error)}: error")
 
     def get_all_difficulties(self) -> list:
-        """Used to get all difficulties sorted by rating.
+        """Used to get all difficulties sorted by computed rating.
+
+        Note hashes and analyses from the cached chart index entry are reused
+        for difficulties that have not changed.
 
         Returns
         ----------
@@ -137,12 +196,13 @@ class Chart:
             All difficulties.
         """
         json_files = self.get_all_json_files()
+        cached_difficulties = self.cached_entry.get("difficulties", dict())
         difficulties = []
         for filename in json_files:
             file_path = os.path.join(self.map_absolute_path, filename)
-            difficulty = Difficulty(file_path)
+            difficulty = Difficulty(file_path, cached_difficulties.get(filename))
             difficulties.append(difficulty)
-        difficulties.sort(key=lambda x: x.rating)
+        difficulties.sort(key=lambda x: x.stars)
         return difficulties
 
     def get_difficulty_names(self) -> list:
@@ -154,7 +214,289 @@ class Chart:
             Names of all difficulties.
         """
         names = []
-        difficulties = self.get_all_difficulties()
-        for difficulty in difficulties:
+        for difficulty in self.difficulties:
             names.append(difficulty.difficulty)
         return names
+
+    def get_asset_location(self, file_name: str, blob) -> str:
+        """Used to get the location of an audio or background file.
+
+        Charts that were moved into the asset store reference their files by
+        blob key; older charts keep them next to the difficulty files.
+
+        Parameters
+        ----------
+        file_name : str
+            File name relative to the chart folder.
+        blob : str or None
+            Asset store key of the file.
+
+        Returns
+        ----------
+        str
+            Location of the file.
+        """
+        if blob:
+            store = assets.AssetStore()
+            if store.contains(blob):
+                return store.get_path(blob)
+        return os.path.join(self.map_absolute_path, file_name)
+
+    def get_hash(self) -> str:
+        """Used to get the hash that identifies the song of the chart.
+
+        It is taken from the asset store key when the chart was moved into
+        the store. Results are keyed by the note hash of their difficulty
+        instead.
+
+        Returns
+        ----------
+        str
+            Hexadecimal hash of the chart.
+        """
+        if self.hash is None:
+            blob = self.difficulties[0].audio_blob
+            if blob:
+                self.hash = os.path.splitext(blob)[0]
+            else:
+                self.hash = assets.get_file_hash(self.audio)
+        return self.hash
+
+
+def get_chart_entry(chart_name: str, cached_entry=None):
+    """Used to build the chart index entry of a chart folder.
+
+    Parameters
+    ----------
+    chart_name : str
+        The name of the chart folder.
+    cached_entry : dict, optional
+        Previous index entry of the chart.
+
+    Returns
+    ----------
+    dict or None
+        Chart index entry, or None if the folder has no difficulties.
+    """
+    chart_directory = os.path.join(
+        os.path.dirname(__file__), "src", "charts", chart_name
+    )
+    if not any(name.endswith(".json") for name in os.listdir(chart_directory)):
+        return None
+    chart = Chart(chart_name, cached_entry)
+    cached_difficulties = chart.cached_entry.get("difficulties", dict())
+    difficulties = dict()
+    for difficulty in chart.difficulties:
+        file_name = os.path.basename(difficulty.json_location)
+        difficulties[file_name] = {
+            "difficulty": difficulty.difficulty,
+            "rating": difficulty.rating,
+            "stars": difficulty.stars,
+            "mtime": difficulty.mtime,
+            "note_hash": difficulty.hash,
+            "analysis": difficulty.analysis,
+        }
+        cached = cached_difficulties.get(file_name, dict())
+        if cached.get("note_hash") == difficulty.hash:
+            if "onset_offset" in cached:
+                difficulties[file_name]["onset_offset"] = cached["onset_offset"]
+    entry = {
+        "title": chart.title,
+        "artist": chart.artist,
+        "mapper": chart.mapper,
+        "bpm": chart.bpm,
+        "audio": chart.audio,
+        "preview": chart.difficulties[0].preview,
+        "peak_time": chart.difficulties[-1].analysis["peak_time"],
+        "difficulties": difficulties,
+    }
+    suggested_offset = get_suggested_offset(difficulties)
+    if suggested_offset is not None:
+        entry["suggested_offset"] = suggested_offset
+    return entry
+
+
+def get_suggested_offset(difficulties: dict):
+    """Used to get the offset suggested by onset detection for a chart.
+
+    Parameters
+    ----------
+    difficulties : dict
+        Difficulty entries of a chart index entry.
+
+    Returns
+    ----------
+    int or None
+        Median of the detected difficulty offsets in milliseconds, or None if
+        no difficulty was detected with at least MIN_ONSET_CONFIDENCE.
+    """
+    detected = sorted(
+        item["onset_offset"]["offset"]
+        for item in difficulties.values()
+        if "onset_offset" in item
+        and item["onset_offset"]["confidence"] >= MIN_ONSET_CONFIDENCE
+    )
+    if not detected:
+        return None
+    middle = len(detected) // 2
+    return round((detected[middle] + detected[~middle]) / 2)
+
+
+class ChartIndex:
+    """A class used to represent the index of all installed charts.
+
+    The index is stored in src/charts/index.json and holds the metadata and the
+    analysis of every chart folder, so menus do not have to open every
+    difficulty file.
+
+    Methods
+    -------
+    load()
+        Used to load the index from a file.
+    save()
+        Used to save the index to a file.
+    update_chart(chart_name)
+        Used to add or refresh the entry of a chart folder.
+    remove_chart(chart_name)
+        Used to remove the entry of a chart folder.
+    rebuild(workers)
+        Used to rebuild the index from all chart folders.
+    refresh()
+        Used to add new chart folders and remove deleted ones.
+    get_chart_names()
+        Used to get names of all indexed charts.
+    """
+
+    def __init__(self, auto_rebuild: bool = True) -> None:
+        """
+        Parameters
+        ----------
+        auto_rebuild : bool
+            Rebuild and save the index if it is missing or outdated, and
+            refresh it otherwise.
+        """
+        self.charts_directory = os.path.join(os.path.dirname(__file__), "src", "charts")
+        self.index_location = os.path.join(self.charts_directory, "index.json")
+        self.charts = dict()
+        self.version = INDEX_VERSION
+        if os.path.isfile(self.index_location):
+            self.load()
+        if not auto_rebuild:
+            return
+        if not self.charts or self.version != INDEX_VERSION:
+            self.rebuild()
+            self.save()
+        elif self.refresh():
+            self.save()
+
+    def load(self) -> None:
+        """Used to load the index from a file.
+
+        Raises
+        ------
+        FileNotFoundError
+            File cannot be opened or doesn't exist.
+        """
+        try:
+            with open(self.index_location, "r") as index_file:
+                data = load(index_file)
+                self.charts = data["charts"]
+                self.version = data.get("version", 1)
+        except FileNotFoundError as error:
+            print(f"Caught {type(error)}: error")
+
+    def save(self) -> None:
+        """Used to save the index to a file.
+
+        Raises
+        ------
+        OSError
+            Unable to save file.
+        """
+        try:
+            with open(self.index_location, "w") as index_file:
+                dump({"version": self.version, "charts": self.charts}, index_file)
+        except OSError as error:
+            print(f"Caught {type(error)}: error")
+
+    def update_chart(self, chart_name: str) -> None:
+        """Used to add or refresh the entry of a chart folder.
+
+        Parameters
+        ----------
+        chart_name : str
+            The name of the chart folder.
+
+        Raises
+        ------
+        AssertionError
+            chart_name is not string.
+        """
+        assert isinstance(chart_name, str), "chart_name must be str."
+        entry = get_chart_entry(chart_name, self.charts.get(chart_name))
+        if entry is None:
+            self.remove_chart(chart_name)
+        else:
+            self.charts[chart_name] = entry
+
+    def remove_chart(self, chart_name: str) -> None:
+        """Used to remove the entry of a chart folder.
+
+        Parameters
+        ----------
+        chart_name : str
+            The name of the chart folder.
+        """
+        self.charts.pop(chart_name, None)
+
+    def rebuild(self, workers=None) -> None:
+        """Used to rebuild the index from all chart folders.
+
+        Chart folders are analyzed in parallel worker processes. Cached
+        analyses of unchanged difficulties are reused.
+
+        Parameters
+        ----------
+        workers : int, optional
+            Number of worker processes. Defaults to the number of CPUs.
+        """
+        chart_names = [
+            entry.name for entry in os.scandir(self.charts_directory) if entry.is_dir()
+        ]
+        cached_entries = [self.charts.get(chart_name) for chart_name in chart_names]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            entries = list(executor.map(get_chart_entry, chart_names, cached_entries))
+        self.charts.clear()
+        for chart_name, entry in zip(chart_names, entries):
+            if entry is not None:
+                self.charts[chart_name] = entry
+        self.version = INDEX_VERSION
+
+    def refresh(self) -> bool:
+        """Used to add new chart folders and remove deleted ones.
+
+        Returns
+        ----------
+        bool
+            Chart folders were added or removed.
+        """
+        chart_names = {
+            entry.name for entry in os.scandir(self.charts_directory) if entry.is_dir()
+        }
+        added = chart_names.difference(self.charts)
+        removed = set(self.charts).difference(chart_names)
+        for chart_name in sorted(added):
+            self.update_chart(chart_name)
+        for chart_name in removed:
+            self.remove_chart(chart_name)
+        return bool(added or removed)
+
+    def get_chart_names(self) -> list:
+        """Used to get names of all indexed charts.
+
+        Returns
+        ----------
+        list
+            Names of all indexed charts.
+        """
+        return list(self.charts)
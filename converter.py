@@ -1,25 +1,64 @@
 import json
+import os
+
+
+def get_safe_name(name: str) -> str:
+    """Used to replace characters that are not allowed in file names.
+
+    Parameters
+    ----------
+    name : str
+        File or folder name.
+
+    Returns
+    ----------
+    str
+        Safe file or folder name.
+    """
+    name = "".join("_" if character in '<>:"/\\|?*' else character for character in name)
+    return name.strip().rstrip(".")
 
 
 class Converter:
     """The class used to convert the osu! map to a Koli Rhythm compatible file.
 
+    The osu file is read in a single streaming pass. Each line is dispatched
+    to the handler of the section it belongs to, so general data, metadata,
+    timing points and hit objects are all collected at once.
+
     Methods
     -------
     open_file(file_path)
         Used to open an osu file.
-    generate_json()
+    generate_json(directory)
         Creates JSON file with map data.
+    get_chart_data()
+        Used to get map data in the Koli Rhythm format.
+    get_bpm()
+        Used to get the BPM of the first uninherited timing point.
+    get_scroll_changes()
+        Used to get the BPM and slider velocity changes of the map.
+    parse()
+        Reads the osu file once and fills all map data.
     parse_general()
         Retrieves data from the General section.
     parse_metadata()
         Retrieves data from the Metadata section.
+    parse_timing_points()
+        Retrieves data from the TimingPoints section.
     parse_notes()
         Retrieves data from the Objects section.
+    get_column(x)
+        Used to get the column of a hit object from its x position.
     """
 
     def __init__(
-        self, path_to_osu: str, song_bpm: str, difficulty_name: str, rating: str
+        self,
+        path_to_osu: str,
+        song_bpm: str = "",
+        difficulty_name: str = "",
+        rating: str = "",
+        map_file=None,
     ) -> None:
         """
         Parameters
@@ -27,11 +66,13 @@ class Converter:
         path_to_osu : str
             Osu file path.
         song_bpm : str
-            BPM of the song.
+            BPM of the song. Taken from the first timing point if empty.
         difficulty_name : str
-            Song difficulty name.
+            Song difficulty name. Taken from the Version field if empty.
         rating : str
-            Difficulty rating value.
+            Difficulty rating value. Taken from the OverallDifficulty field if empty.
+        map_file : io.TextIOBase, optional
+            Already opened osu file stream, e.g. an entry of an osz archive.
 
         Raises
         ------
@@ -46,7 +87,16 @@ class Converter:
         self.song_bpm = song_bpm
         self.difficulty_name = difficulty_name
         self.rating = rating
-        self.map = self.open_file(path_to_osu)
+        if map_file is None:
+            map_file = self.open_file(path_to_osu)
+        self.map = map_file
+        self.parsed = False
+        self.keys = 4
+        self.mode = 0
+        self.general = dict()
+        self.metadata = dict()
+        self.timing_points = []
+        self.notes = dict()
 
     def open_file(self, file_path: str):
         """Used to open an osu file.
@@ -65,27 +115,186 @@ class Converter:
         """
         assert isinstance(file_path, str), "file_path must be str."
         try:
-            map_file = open(file_path, "r", encoding="utf-8")
+            map_file = open(file_path, "r", encoding="utf-8-sig")
             return map_file
         except OSError as error:
             print(f"{error}")
 
-    def generate_json(self) -> None:
-        """Used to generate a JSON file with map data."""
-        general = self.parse_general()
-        metadata = self.parse_metadata()
-        notes = self.parse_notes()
-        metadata["bpm"] = self.song_bpm
-        metadata["difficulty"] = self.difficulty_name
-        metadata["rating"] = self.rating
+    def generate_json(self, directory: str = "") -> str:
+        """Used to generate a JSON file with map data.
+
+        Parameters
+        ----------
+        directory : str
+            Directory to write the JSON file to.
+
+        Returns
+        ----------
+        str
+            Name of the generated file.
+        """
+        map_json = self.get_chart_data()
+        metadata = map_json["metadata"]
         file_name = f"{metadata['artist']} - {metadata['title']} [{metadata['difficulty']}].json"
-        map_json = {"general": general, "metadata": metadata, "notes": notes}
+        file_name = get_safe_name(file_name)
         try:
-            with open(file_name, "w") as write_file:
+            with open(os.path.join(directory, file_name), "w") as write_file:
                 json.dump(map_json, write_file)
-        except FileExistsError as error:
+        except OSError as error:
             print("Unable to create file.")
             print(f"Caught {error}: error")
+        return file_name
+
+    def get_chart_data(self) -> dict:
+        """Used to get map data in the Koli Rhythm format.
+
+        Returns
+        ----------
+        dict
+            Dictionary with general data, metadata and notes of the map.
+        """
+        general = self.parse_general()
+        metadata = self.parse_metadata()
+        notes = self.parse_notes()
+        timing_points = self.get_scroll_changes()
+        metadata["bpm"] = self.song_bpm or self.get_bpm()
+        metadata["difficulty"] = self.difficulty_name or self.metadata.get(
+            "version", ""
+        )
+        metadata["rating"] = self.rating or self.metadata.get("overall_difficulty", "0")
+        return {
+            "general": general,
+            "metadata": metadata,
+            "timing_points": timing_points,
+            "notes": notes,
+        }
+
+    def get_bpm(self) -> str:
+        """Used to get the BPM of the first uninherited timing point.
+
+        Returns
+        ----------
+        str
+            BPM of the song, rounded to two decimals.
+        """
+        self.parse()
+        for _, beat_length, uninherited in self.timing_points:
+            if uninherited and beat_length > 0:
+                return str(round(60000 / beat_length, 2))
+        return "0"
+
+    def get_scroll_changes(self) -> list:
+        """Used to get the BPM and slider velocity changes of the map.
+
+        Uninherited timing points set the BPM and reset the slider velocity,
+        inherited ones only change the slider velocity. When both kinds share
+        a timing, the inherited one wins, like in osu!.
+
+        Returns
+        ----------
+        list
+            List of [timing, bpm, slider velocity] changes sorted by timing.
+        """
+        self.parse()
+        changes = []
+        bpm = float(self.get_bpm())
+        points = sorted(self.timing_points, key=lambda point: (point[0], not point[2]))
+        for offset, beat_length, uninherited in points:
+            velocity = 1.0
+            if uninherited and beat_length > 0:
+                bpm = 60000 / beat_length
+            elif not uninherited and beat_length < 0:
+                velocity = min(max(-100 / beat_length, 0.01), 10.0)
+            if changes and changes[-1][0] == int(offset):
+                changes.pop()
+            changes.append([int(offset), round(bpm, 3), round(velocity, 3)])
+        return changes
+
+    def parse(self) -> None:
+        """Reads the osu file once and fills all map data.
+
+        Hit objects are collected as lane bitmasks keyed by timing and are
+        turned into lane strings only once, after the whole file is read.
+        """
+        if self.parsed:
+            return
+        masks = dict()
+        section = ""
+        for line in self.map:
+            line = line.strip()
+            if not line or line.startswith("//"):
+                continue
+            if line[0] == "[" and line[-1] == "]":
+                section = line[1:-1]
+                continue
+            if section == "HitObjects":
+                x, _, timing, _ = line.split(",", 3)
+                timing = int(timing)
+                bit = 1 << self.get_column(int(x))
+                masks[timing] = masks.get(timing, 0) | bit
+            elif section == "TimingPoints":
+                data = line.split(",")
+                uninherited = len(data) < 7 or data[6] == "1"
+                self.timing_points.append(
+                    [float(data[0]), float(data[1]), uninherited]
+                )
+            elif section == "General":
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "AudioFilename":
+                    self.general["audio"] = value.strip()
+                elif key == "PreviewTime":
+                    self.general["preview"] = int(value)
+                elif key == "Mode":
+                    self.mode = int(value)
+            elif section == "Metadata":
+                key, _, value = line.partition(":")
+                if key == "Title":
+                    self.metadata["title"] = value
+                elif key == "Artist":
+                    self.metadata["artist"] = value
+                elif key == "Creator":
+                    self.metadata["mapper"] = value
+                elif key == "Version":
+                    self.metadata["version"] = value
+                elif key == "BeatmapSetID":
+                    self.metadata["set_id"] = value.strip()
+            elif section == "Difficulty":
+                key, _, value = line.partition(":")
+                if key == "CircleSize":
+                    self.keys = max(1, int(float(value)))
+                elif key == "OverallDifficulty":
+                    self.metadata["overall_difficulty"] = value
+            elif section == "Events":
+                if line.startswith("0,0,") and "background" not in self.general:
+                    if '"' in line:
+                        self.general["background"] = line.split('"')[1]
+                    else:
+                        self.general["background"] = line.split(",")[2].strip()
+        self.map.close()
+
+        lanes = range(self.keys)
+        for timing in sorted(masks):
+            mask = masks[timing]
+            self.notes[timing] = "".join(
+                "1" if mask >> lane & 1 else "0" for lane in lanes
+            )
+        self.parsed = True
+
+    def get_column(self, x: int) -> int:
+        """Used to get the column of a hit object from its x position.
+
+        Parameters
+        ----------
+        x : int
+            X position of the hit object.
+
+        Returns
+        ----------
+        int
+            Column number, starting from zero.
+        """
+        return min(max(x * self.keys // 512, 0), self.keys - 1)
 
     def parse_general(self) -> dict:
         """Used to parse data from the general section of the osu file.
@@ -95,32 +304,8 @@ class Converter:
         dict
             Dictionary with general data of the map.
         """
-        self.map.seek(0)
-        read_from_here = False
-        lines = self.map.readlines()
-        general = dict()
-        for line in lines:
-            if line == "[General]\n":
-                read_from_here = True
-                continue
-            if read_from_here:
-                if line == "\n":
-                    read_from_here = False
-                data = line.split(":")
-                data = [data[0], data[-1].replace("\n", "")]
-                if data[0] == "AudioFile_name":
-                    general["audio"] = data[1].replace(" ", "")
-                data = line.split('"')
-        read_from_here = False
-        for line in lines:
-            if line == "//Background and Video events\n":
-                read_from_here = True
-                continue
-            if read_from_here:
-                data = line.split('"')
-                general["background"] = data[1].replace(" ", "")
-                break
-        return general
+        self.parse()
+        return self.general
 
     def parse_metadata(self) -> dict:
         """Used to parse data from the metadata section of the osu file.
@@ -130,26 +315,23 @@ class Converter:
         dict
             Dictionary with metadata of the map.
         """
-        self.map.seek(0)
-        read_from_here = False
-        lines = self.map.readlines()
-        metadata = dict()
-        for line in lines:
-            if line == "[Metadata]\n":
-                read_from_here = True
-                continue
-            if read_from_here:
-                if line == "\n":
-                    break
-                data = line.split(":")
-                data = [data[0], data[1].replace("\n", "")]
-                if data[0] == "Title":
-                    metadata["title"] = data[1]
-                elif data[0] == "Artist":
-                    metadata["artist"] = data[1]
-                elif data[0] == "Creator":
-                    metadata["mapper"] = data[1]
-        return metadata
+        self.parse()
+        return {
+            key: self.metadata[key]
+            for key in ("title", "artist", "mapper")
+            if key in self.metadata
+        }
+
+    def parse_timing_points(self) -> list:
+        """Used to parse data from the timing points section of the osu file.
+
+        Returns
+        ----------
+        list
+            List of [offset, beat length, uninherited] timing points.
+        """
+        self.parse()
+        return self.timing_points
 
     def parse_notes(self) -> dict:
         """Used to parse data from the object section of the osu file.
@@ -159,41 +341,5 @@ class Converter:
         dict
             Dictionary with note timings and spawn positions.
         """
-        self.map.seek(0)
-        read_from_here = False
-        lines = self.map.readlines()
-        notes = dict()
-        for line in lines:
-            if line == "[HitObjects]\n":
-                read_from_here = True
-                continue
-            if read_from_here:
-                colomn = line.split(",")[:1:]
-                colomn = "".join(map(str, colomn))
-                timing = line.split(",")[2:3:]
-                timing = int("".join(map(str, timing)))
-                if timing not in notes:
-                    spawn_positions = "0000"
-                    spawn_positions = list(spawn_positions)
-                    if colomn == "64":
-                        spawn_positions[0] = "1"
-                    if colomn == "192":
-                        spawn_positions[1] = "1"
-                    if colomn == "320":
-                        spawn_positions[2] = "1"
-                    if colomn == "448":
-                        spawn_positions[3] = "1"
-                    spawn_positions = "".join(spawn_positions)
-                    notes[timing] = spawn_positions
-                else:
-                    spawn_positions = list(notes[timing])
-                    if colomn == "64":
-                        spawn_positions[0] = "1"
-                    if colomn == "192":
-                        spawn_positions[1] = "1"
-                    if colomn == "320":
-                        spawn_positions[2] = "1"
-                    if colomn == "448":
-                        spawn_positions[3] = "1"
-                    notes[timing] = "".join(spawn_positions)
-        return notes
+        self.parse()
+        return self.notes
@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntEnum
 
 
 class Color(Enum):
@@ -22,3 +22,13 @@ class GameState(Enum):
     CHART_SELECT_MENU = 4
     DIFFICULTY_SELECT_MENU = 5
     ENDSCREEN = 6
+    CALIBRATION = 7
+
+
+class Judgement(IntEnum):
+    """An enum class that represents the judgement of a hit."""
+
+    PERFECT = 0
+    GOOD = 1
+    BAD = 2
+    MISS = 3
@@ -1,12 +1,23 @@
+from collections import OrderedDict
 import os
 import pygame as pg
 import text
 import enums
+import performance
 from pygame.locals import *
 
+BACKGROUND_CACHE_SIZE = 8
+
 
 class Background(pg.sprite.Sprite):
-    """The class that represents the background."""
+    """The class that represents the background.
+
+    The last BACKGROUND_CACHE_SIZE decoded images are cached by location, so
+    charts that share a background in the asset store decode it only once
+    while browsing.
+    """
+
+    images = OrderedDict()
 
     def __init__(self, image_location: str):
         """
@@ -16,7 +27,13 @@ class Background(pg.sprite.Sprite):
             The location of the background in the file system.
         """
         pg.sprite.Sprite.__init__(self)
-        self.image = pg.image.load(image_location).convert()
+        if image_location in Background.images:
+            Background.images.move_to_end(image_location)
+        else:
+            Background.images[image_location] = pg.image.load(image_location).convert()
+            if len(Background.images) > BACKGROUND_CACHE_SIZE:
+                Background.images.popitem(last=False)
+        self.image = Background.images[image_location]
         self.rect = self.image.get_rect()
 
 
@@ -76,10 +93,12 @@ class Note(pg.sprite.Sprite):
         self.start_position = 0
         self.perfect_hit_position = self.screen.get_height() - 170
         self.timing = timing
+        self.scroll_position = float(timing)
         self.line = line
         self.offset_left = self.screen.get_width() / 2 - 258
         self.notes_margin = 132
         self.is_clickable = False
+        self.is_active = True
         self.rect = self.image.get_rect()
         self.rect.x = self.offset_left + (self.line - 1) * self.notes_margin
         self.rect.y = -140
@@ -189,9 +208,9 @@ class Hit:
     Methods
     -------
     get_correct_color()
-        Used to get the correct color based on progress.
+        Used to get the correct color based on the judgement.
     get_offset()
-        Used to get an offset based on progress.
+        Used to get an offset based on the hit error.
     ready_to_delete()
         Used to determine if a hit is ready to be removed.
     update()
@@ -200,66 +219,50 @@ class Hit:
         Used to draw hitbar on screen.
     """
 
-    def __init__(self, progress: float) -> None:
+    def __init__(self, hit_error: float, judgement: enums.Judgement) -> None:
         """
         Parameters
         ----------
-        progress : float
-            Destroyed note's progress.
+        hit_error : float
+            Difference between the hit time and the note timing in milliseconds.
+        judgement : enums.Judgement
+            Judgement of the hit.
 
         Raises
         ------
         AssertionError
-            progress is not a float.
+            judgement is not an instance of the enums.Judgement class.
         """
-        assert isinstance(progress, float), "progress must be a float."
+        assert isinstance(
+            judgement, enums.Judgement
+        ), "judgement must be an instance of the enums.Judgement class."
 
         self.surface = pg.Surface((4, 18), SRCALPHA)
-        self.progress = progress
+        self.hit_error = hit_error
+        self.judgement = judgement
         self.time = pg.time.get_ticks()
         self.delay = 30  # ms
-        self.perfect_color = list(enums.Color.PERFECT.value)
-        self.good_color = list(enums.Color.GOOD.value)
-        self.bad_color = list(enums.Color.BAD.value)
-        self.miss_color = list(enums.Color.MISS.value)
         self.color = self.get_correct_color()
 
-    def get_correct_color(self) -> tuple:
-        """Used to get the correct color based on progress.
+    def get_correct_color(self) -> list:
+        """Used to get the correct color based on the judgement.
 
         Returns
         ----------
-        tuple
+        list
             Correct color.
         """
-        if (
-            self.progress >= 0.7
-            and self.progress < 0.8
-            or self.progress > 1.2
-            and self.progress <= 1.3
-        ):
-            return self.bad_color
-        elif (
-            self.progress >= 0.8
-            and self.progress < 0.9
-            or self.progress > 1.1
-            and self.progress <= 1.2
-        ):
-            return self.good_color
-        elif self.progress >= 0.9 and self.progress <= 1.1:
-            return self.perfect_color
-        else:
-            return self.miss_color
+        return list(enums.Color[self.judgement.name].value)
 
     def get_offset(self) -> float:
-        """Used to get an offset based on progress.
+        """Used to get an offset based on the hit error.
 
         Returns
         ----------
         float
             Offset of the hit.
         """
-        offset = ((self.progress - 1) * 3.33) * 98
+        offset = self.hit_error / performance.MISS_WINDOW * 98
         if offset >= 98:
             offset = 98
         elif offset <= -98:
@@ -0,0 +1,537 @@
+import argparse
+import json
+import os
+import time
+import zlib
+
+import numpy as np
+
+import performance
+import writer
+
+LANES = 4
+COLUMNS = {
+    "played_at": ("<f8", ()),
+    "chart": ("<i4", ()),
+    "difficulty": ("<i4", ()),
+    "player": ("<i4", ()),
+    "score": ("<i8", ()),
+    "accuracy": ("<f4", ()),
+    "max_combo": ("<i4", ()),
+    "max_possible_combo": ("<i4", ()),
+    "judgements": ("<i4", (len(performance.JUDGEMENTS),)),
+    "rate": ("<f4", ()),
+    "practiced": ("u1", ()),
+    "lane_counts": ("<i4", (LANES,)),
+    "lane_sums": ("<f8", (LANES,)),
+    "lane_squares": ("<f8", (LANES,)),
+    "histogram": ("<i4", (performance.HISTOGRAM_BINS,)),
+    "hits_offset": ("<i8", ()),
+    "hits_size": ("<i4", ()),
+}
+NAME_TABLES = {"charts": "chart", "difficulties": "difficulty", "players": "player"}
+HIT_RECORD_SIZE = 9  # float32 error, int8 lane, int32 timing
+
+
+class PlayHistory:
+    """The class used to represent the history of all finished plays.
+
+    Every column is an append-only binary file of fixed-size values, so the
+    whole history can be memory-mapped and queried with NumPy. Chart,
+    difficulty and player names are stored once in a name table and referenced
+    by number. Per-hit errors of every play are compressed into hits.bin;
+    per-lane sums and the error histogram are kept as columns, so most
+    statistics never have to decompress them.
+
+    Methods
+    -------
+    get_record(performance, chart_hash, difficulty, rate, practiced)
+        Used to capture a finished play.
+    append(record)
+        Used to append a captured play to the history.
+    add(performance, chart_hash, difficulty, rate, practiced)
+        Used to capture and append a play.
+    get_count()
+        Used to get the number of complete plays on disk.
+    load()
+        Used to memory-map all columns.
+    select(chart_hash, difficulty, player)
+        Used to get a mask of the plays that match a filter.
+    get_accuracy_trend(chart_hash, difficulty, player)
+        Used to get the accuracy of the plays of a chart over time.
+    get_lane_errors(chart_hash, player)
+        Used to get the hit error distribution of every lane.
+    get_error_histogram(chart_hash, player)
+        Used to get the hit error histogram of the selected plays.
+    get_hits(play)
+        Used to get the per-hit arrays of a play.
+    get_worst_sections(chart_hash, difficulty, section_length, count)
+        Used to get the sections of a chart with the largest hit errors.
+    migrate_keys(key_changes)
+        Used to move plays from old chart keys to new ones.
+    """
+
+    def __init__(self, directory=None) -> None:
+        """
+        Parameters
+        ----------
+        directory : str, optional
+            Directory of the history files. Defaults to history next to the
+            game.
+        """
+        if directory is None:
+            directory = os.path.join(os.path.dirname(__file__), "history")
+        self.directory = directory
+        self.names_location = os.path.join(directory, "names.json")
+        self.hits_location = os.path.join(directory, "hits.bin")
+        self.names = {table: [] for table in NAME_TABLES}
+        if os.path.isfile(self.names_location):
+            with open(self.names_location, "r") as names_file:
+                self.names.update(json.load(names_file))
+        self.name_ids = {
+            table: {name: number for number, name in enumerate(names)}
+            for table, names in self.names.items()
+        }
+        self.columns = None
+        self.loaded_count = -1
+
+    def get_column_location(self, name: str) -> str:
+        """Used to get the location of a column file.
+
+        Parameters
+        ----------
+        name : str
+            Column name.
+
+        Returns
+        ----------
+        str
+            Path to the column file.
+        """
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def get_record(
+        self,
+        player_performance: performance.Performance,
+        chart_hash: str,
+        difficulty: str,
+        rate: float = 1.0,
+        practiced: bool = False,
+    ) -> dict:
+        """Used to capture a finished play.
+
+        The record is a copy, so the performance can be reused right after.
+
+        Parameters
+        ----------
+        player_performance : performance.Performance
+            Performance of the play.
+        chart_hash : str
+            Note hash of the difficulty.
+        difficulty : str
+            Difficulty name.
+        rate : float
+            Playback rate.
+        practiced : bool
+            Seeking or the practice loop was used.
+
+        Returns
+        ----------
+        dict
+            Names, column values and compressed hits of the play.
+        """
+        count = player_performance.hit_count
+        errors = player_performance.hit_errors[:count].astype(np.float64)
+        lanes = player_performance.hit_lanes[:count].astype(np.int64) - 1
+        hits = zlib.compress(
+            player_performance.hit_errors[:count].astype("<f4").tobytes()
+            + player_performance.hit_lanes[:count].astype("i1").tobytes()
+            + player_performance.hit_timings[:count].astype("<i4").tobytes()
+        )
+        return {
+            "names": {
+                "charts": chart_hash,
+                "difficulties": difficulty,
+                "players": player_performance.player_name,
+            },
+            "values": {
+                "played_at": time.time(),
+                "score": player_performance.score,
+                "accuracy": player_performance.accuracy,
+                "max_combo": player_performance.max_combo,
+                "max_possible_combo": player_performance.max_possible_combo,
+                "judgements": player_performance.get_judgement_counts(),
+                "rate": rate,
+                "practiced": practiced,
+                "lane_counts": np.bincount(lanes, minlength=LANES)[:LANES],
+                "lane_sums": np.bincount(lanes, errors, LANES)[:LANES],
+                "lane_squares": np.bincount(lanes, errors**2, LANES)[:LANES],
+                "histogram": player_performance.get_error_histogram(),
+            },
+            "hits": hits,
+        }
+
+    def get_name_id(self, table: str, name: str) -> int:
+        """Used to get the number of a name, adding it to the name table.
+
+        Parameters
+        ----------
+        table : str
+            Name table.
+        name : str
+            Chart hash, difficulty or player name.
+
+        Returns
+        ----------
+        int
+            Number of the name.
+        """
+        if name not in self.name_ids[table]:
+            self.name_ids[table][name] = len(self.names[table])
+            self.names[table].append(name)
+            writer.write_text_atomic(self.names_location, json.dumps(self.names))
+        return self.name_ids[table][name]
+
+    def get_count(self) -> int:
+        """Used to get the number of complete plays on disk.
+
+        A play that was cut off while it was appended is not counted.
+
+        Returns
+        ----------
+        int
+            Number of plays.
+        """
+        counts = []
+        for name, (dtype, shape) in COLUMNS.items():
+            location = self.get_column_location(name)
+            size = os.path.getsize(location) if os.path.isfile(location) else 0
+            counts.append(size // (np.dtype(dtype).itemsize * int(np.prod(shape))))
+        return min(counts)
+
+    def append(self, record: dict) -> None:
+        """Used to append a captured play to the history.
+
+        Parameters
+        ----------
+        record : dict
+            Play captured with get_record.
+
+        Raises
+        ------
+        OSError
+            Unable to write the history files.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        count = self.get_count()
+        values = dict(record["values"])
+        for table, column in NAME_TABLES.items():
+            values[column] = self.get_name_id(table, record["names"][table])
+        with open(self.hits_location, "ab") as hits_file:
+            values["hits_offset"] = hits_file.tell()
+            values["hits_size"] = len(record["hits"])
+            hits_file.write(record["hits"])
+        for name, (dtype, shape) in COLUMNS.items():
+            item_size = np.dtype(dtype).itemsize * int(np.prod(shape))
+            with open(self.get_column_location(name), "ab") as column_file:
+                column_file.truncate(count * item_size)
+                column_file.write(np.asarray(values[name], dtype=dtype).tobytes())
+
+    def add(
+        self,
+        player_performance: performance.Performance,
+        chart_hash: str,
+        difficulty: str,
+        rate: float = 1.0,
+        practiced: bool = False,
+    ) -> None:
+        """Used to capture and append a play.
+
+        Parameters
+        ----------
+        player_performance : performance.Performance
+            Performance of the play.
+        chart_hash : str
+            Note hash of the difficulty.
+        difficulty : str
+            Difficulty name.
+        rate : float
+            Playback rate.
+        practiced : bool
+            Seeking or the practice loop was used.
+        """
+        self.append(
+            self.get_record(player_performance, chart_hash, difficulty, rate, practiced)
+        )
+
+    def load(self) -> dict:
+        """Used to memory-map all columns.
+
+        The maps are reused until more plays are appended.
+
+        Returns
+        ----------
+        dict
+            Column names mapped to read-only arrays.
+        """
+        count = self.get_count()
+        if count == self.loaded_count:
+            return self.columns
+        self.columns = dict()
+        for name, (dtype, shape) in COLUMNS.items():
+            if count == 0:
+                self.columns[name] = np.zeros((0,) + shape, dtype=dtype)
+            else:
+                self.columns[name] = np.memmap(
+                    self.get_column_location(name),
+                    dtype=dtype,
+                    mode="r",
+                    shape=(count,) + shape,
+                )
+        self.loaded_count = count
+        return self.columns
+
+    def select(self, chart_hash=None, difficulty=None, player=None) -> np.ndarray:
+        """Used to get a mask of the plays that match a filter.
+
+        Parameters
+        ----------
+        chart_hash : str, optional
+            Note hash of the difficulty.
+        difficulty : str, optional
+            Difficulty name.
+        player : str, optional
+            Player name.
+
+        Returns
+        ----------
+        np.ndarray
+            Boolean mask over all plays.
+        """
+        columns = self.load()
+        mask = np.ones(len(columns["played_at"]), dtype=bool)
+        for (table, column), name in zip(
+            NAME_TABLES.items(), (chart_hash, difficulty, player)
+        ):
+            if name is not None:
+                mask &= columns[column] == self.name_ids[table].get(name, -1)
+        return mask
+
+    def get_accuracy_trend(self, chart_hash: str, difficulty=None, player=None):
+        """Used to get the accuracy of the plays of a chart over time.
+
+        Parameters
+        ----------
+        chart_hash : str
+            Note hash of the difficulty.
+        difficulty : str, optional
+            Difficulty name.
+        player : str, optional
+            Player name.
+
+        Returns
+        ----------
+        tuple
+            Times of the plays and their accuracies, sorted by time.
+        """
+        columns = self.load()
+        mask = self.select(chart_hash, difficulty, player)
+        played_at = columns["played_at"][mask]
+        order = np.argsort(played_at, kind="stable")
+        return played_at[order], columns["accuracy"][mask][order]
+
+    def get_lane_errors(self, chart_hash=None, player=None) -> list:
+        """Used to get the hit error distribution of every lane.
+
+        Parameters
+        ----------
+        chart_hash : str, optional
+            Note hash of the difficulty.
+        player : str, optional
+            Player name.
+
+        Returns
+        ----------
+        list
+            Dictionaries with the hit count, mean and standard deviation of
+            every lane.
+        """
+        columns = self.load()
+        mask = self.select(chart_hash, player=player)
+        counts = columns["lane_counts"][mask].sum(axis=0)
+        sums = columns["lane_sums"][mask].sum(axis=0)
+        squares = columns["lane_squares"][mask].sum(axis=0)
+        means = sums / np.maximum(counts, 1)
+        deviations = np.sqrt(np.maximum(squares / np.maximum(counts, 1) - means**2, 0))
+        return [
+            {
+                "hits": int(counts[lane]),
+                "mean": float(means[lane]),
+                "deviation": float(deviations[lane]),
+            }
+            for lane in range(LANES)
+        ]
+
+    def get_error_histogram(self, chart_hash=None, player=None) -> list:
+        """Used to get the hit error histogram of the selected plays.
+
+        Parameters
+        ----------
+        chart_hash : str, optional
+            Note hash of the difficulty.
+        player : str, optional
+            Player name.
+
+        Returns
+        ----------
+        list
+            Hit counts of the histogram bins from early to late.
+        """
+        columns = self.load()
+        mask = self.select(chart_hash, player=player)
+        return columns["histogram"][mask].sum(axis=0).tolist()
+
+    def get_hits(self, play: int) -> tuple:
+        """Used to get the per-hit arrays of a play.
+
+        Parameters
+        ----------
+        play : int
+            Number of the play.
+
+        Returns
+        ----------
+        tuple
+            Hit errors, lanes and note timings.
+        """
+        columns = self.load()
+        with open(self.hits_location, "rb") as hits_file:
+            hits_file.seek(int(columns["hits_offset"][play]))
+            data = zlib.decompress(hits_file.read(int(columns["hits_size"][play])))
+        count = len(data) // HIT_RECORD_SIZE
+        errors = np.frombuffer(data, "<f4", count)
+        lanes = np.frombuffer(data, "i1", count, offset=4 * count)
+        timings = np.frombuffer(data, "<i4", count, offset=5 * count)
+        return errors, lanes, timings
+
+    def get_worst_sections(
+        self,
+        chart_hash: str,
+        difficulty: str,
+        section_length: int = 2000,
+        count: int = 5,
+    ) -> list:
+        """Used to get the sections of a chart with the largest hit errors.
+
+        Parameters
+        ----------
+        chart_hash : str
+            Note hash of the difficulty.
+        difficulty : str
+            Difficulty name.
+        section_length : int
+            Length of a section in milliseconds.
+        count : int
+            Number of sections.
+
+        Returns
+        ----------
+        list
+            Section start timings with the mean absolute error and number of
+            hits, worst first.
+        """
+        plays = np.nonzero(self.select(chart_hash, difficulty))[0]
+        if plays.size == 0:
+            return []
+        hits = [self.get_hits(play) for play in plays]
+        errors = np.abs(np.concatenate([hit[0] for hit in hits]).astype(np.float64))
+        timings = np.concatenate([hit[2] for hit in hits])
+        if errors.size == 0:
+            return []
+        sections = timings // section_length
+        sections -= sections.min()
+        hit_counts = np.bincount(sections)
+        means = np.bincount(sections, errors) / np.maximum(hit_counts, 1)
+        worst = np.argsort(means)[::-1][:count]
+        first = int(timings.min() // section_length)
+        return [
+            {
+                "start": int((first + section) * section_length),
+                "mean_error": round(float(means[section]), 2),
+                "hits": int(hit_counts[section]),
+            }
+            for section in worst
+            if hit_counts[section]
+        ]
+
+    def migrate_keys(self, key_changes: list) -> int:
+        """Used to move plays from old chart keys to new ones.
+
+        The chart column is rewritten in place through a writable memory map.
+
+        Parameters
+        ----------
+        key_changes : list
+            Old chart key, difficulty name and new chart key of every
+            difficulty.
+
+        Returns
+        ----------
+        int
+            Number of moved plays.
+        """
+        count = self.get_count()
+        if count == 0:
+            return 0
+        dtype, _ = COLUMNS["chart"]
+        charts = np.memmap(
+            self.get_column_location("chart"), dtype=dtype, mode="r+", shape=(count,)
+        )
+        difficulties = self.load()["difficulty"]
+        moved = 0
+        for old_key, difficulty, new_key in key_changes:
+            old_id = self.name_ids["charts"].get(old_key)
+            difficulty_id = self.name_ids["difficulties"].get(difficulty)
+            if old_id is None or difficulty_id is None:
+                continue
+            mask = (charts == old_id) & (difficulties == difficulty_id)
+            if mask.any():
+                charts[mask] = self.get_name_id("charts", new_key)
+                moved += int(mask.sum())
+        charts.flush()
+        del charts
+        return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show play history statistics.")
+    parser.add_argument("--chart", default=None, help="note hash of the difficulty")
+    parser.add_argument("--difficulty", default=None, help="difficulty name")
+    parser.add_argument("--player", default=None, help="player name")
+    arguments = parser.parse_args()
+    history = PlayHistory()
+    start = time.perf_counter()
+    mask = history.select(arguments.chart, arguments.difficulty, arguments.player)
+    lanes = history.get_lane_errors(arguments.chart, arguments.player)
+    print(f"plays: {int(mask.sum())}")
+    for lane, errors in enumerate(lanes, start=1):
+        print(
+            f"lane {lane}: {errors['hits']} hits, mean {errors['mean']:+.1f} ms, "
+            f"deviation {errors['deviation']:.1f} ms"
+        )
+    if arguments.chart is not None:
+        played_at, accuracy = history.get_accuracy_trend(
+            arguments.chart, arguments.difficulty, arguments.player
+        )
+        if accuracy.size:
+            print(f"accuracy: first {accuracy[0]:.2f}%, last {accuracy[-1]:.2f}%")
+    if arguments.chart is not None and arguments.difficulty is not None:
+        worst_sections = history.get_worst_sections(
+            arguments.chart, arguments.difficulty
+        )
+        for section in worst_sections:
+            print(
+                f"section at {section['start']} ms: "
+                f"{section['mean_error']} ms over {section['hits']} hits"
+            )
+    print(f"query time: {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,241 @@
+import argparse
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import assets
+import chart
+from converter import Converter, get_safe_name
+
+OSU_MANIA_MODE = 3
+
+
+def import_difficulty(
+    archive: zipfile.ZipFile,
+    info: zipfile.ZipInfo,
+    entries: dict,
+    archive_name: str,
+    charts_directory: str,
+    keys: int,
+    store: assets.AssetStore,
+    blobs: dict,
+):
+    """Used to convert a single .osu entry of an osz archive.
+
+    Parameters
+    ----------
+    archive : zipfile.ZipFile
+        Opened osz archive.
+    info : zipfile.ZipInfo
+        The .osu entry.
+    entries : dict
+        Lowercase names of all archive entries mapped to the entries.
+    archive_name : str
+        Safe name of the archive, used for mapsets without an id.
+    charts_directory : str
+        Directory with all chart folders.
+    keys : int
+        Key count of the difficulties to import.
+    store : assets.AssetStore
+        Store the audio and background files are copied to.
+    blobs : dict
+        File names of the already stored assets mapped to their keys.
+
+    Returns
+    ----------
+    str or None
+        Name of the chart folder, or None if the difficulty is not an
+        osu!mania difficulty with the key count.
+
+    Raises
+    ------
+    zipfile.BadZipFile
+        The entry is corrupted.
+    ValueError
+        The difficulty can't be decoded or parsed.
+    IndexError
+        The difficulty has a malformed line.
+    OSError
+        The difficulty can't be written.
+    """
+    with archive.open(info) as raw_file:
+        map_file = io.TextIOWrapper(raw_file, encoding="utf-8-sig")
+        converter = Converter(info.filename, map_file=map_file)
+        converter.parse()
+    if converter.mode != OSU_MANIA_MODE or converter.keys != keys:
+        return None
+    if not converter.notes:
+        return None
+
+    title = get_safe_name(converter.metadata.get("title", ""))
+    mapset = converter.metadata.get("set_id", "")
+    if not mapset.isdigit() or int(mapset) <= 0:
+        mapset = archive_name
+    chart_name = f"{title} ({mapset})" if title else archive_name
+
+    for key in ("audio", "background"):
+        file_name = converter.general.get(key)
+        if not file_name or file_name.lower() not in entries:
+            continue
+        if file_name not in blobs:
+            entry = entries[file_name.lower()]
+            with archive.open(entry) as source:
+                blobs[file_name] = store.put_stream(
+                    source, os.path.splitext(file_name)[1]
+                )
+        converter.general[f"{key}_blob"] = blobs[file_name]
+
+    chart_directory = os.path.join(charts_directory, chart_name)
+    os.makedirs(chart_directory, exist_ok=True)
+    converter.generate_json(chart_directory)
+    return chart_name
+
+
+def import_archive(archive_path: str, charts_directory: str, keys: int) -> list:
+    """Used to convert every osu!mania difficulty of an osz archive.
+
+    The .osu entries are streamed straight out of the archive, and only the
+    audio and background files referenced by the converted difficulties are
+    copied, into the asset store. Chart folders are named after the song
+    title and the mapset id, or the archive name for archives without one, so
+    mapsets of songs with the same title don't overwrite each other. A
+    malformed difficulty is skipped without dropping the rest of the mapset.
+
+    Parameters
+    ----------
+    archive_path : str
+        Path to the osz archive.
+    charts_directory : str
+        Directory with all chart folders.
+    keys : int
+        Key count of the difficulties to import.
+
+    Returns
+    ----------
+    list
+        Names of the chart folders that were created or updated.
+    """
+    chart_names = set()
+    archive_name = get_safe_name(os.path.splitext(os.path.basename(archive_path))[0])
+    store = assets.AssetStore()
+    blobs = dict()
+    failed = 0
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            entries = {info.filename.lower(): info for info in archive.infolist()}
+            for info in archive.infolist():
+                if not info.filename.lower().endswith(".osu"):
+                    continue
+                try:
+                    chart_name = import_difficulty(
+                        archive,
+                        info,
+                        entries,
+                        archive_name,
+                        charts_directory,
+                        keys,
+                        store,
+                        blobs,
+                    )
+                except (zipfile.BadZipFile, OSError, ValueError, IndexError) as error:
+                    failed += 1
+                    print(f"Caught {type(error)}: {archive_path}: {info.filename}")
+                    continue
+                if chart_name is not None:
+                    chart_names.add(chart_name)
+    except (zipfile.BadZipFile, OSError) as error:
+        print(f"Caught {type(error)}: {archive_path}")
+    if failed and not chart_names:
+        print(f"No difficulty of {archive_path} could be imported.")
+    return sorted(chart_names)
+
+
+class Importer:
+    """The class used to import a directory of osz archives.
+
+    Every archive is handled by a separate worker process, and the chart index
+    is updated once all archives are converted.
+
+    Methods
+    -------
+    get_archives()
+        Used to get all osz archives in the directory.
+    run()
+        Used to import all archives and update the chart index.
+    """
+
+    def __init__(self, archives_directory: str, keys: int = 4, workers=None) -> None:
+        """
+        Parameters
+        ----------
+        archives_directory : str
+            Directory with osz archives.
+        keys : int
+            Key count of the difficulties to import.
+        workers : int, optional
+            Number of worker processes. Defaults to the number of CPUs.
+
+        Raises
+        ------
+        AssertionError
+            archives_directory is not a string or keys is not an integer.
+        """
+        assert isinstance(archives_directory, str), "archives_directory must be str."
+        assert isinstance(keys, int), "keys must be an integer."
+        self.archives_directory = archives_directory
+        self.keys = keys
+        self.workers = workers
+        self.charts_directory = os.path.join(os.path.dirname(__file__), "src", "charts")
+
+    def get_archives(self) -> list:
+        """Used to get all osz archives in the directory.
+
+        Returns
+        ----------
+        list
+            Paths to all osz archives.
+        """
+        return sorted(
+            entry.path
+            for entry in os.scandir(self.archives_directory)
+            if entry.is_file() and entry.name.lower().endswith(".osz")
+        )
+
+    def run(self) -> list:
+        """Used to import all archives and update the chart index.
+
+        Returns
+        ----------
+        list
+            Names of all imported charts.
+        """
+        archives = self.get_archives()
+        imported = set()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(
+                import_archive,
+                archives,
+                [self.charts_directory] * len(archives),
+                [self.keys] * len(archives),
+                chunksize=8,
+            )
+            for chart_names in results:
+                imported.update(chart_names)
+
+        index = chart.ChartIndex()
+        for chart_name in sorted(imported):
+            index.update_chart(chart_name)
+        index.save()
+        return sorted(imported)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import osu!mania osz archives.")
+    parser.add_argument("directory", help="directory with osz archives")
+    parser.add_argument("--keys", type=int, default=4, help="key count to import")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    arguments = parser.parse_args()
+    importer = Importer(arguments.directory, arguments.keys, arguments.workers)
+    charts = importer.run()
+    print(f"Imported {len(charts)} charts.")
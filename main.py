@@ -1,4 +1,5 @@
 import pygame as pg
+import argparse
 import os
 from pygame.locals import *
 
@@ -13,9 +14,17 @@ import performance
 import ui
 import graphics
 import spawner
+import resampler
+import writer
+import history
+import rating
+import sync
 
 # Constants
 FPS = 1000
+SEEK_STEP = 5000  # ms
+SEEK_LEAD_IN = 2000  # ms
+HIDDEN_PROGRESS = -0.25
 
 
 class Game:
@@ -26,7 +35,9 @@ class Game:
     TODO
     """
 
-    def __init__(self, width: int, height: int, initialization_flags) -> None:
+    def __init__(
+        self, width: int, height: int, initialization_flags, data_directory=None
+    ) -> None:
         """
         Parameters
         ----------
@@ -36,6 +47,9 @@ class Game:
             Screen height.
         initialization_flags : int
             Window initialization flags.
+        data_directory : str, optional
+            Directory of the leaderboard and play history. Defaults to the
+            game directory.
 
         Raises
         ----------
@@ -52,12 +66,17 @@ class Game:
             raise ValueError("Height must be greater than zero.")
 
         self.running = True
-        self.settings = settings.Settings()
+        self.writer = writer.BackgroundWriter()
+        self.settings = settings.Settings(self.writer)
         self._flags = initialization_flags
+        self.data_directory = data_directory
         self.size = self.width, self.height = width, height
 
     def on_init(self) -> None:
         """Used to initialize the pygame module, game window and variables."""
+        audioplayer.AudioPlayer.configure_mixer(
+            frequency=self.settings.audio_frequency, buffer=self.settings.audio_buffer
+        )
         pg.init()
         pg.display.set_caption("Koli Rhythm")
         self.screen = pg.display.set_mode(self.size, self._flags)
@@ -67,11 +86,13 @@ class Game:
 
         self.clock = pg.time.Clock()
         self.audioPlayer = None
+        self.preview_player = audioplayer.PreviewPlayer()
+        self.resampler = resampler.Resampler()
+        self.previewed_chart = None
         self.game_state = enums.GameState.MAIN_MENU
 
         self.lastGrade = ""
         self.fps = self.get_fps()
-        self.wait_before_playing = 1000
         self.all_recent_hits = []
 
         self.enter_is_pressed = False
@@ -89,11 +110,25 @@ class Game:
             self.settings.volume,
             self.settings.username,
         )
-        self.charts_menu = menu.Charts(self.font)
+        self.charts_menu = menu.Charts(self.font, self.chart_index)
         self.pause_menu = menu.Pause(self.font)
 
     def load_resources(self) -> None:
         """Used to load game resources."""
+        self.chart_index = chart.ChartIndex()
+        database_location = history_directory = None
+        if self.data_directory is not None:
+            database_location = os.path.join(self.data_directory, "leaderboard.db")
+            history_directory = os.path.join(self.data_directory, "history")
+        self.leaderboard = performance.Leaderboard(database_location, self.writer)
+        self.history = history.PlayHistory(history_directory)
+        self.player_ratings = rating.PlayerRatings(self.leaderboard)
+        self.sync_client = None
+        if self.settings.sync_url:
+            self.sync_client = sync.SyncClient(
+                self.leaderboard.database_location, self.settings.sync_url
+            )
+            self.sync_client.start()
         self.button_bar = graphics.ButtonBar()
         self.font = pg.font.Font(os.path.join("fonts", "PixeloidSansBold.ttf"), 45)
         self.small_font = pg.font.Font(
@@ -123,21 +158,111 @@ class Game:
         )
 
     def update_notes(self) -> None:
-        """Used to update the position of notes relative to the audio player's timer."""
-        for note in self.notes:
-            progress = self.get_note_progress(note)
-            note.update_vertical_position(progress)
-            if progress >= 0.7:
+        """Used to update the position of notes relative to the audio player's timer.
+
+        Notes are sorted by timing and by scroll position, so the loop stops
+        at the first note that is neither on screen nor clickable.
+        """
+        self.scroll_position = self.spawner.scroll_table.get_position(
+            self.audioPlayer.songPosition
+        )
+        self.visible_end = self.note_cursor
+        for index in range(self.note_cursor, self.note_end):
+            note = self.notes[index]
+            if not note.is_active:
+                continue
+            hit_error = self.audioPlayer.songPosition - note.timing
+            scroll_progress = self.get_note_scroll_progress(note)
+            if (
+                hit_error < -performance.MISS_WINDOW
+                and scroll_progress < HIDDEN_PROGRESS
+            ):
+                break
+            self.visible_end = index + 1
+            note.update_vertical_position(scroll_progress)
+            if hit_error >= -performance.MISS_WINDOW:
                 note.is_clickable = True
-            if progress > 1.3:
+            if hit_error > performance.MISS_WINDOW:
                 self.performance.max_possible_combo += 1
                 if self.performance.combo >= self.performance.max_combo:
                     self.performance.max_combo = self.performance.combo
                 self.performance.combo = 0
-                self.notes.remove(note)
+                note.is_active = False
+        self.advance_note_cursor()
+
+    def advance_note_cursor(self) -> None:
+        """Used to move the note cursor past notes that were hit or missed."""
+        while (
+            self.note_cursor < self.note_end
+            and not self.notes[self.note_cursor].is_active
+        ):
+            self.note_cursor += 1
+
+    def reset_note_window(self) -> None:
+        """Used to make the whole chart playable and remove the practice loop."""
+        self.note_cursor = 0
+        self.note_end = len(self.notes)
+        self.visible_end = 0
+        self.practiced = False
+        self.loop_start = None
+        self.loop_end = None
+
+    def seek(self, position: int) -> None:
+        """Used to continue the chart from a song position.
+
+        Notes before the position are skipped with a binary search over the
+        sorted note timings. Notes of the section are reused in place, so
+        jumping back to the start of a practice loop allocates nothing.
+
+        Parameters
+        ----------
+        position : int
+            Song position in milliseconds.
+        """
+        position = max(int(position), 0)
+        self.note_cursor = self.spawner.get_note_index(position)
+        self.note_end = len(self.notes)
+        if self.loop_end is not None:
+            self.note_end = self.spawner.get_note_index(self.loop_end)
+        self.visible_end = self.note_cursor
+        for index in range(self.note_cursor, self.note_end):
+            note = self.notes[index]
+            note.is_active = True
+            note.is_clickable = False
+        self.performance.reset()
+        self.all_recent_hits.clear()
+        self.practiced = True
+        self.audioPlayer.play_song(max(position - SEEK_LEAD_IN, 0))
+        self.started_playing_song = True
+        self.audioPlayer.update()
+
+    def set_loop_start(self) -> None:
+        """Used to mark the current song position as the start of the practice loop."""
+        self.loop_start = max(self.audioPlayer.songPosition, 0)
+        self.loop_end = None
+        self.note_end = len(self.notes)
+
+    def set_loop_end(self) -> None:
+        """Used to mark the current song position as the end of the practice loop.
+
+        The loop starts playing right away.
+        """
+        if self.loop_start is None or self.audioPlayer.songPosition <= self.loop_start:
+            return
+        self.loop_end = self.audioPlayer.songPosition
+        self.seek(self.loop_start)
+
+    def clear_loop(self) -> None:
+        """Used to stop looping the practice section."""
+        self.loop_start = None
+        self.loop_end = None
+        self.note_end = len(self.notes)
 
-    def get_note_progress(self, note: graphics.Note) -> float:
-        """Used to calculate the progress of a note.
+    def get_note_scroll_progress(self, note: graphics.Note) -> float:
+        """Used to calculate the on-screen progress of a note.
+
+        It follows BPM and slider velocity changes of the chart, while
+        judgement only depends on the hit error in milliseconds.
 
         Parameters
         ----------
@@ -147,23 +272,13 @@ class Game:
         Returns
         ----------
         float
-            Calculated note progress.
-
-        Raises
-        ----------
-        AssertionError
-            Note is not an instance of the Note class.
+            Calculated scroll progress.
         """
-        assert isinstance(
-            note, graphics.Note
-        ), "Note must be an instance of the Note class."
-        progress = 1 - (
-            (note.timing + self.wait_before_playing - self.audioPlayer.songPosition)
-            / self.settings.time_to_react
+        return 1 - (
+            (note.scroll_position - self.scroll_position) / self.settings.time_to_react
         )
-        return progress
 
-    def destroy_note(self, line: int) -> None:
+    def destroy_note(self, line: int):
         """Used to destroy the note on the desired line.
 
         Parameters
@@ -171,6 +286,11 @@ class Game:
         line : int
             Line number.
 
+        Returns
+        ----------
+        graphics.Note or None
+            Destroyed note, or None if no note on the line could be hit.
+
         Raises
         ----------
         AssertionError
@@ -184,17 +304,23 @@ class Game:
                 "The line number must be greater than zero and less than 4."
             )
 
-        for note in self.notes:
-            if note.line == line and note.is_clickable:
+        destroyed_note = None
+        for index in range(self.note_cursor, self.note_end):
+            note = self.notes[index]
+            if note.is_active and note.line == line and note.is_clickable:
                 self.performance.max_possible_combo += 1
-                self.audioPlayer.hitSound.play()
-                self.notes.remove(note)
+                note.is_active = False
+                destroyed_note = note
                 break
+        self.advance_note_cursor()
+        return destroyed_note
 
     def draw_notes(self) -> None:
         """Used to draw notes on screen."""
-        for note in self.notes:
-            note.draw(self.screen)
+        for index in range(self.note_cursor, self.visible_end):
+            note = self.notes[index]
+            if note.is_active:
+                note.draw(self.screen)
 
     def draw_bar(self) -> None:
         """Used to draw a judgement bar on screen."""
@@ -227,9 +353,14 @@ class Game:
         self.started_playing_song = False
         self.notes.clear()
         self.notes = self.spawner.spawn_notes(self.screen)
-        self.performance = performance.Performance(self.settings.username)
+        self.reset_note_window()
+        self.performance = performance.Performance(
+            self.settings.username, len(self.notes)
+        )
         self.audioPlayer = audioplayer.AudioPlayer(
-            self.selected_chart.bpm, self.selected_chart.audio
+            self.selected_chart.bpm * self.rate,
+            self.song_source,
+            self.settings.get_offset(self.selected_chart.chart_name),
         )
         self.audioPlayer.change_volume(self.settings.volume / 100)
         self.audioPlayer.play_song()
@@ -253,18 +384,27 @@ class Game:
                 "The line number must be greater than zero and less than 4."
             )
 
-        note = self.notes[0]
-        progress = self.get_note_progress(note)
+        if self.note_cursor >= self.note_end:
+            return
         self.pressed_keys[line - 1] = True
-        self.destroy_note(line)
-        self.lastGrade = self.performance.get_grade(progress=progress)
+        destroyed_note = self.destroy_note(line)
+        note = destroyed_note
+        if note is None:
+            note = self.notes[self.note_cursor]
+        hit_error = self.audioPlayer.songPosition - note.timing
+        judgement = performance.get_judgement(hit_error)
+        self.lastGrade = performance.JUDGEMENT_NAMES[judgement]
+        self.performance.add_score(judgement)
+        self.performance.update_combo(judgement)
+        self.performance.update_hits_counter(judgement)
         self.performance.update_accuracy()
-        self.performance.add_score(self.lastGrade)
-        self.performance.update_combo(self.lastGrade)
-        self.performance.update_hits_counter(self.lastGrade)
-        hit = graphics.Hit(progress=progress)
+        if destroyed_note is not None:
+            self.performance.record_hit(hit_error, line, destroyed_note.timing)
+        else:
+            self.performance.record_stray(hit_error, note.timing)
+        hit = graphics.Hit(hit_error, judgement)
         self.all_recent_hits.append(hit)
-        self.audioPlayer.hitSound.play()
+        self.audioPlayer.play_hitsound()
 
     def handle_username_input(self, event: pg.event.Event) -> None:
         """Used to handle username input.
@@ -300,16 +440,82 @@ class Game:
                 selected_button = self.main_menu.get_selected_button()
                 if selected_button == 0:
                     self.game_state = enums.GameState.CHART_SELECT_MENU
-                    self.charts = self.charts_menu.get_chart_names()
                 elif selected_button == 1:
-                    self.game_state = enums.GameState.SETTINGS_MENU
+                    self.calibration_menu = menu.Calibration(
+                        self.font,
+                        self.small_font,
+                        audioplayer.cache.get_hitsound_pool(),
+                    )
+                    self.game_state = enums.GameState.CALIBRATION
                 elif selected_button == 2:
+                    self.game_state = enums.GameState.SETTINGS_MENU
+                elif selected_button == 3:
                     self.running = False
 
         if event.type == KEYUP:
             if event.key == K_RETURN:
                 self.enter_is_pressed = False
 
+    def select_chart(self, chart_name: str) -> None:
+        """Used to load a chart and open its difficulty select menu.
+
+        Parameters
+        ----------
+        chart_name : str
+            The name of the chart folder.
+        """
+        self.selected_chart = chart.Chart(
+            chart_name, self.chart_index.charts.get(chart_name)
+        )
+        self.background = graphics.Background(self.selected_chart.background)
+        self.background.image = pg.transform.scale(self.background.image, self.size)
+        self.difficulties_menu = menu.Difficulties(
+            self.font,
+            self.selected_chart,
+            self.settings.chart_offsets.get(chart_name, 0),
+        )
+        self.game_state = enums.GameState.DIFFICULTY_SELECT_MENU
+
+    def start_chart(self, difficulty_index: int, rate: float = 1.0) -> None:
+        """Used to start playing a difficulty of the selected chart.
+
+        Parameters
+        ----------
+        difficulty_index : int
+            Index of the difficulty in the selected chart.
+        rate : float
+            Playback rate. The chart is played at 1.0 if the song is not
+            resampled to the rate.
+        """
+        self.selected_difficulty = self.selected_chart.difficulties[difficulty_index]
+        self.song_source = self.resampler.get_song(self.selected_chart.audio, rate)
+        if self.song_source is None:
+            rate = 1.0
+            self.song_source = self.selected_chart.audio
+        self.rate = rate
+        self.spawner = spawner.Spawner(self.selected_difficulty, self.rate)
+        self.notes = self.spawner.spawn_notes(self.screen)
+        self.reset_note_window()
+        self.performance = performance.Performance(
+            player_name=self.settings.username, note_count=len(self.notes)
+        )
+        self.user_interface = ui.UserInterface(
+            score=self.performance.score,
+            last_grade=self.lastGrade,
+            combo=self.performance.combo,
+            accuracy=self.performance.accuracy,
+            fps=self.fps,
+        )
+        self.game_state = enums.GameState.PLAYING
+        self.preview_player.stop(fade=False)
+        self.previewed_chart = None
+        self.audioPlayer = audioplayer.AudioPlayer(
+            self.selected_chart.bpm * self.rate,
+            self.song_source,
+            self.settings.get_offset(self.selected_chart.chart_name),
+        )
+        self.audioPlayer.change_volume(self.settings.volume / 100)
+
     def handle_chart_select_menu(self, event: pg.event.Event) -> None:
         """Used to handle chart select menu.
 
@@ -320,19 +526,17 @@ class Game:
         """
         self.charts_menu.update(event=event)
         if event.type == KEYDOWN:
-            if event.key == K_RETURN and not self.enter_is_pressed:
+            chart_name = self.charts_menu.get_selected_chart()
+            if (
+                event.key == K_RETURN
+                and not self.enter_is_pressed
+                and chart_name is not None
+            ):
                 self.enter_is_pressed = True
-                selected_button = self.charts_menu.get_selected_button()
-                self.selected_chart = chart.Chart(self.charts[selected_button])
-                self.background = graphics.Background(self.selected_chart.background)
-                self.background.image = pg.transform.scale(
-                    self.background.image, self.size
-                )
-                self.difficulties_menu = menu.Difficulties(
-                    self.font, self.selected_chart
-                )
-                self.game_state = enums.GameState.DIFFICULTY_SELECT_MENU
+                self.select_chart(chart_name)
             if event.key == K_ESCAPE:
+                self.preview_player.stop()
+                self.previewed_chart = None
                 self.game_state = enums.GameState.MAIN_MENU
 
         if event.type == KEYUP:
@@ -350,30 +554,27 @@ class Game:
         self.difficulties_menu.update(event=event)
         selected_button = self.difficulties_menu.get_selected_button()
         if event.type == KEYDOWN:
-            if event.key == K_RETURN and not self.enter_is_pressed:
+            rate = self.difficulties_menu.get_rate()
+            if (
+                event.key == K_RETURN
+                and not self.enter_is_pressed
+                and not self.resampler.is_pending(self.selected_chart.audio, rate)
+            ):
                 self.enter_is_pressed = True
-                self.selected_difficulty = self.selected_chart.difficulties[
-                    selected_button
-                ]
-                self.spawner = spawner.Spawner(self.selected_difficulty)
-                self.notes = self.spawner.spawn_notes(self.screen)
-                self.performance = performance.Performance(
-                    player_name=self.settings.username
-                )
-                self.user_interface = ui.UserInterface(
-                    score=self.performance.score,
-                    last_grade=self.lastGrade,
-                    combo=self.performance.combo,
-                    accuracy=self.performance.accuracy,
-                    fps=self.fps,
+                self.start_chart(selected_button, rate)
+            if event.key in (K_LEFT, K_RIGHT):
+                self.resampler.request(
+                    self.selected_chart.audio, self.difficulties_menu.get_rate()
                 )
-                self.game_state = enums.GameState.PLAYING
-                self.audioPlayer = audioplayer.AudioPlayer(
-                    self.selected_chart.bpm, self.selected_chart.audio
-                )
-                self.audioPlayer.change_volume(self.settings.volume / 100)
             if event.key == K_ESCAPE:
                 self.game_state = enums.GameState.CHART_SELECT_MENU
+            if event.key in (K_MINUS, K_EQUALS):
+                chart_name = self.selected_chart.chart_name
+                change = 5 if event.key == K_EQUALS else -5
+                self.settings.change_chart_offset(chart_name, change)
+                self.difficulties_menu.offset = self.settings.chart_offsets.get(
+                    chart_name, 0
+                )
         if event.type == KEYUP:
             if event.key == K_RETURN:
                 self.enter_is_pressed = False
@@ -462,6 +663,30 @@ class Game:
             if event.key == K_RETURN:
                 self.enter_is_pressed = False
 
+    def handle_calibration(self, event: pg.event.Event) -> None:
+        """Used to handle calibration screen.
+
+        Parameters
+        ----------
+        event : pg.event.Event
+            Pygame event.
+        """
+        self.calibration_menu.update(event)
+        if event.type == KEYDOWN:
+            if event.key == K_ESCAPE:
+                self.game_state = enums.GameState.MAIN_MENU
+            if event.key == K_RETURN and not self.enter_is_pressed:
+                self.enter_is_pressed = True
+                result = self.calibration_menu.get_result()
+                if result is not None:
+                    self.settings.audio_offset = round(result[0])
+                    self.settings.save()
+                self.game_state = enums.GameState.MAIN_MENU
+
+        if event.type == KEYUP:
+            if event.key == K_RETURN:
+                self.enter_is_pressed = False
+
     def handle_endscreen(self, event: pg.event.Event) -> None:
         """Used to handle endscreen.
 
@@ -493,6 +718,21 @@ class Game:
             if event.key == K_MINUS:
                 self.settings.decrement_note_speed()
 
+            if event.key == K_LEFT:
+                self.seek(self.audioPlayer.songPosition - SEEK_STEP)
+
+            if event.key == K_RIGHT:
+                self.seek(self.audioPlayer.songPosition + SEEK_STEP)
+
+            if event.key == K_LEFTBRACKET:
+                self.set_loop_start()
+
+            if event.key == K_RIGHTBRACKET:
+                self.set_loop_end()
+
+            if event.key == K_BACKSPACE:
+                self.clear_loop()
+
             if event.key == K_d and not self.pressed_keys[0]:
                 self.handle_note(line=1)
 
@@ -544,7 +784,7 @@ class Game:
     def get_last_note_timing(self) -> int:
         """Used to get the timing of the last note in the chart."""
         sorted_notes = list(self.selected_difficulty.notes.items())
-        return int(sorted_notes[-1][0])
+        return int(int(sorted_notes[-1][0]) / self.rate)
 
     def end_of_the_chart(self) -> bool:
         """Used to check the end state of the chart.
@@ -557,6 +797,44 @@ class Game:
             return True
         return False
 
+    def save_result(self):
+        """Used to add the finished play to the play history and leaderboard.
+
+        Every play is kept in the history, but plays that used seeking or the
+        practice loop are not added to the leaderboard or the player rating.
+
+        Returns
+        ----------
+        int or None
+            Rank of the result, or None if it was not saved.
+        """
+        difficulty = performance.get_difficulty_label(
+            self.selected_difficulty.difficulty, self.rate
+        )
+        record = self.history.get_record(
+            self.performance,
+            self.selected_difficulty.hash,
+            difficulty,
+            self.rate,
+            self.practiced,
+        )
+        self.writer.submit_unique(self.history.append, record)
+        if self.practiced:
+            return None
+        self.player_ratings.add(
+            self.performance.player_name,
+            self.selected_difficulty.hash,
+            difficulty,
+            self.selected_difficulty.stars * self.rate,
+            self.performance.accuracy,
+        )
+        rank = self.leaderboard.add(
+            self.performance, self.selected_difficulty.hash, difficulty, self.rate
+        )
+        if self.sync_client is not None:
+            self.writer.submit_unique(self.sync_client.notify)
+        return rank
+
     def on_event(self, event: pg.event.Event) -> None:
         """Used to handle pygame events.
 
@@ -586,13 +864,48 @@ class Game:
         if self.game_state == enums.GameState.ENDSCREEN:
             self.handle_endscreen(event=event)
 
+        if self.game_state == enums.GameState.CALIBRATION:
+            self.handle_calibration(event=event)
+
         if self.game_state == enums.GameState.PLAYING:
             self.handle_gameplay(event=event)
 
+    def update_preview(self) -> None:
+        """Used to play a preview of the chart under the cursor."""
+        chart_name = self.charts_menu.get_selected_chart()
+        if chart_name != self.previewed_chart:
+            self.previewed_chart = chart_name
+            if chart_name is None:
+                self.preview_player.stop()
+            else:
+                entry = self.chart_index.charts[chart_name]
+                start = entry["preview"]
+                if start < 0:
+                    start = entry["peak_time"] - 2000
+                self.preview_player.request(entry["audio"], start)
+        self.preview_player.update(self.settings.volume / 100)
+
     def on_loop(self) -> None:
         """Used to perform a game loop."""
+        if self.game_state == enums.GameState.CHART_SELECT_MENU:
+            self.update_preview()
+
+        if self.game_state == enums.GameState.DIFFICULTY_SELECT_MENU:
+            self.preview_player.update(self.settings.volume / 100)
+
+        if self.game_state == enums.GameState.CALIBRATION:
+            self.calibration_menu.tick()
+
         if self.game_state == enums.GameState.PLAYING:
             if self.end_of_the_chart():
+                self.endscreen = menu.Endscreen(
+                    self.font,
+                    self.small_font,
+                    self.performance,
+                    self.background.image,
+                    self.save_result(),
+                    self.selected_difficulty.analysis["density"],
+                )
                 self.game_state = enums.GameState.ENDSCREEN
 
             self.start_playing_song()
@@ -606,6 +919,11 @@ class Game:
             self.update_notes()
             self.update_hits()
             self.audioPlayer.update()
+            if (
+                self.loop_end is not None
+                and self.audioPlayer.songPosition >= self.loop_end
+            ):
+                self.seek(self.loop_start)
 
     def draw_gameplay(self) -> None:
         """Used to draw chart background, notes and other UI elements."""
@@ -627,22 +945,31 @@ class Game:
         """Used to perform rendering on screen."""
         self.clock.tick(FPS)
         if self.game_state == enums.GameState.MAIN_MENU:
+            self.main_menu.set_player_rating(
+                self.settings.username,
+                self.player_ratings.get_player_rating(self.settings.username),
+            )
             self.main_menu.draw(self.screen)
 
         if self.game_state == enums.GameState.CHART_SELECT_MENU:
             self.charts_menu.draw(self.screen)
 
         if self.game_state == enums.GameState.DIFFICULTY_SELECT_MENU:
+            rate = self.difficulties_menu.get_rate()
+            self.difficulties_menu.rate_status = ""
+            if self.resampler.is_pending(self.selected_chart.audio, rate):
+                self.difficulties_menu.rate_status = "preparing"
+            elif self.resampler.get_error(self.selected_chart.audio, rate):
+                self.difficulties_menu.rate_status = "unavailable"
             self.difficulties_menu.draw(self.screen)
 
         if self.game_state == enums.GameState.SETTINGS_MENU:
             self.settings_menu.draw(self.screen)
 
+        if self.game_state == enums.GameState.CALIBRATION:
+            self.calibration_menu.draw(self.screen)
+
         if self.game_state == enums.GameState.ENDSCREEN:
-            self.screen.blit(self.background.image, (0, 0))
-            self.endscreen = menu.Endscreen(
-                self.font, self.small_font, self.performance
-            )
             self.endscreen.draw(self.screen)
 
         if self.game_state == enums.GameState.PLAYING:
@@ -657,6 +984,10 @@ class Game:
     def on_closure(self) -> None:
         """Used to handle code when the game is closed."""
         self.settings.save()
+        if self.sync_client is not None:
+            self.sync_client.close()
+        self.leaderboard.close()
+        self.writer.close()
         pg.quit()
 
     def on_execute(self) -> None:
@@ -672,6 +1003,26 @@ class Game:
 
 
 if __name__ == "__main__":
-    flags = FULLSCREEN | SCALED | HWSURFACE
-    game = Game(width=1280, height=720, initialization_flags=flags)
-    game.on_execute()
+    parser = argparse.ArgumentParser(description="Koli Rhythm")
+    parser.add_argument(
+        "--calibrate-audio",
+        action="store_true",
+        help="find the smallest stable audio buffer size and save it",
+    )
+    arguments = parser.parse_args()
+    if arguments.calibrate_audio:
+        game_settings = settings.Settings()
+        audio_buffer = audioplayer.calibrate_buffer(game_settings.audio_frequency)
+        if audio_buffer is None:
+            print(
+                "Audio calibration failed: no buffer size played without "
+                f"underruns. Keeping {game_settings.audio_buffer}."
+            )
+        else:
+            game_settings.audio_buffer = audio_buffer
+            game_settings.save()
+            print(f"Audio buffer size set to {game_settings.audio_buffer}.")
+    else:
+        flags = FULLSCREEN | SCALED | HWSURFACE
+        game = Game(width=1280, height=720, initialization_flags=flags)
+        game.on_execute()
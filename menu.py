@@ -1,13 +1,49 @@
-import os
 import pygame as pg
 from abc import ABC, abstractmethod
 import chart
 import enums
 import text
 import performance
+import resampler
+import search
 from pygame.locals import *
 
 
+def get_density_graph(density: list, size: tuple) -> pg.surface.Surface:
+    """Used to render the note density graph of a difficulty.
+
+    Parameters
+    ----------
+    density : list
+        Note counts of equal sections of the difficulty.
+    size : tuple
+        Width and height of the graph.
+
+    Returns
+    ----------
+    pg.surface.Surface
+        Density graph surface.
+    """
+    graph = pg.Surface(size, pg.SRCALPHA)
+    if not density:
+        return graph
+    bar_width = graph.get_width() / len(density)
+    highest = max(max(density), 1)
+    for bin_index, count in enumerate(density):
+        bar_height = round(graph.get_height() * count / highest)
+        pg.draw.rect(
+            graph,
+            enums.Color.PERFECT.value,
+            (
+                round(bin_index * bar_width),
+                graph.get_height() - bar_height,
+                max(round(bar_width) - 2, 1),
+                bar_height,
+            ),
+        )
+    return graph
+
+
 class Menu(ABC):
     """The abstract class used to represent a menu.
 
@@ -112,6 +148,8 @@ class Main(Menu):
         Used to get formated button texts.
     get_selected_button()
         Used to get selected button number.
+    set_player_rating(player_name, rating)
+        Used to set the player rating shown under the buttons.
     update(event)
         Used to update menu.
     draw(screen)
@@ -120,7 +158,8 @@ class Main(Menu):
 
     def __init__(self, font: pg.font.Font) -> None:
         super().__init__(font)
-        self.buttons = ["Play", "Settings", "Quit"]
+        self.buttons = ["Play", "Calibrate", "Settings", "Quit"]
+        self.player_rating = ""
 
     def get_formated_buttons(self) -> list:
         formated_buttons = []
@@ -136,6 +175,24 @@ class Main(Menu):
     def get_selected_button(self) -> int:
         return self.selected_button
 
+    def set_player_rating(self, player_name: str, rating: float) -> None:
+        """Used to set the player rating shown under the buttons.
+
+        Parameters
+        ----------
+        player_name : str
+            Player username.
+        rating : float
+            Rating of the player.
+
+        Raises
+        ------
+        AssertionError
+            player_name is not a string.
+        """
+        assert isinstance(player_name, str), "player_name must be a string."
+        self.player_rating = f"{player_name}: {rating:.0f} pp"
+
     def update(self, event: pg.event.Event) -> None:
         if event.type == KEYDOWN:
             if event.key == K_DOWN:
@@ -151,6 +208,19 @@ class Main(Menu):
 
     def draw(self, screen: pg.surface.Surface) -> None:
         screen.fill((0, 0, 0))
+        if self.player_rating:
+            surface = text.TextWithShadow(
+                self.player_rating,
+                self.font,
+                enums.Color.WHITE.value,
+                enums.Color.BLACK.value,
+                4,
+            )
+            surface.draw(
+                screen.get_width() / 2 - surface.get_width() / 2,
+                screen.get_height() - 100,
+                screen,
+            )
         surface = text.TextWithShadow(
             "Koli Rhythm",
             self.font,
@@ -180,24 +250,68 @@ class Main(Menu):
 class Charts(Menu):
     """The class used to represent a chart select menu.
 
+    Only the rows that fit on screen are drawn, and their text surfaces are
+    cached. Typing filters the list through a search index over title, artist
+    and mapper.
+
     Methods
     -------
     get_chart_names()
         Used to get chart names.
+    get_selected_chart()
+        Used to get the folder name of the selected chart.
     get_formated_buttons()
         Used to get formated button texts.
     get_selected_button()
         Used to get selected button number.
+    get_row_surface(row, selected)
+        Used to get the cached text surface of a row.
+    set_query(query)
+        Used to filter the list with a search query.
     update(event)
         Used to update menu.
     draw(screen)
         Used to draw menu on screen.
     """
 
-    def __init__(self, font: pg.font.Font) -> None:
+    row_height = 80
+    list_top = 220
+    cache_size = 256
+
+    def __init__(self, font: pg.font.Font, chart_index: chart.ChartIndex) -> None:
+        """
+        Parameters
+        ----------
+        font : pg.font.Font
+            Pygame font.
+        chart_index : chart.ChartIndex
+            Index of all installed charts.
+
+        Raises
+        ------
+        AssertionError
+            font is not an instance of the pg.font.Font class.
+        AssertionError
+            chart_index is not an instance of the chart.ChartIndex class.
+        """
+        assert isinstance(
+            chart_index, chart.ChartIndex
+        ), "chart_index must be an instance of the chart.ChartIndex class."
         super().__init__(font)
+        self.chart_index = chart_index
         self.buttons = self.get_chart_names()
+        self.search_index = search.SearchIndex()
+        for row, chart_name in enumerate(self.buttons):
+            entry = self.chart_index.charts[chart_name]
+            self.search_index.add(
+                row, [entry["title"], entry["artist"], entry["mapper"]]
+            )
+        self.query = ""
+        self.filtered = list(range(len(self.buttons)))
         self.selected_button = 0
+        self.row_surfaces = dict()
+        self.scroll = 0.0
+        self.last_draw = pg.time.get_ticks()
 
     def get_chart_names(self) -> list:
         """Used to get chart names.
@@ -205,44 +319,105 @@ class Charts(Menu):
         Returns
         ----------
         list
-            List of chart names.
+            List of chart names, sorted by title.
         """
-        chart_names = [
-            f.name for f in os.scandir(os.path.join("src", "charts")) if f.is_dir()
-        ]
-        return chart_names
+        charts = self.chart_index.charts
+        return sorted(charts, key=lambda name: charts[name]["title"].lower())
+
+    def get_selected_chart(self):
+        """Used to get the folder name of the selected chart.
+
+        Returns
+        ----------
+        str or None
+            Folder name of the selected chart, None if nothing matches the search.
+        """
+        if not self.filtered:
+            return None
+        return self.buttons[self.filtered[self.selected_button]]
 
     def get_formated_buttons(self) -> list:
         formated_buttons = []
-        for button in self.buttons:
-            button_index = self.buttons.index(button)
-            if button_index == self.selected_button:
-                formated_button = f"> {self.buttons[button_index]} <"
-                formated_buttons.append(formated_button)
+        for position, row in enumerate(self.filtered):
+            if position == self.selected_button:
+                formated_buttons.append(f"> {self.buttons[row]} <")
             else:
-                formated_buttons.append(button)
+                formated_buttons.append(self.buttons[row])
         return formated_buttons
 
     def get_selected_button(self) -> int:
         return self.selected_button
 
+    def get_row_surface(self, row: int, selected: bool) -> text.TextWithShadow:
+        """Used to get the cached text surface of a row.
+
+        Parameters
+        ----------
+        row : int
+            Row number.
+        selected : bool
+            The row is selected.
+
+        Returns
+        ----------
+        text.TextWithShadow
+            Text surface of the row.
+        """
+        key = (row, selected)
+        if key not in self.row_surfaces:
+            if len(self.row_surfaces) >= self.cache_size:
+                self.row_surfaces.clear()
+            title = self.chart_index.charts[self.buttons[row]]["title"]
+            self.row_surfaces[key] = text.TextWithShadow(
+                f"> {title} <" if selected else title,
+                self.font,
+                enums.Color.WHITE.value,
+                enums.Color.BLACK.value,
+                4,
+            )
+        return self.row_surfaces[key]
+
+    def set_query(self, query: str) -> None:
+        """Used to filter the list with a search query.
+
+        Parameters
+        ----------
+        query : str
+            Search query.
+        """
+        assert isinstance(query, str), "query must be a string."
+        self.query = query
+        self.filtered = self.search_index.search(query)
+        self.selected_button = 0
+
     def update(self, event: pg.event.Event) -> None:
         if event.type == KEYDOWN:
-            if event.key == K_DOWN:
-                if self.selected_button < len(self.buttons) - 1:
+            if event.key == K_DOWN and self.filtered:
+                if self.selected_button < len(self.filtered) - 1:
                     self.selected_button += 1
                 else:
                     self.selected_button = 0
-            if event.key == K_UP:
+            elif event.key == K_UP and self.filtered:
                 if self.selected_button > 0:
                     self.selected_button -= 1
                 else:
-                    self.selected_button = len(self.buttons) - 1
+                    self.selected_button = len(self.filtered) - 1
+            elif event.key == K_PAGEDOWN and self.filtered:
+                self.selected_button = min(
+                    self.selected_button + 5, len(self.filtered) - 1
+                )
+            elif event.key == K_PAGEUP:
+                self.selected_button = max(self.selected_button - 5, 0)
+            elif event.key == K_BACKSPACE:
+                if self.query:
+                    self.set_query(self.query[:-1])
+            elif event.unicode and event.unicode.isprintable():
+                self.set_query(self.query + event.unicode)
 
     def draw(self, screen: pg.surface.Surface) -> None:
         screen.fill((0, 0, 0))
         surface = text.TextWithShadow(
-            "Charts",
+            f"Search: {self.query}_" if self.query else "Charts",
             self.font,
             enums.Color.WHITE.value,
             enums.Color.BLACK.value,
@@ -254,17 +429,29 @@ class Charts(Menu):
             screen,
         )
 
-        formated_buttons = self.get_formated_buttons()
-        offset = 0
-
-        for button in formated_buttons:
-            surface = text.TextWithShadow(
-                button, self.font, enums.Color.WHITE.value, enums.Color.BLACK.value, 4
+        now = pg.time.get_ticks()
+        elapsed = (now - self.last_draw) / 1000
+        self.last_draw = now
+        list_height = screen.get_height() - self.list_top - 40
+        visible_rows = max(list_height // self.row_height, 1)
+        target = max(self.selected_button - visible_rows // 2, 0) * self.row_height
+        self.scroll += (target - self.scroll) * min(elapsed * 12, 1)
+
+        first = int(self.scroll // self.row_height)
+        last = min(first + visible_rows + 1, len(self.filtered))
+        screen.set_clip(
+            pg.Rect(0, self.list_top, screen.get_width(), list_height)
+        )
+        for position in range(first, last):
+            surface = self.get_row_surface(
+                self.filtered[position], position == self.selected_button
             )
             surface.draw(
-                screen.get_width() / 2 - surface.get_width() / 2, 220 + offset, screen
+                screen.get_width() / 2 - surface.get_width() / 2,
+                self.list_top + position * self.row_height - self.scroll,
+                screen,
             )
-            offset += 80
+        screen.set_clip(None)
 
 
 class Difficulties(Menu):
@@ -276,13 +463,17 @@ class Difficulties(Menu):
         Used to get formated button texts.
     get_selected_button()
         Used to get selected button number.
+    get_density_graph(difficulty_index)
+        Used to get the note density graph of a difficulty.
+    get_rate()
+        Used to get the selected playback rate.
     update(event)
         Used to update menu.
     draw(screen)
         Used to draw menu on screen.
     """
 
-    def __init__(self, font: pg.font.Font, chart: chart.Chart) -> None:
+    def __init__(self, font: pg.font.Font, chart: chart.Chart, offset: int = 0) -> None:
         """
         Parameters
         ----------
@@ -290,6 +481,8 @@ class Difficulties(Menu):
             Pygame font.
         chart : chart.Chart
             Selected chart.
+        offset : int
+            Offset of the chart in milliseconds.
 
         Raises
         ------
@@ -297,8 +490,16 @@ class Difficulties(Menu):
             font is not an instance of the pg.font.Font class.
         """
         super().__init__(font)
-        self.buttons = chart.get_difficulty_names()
+        self.offset = offset
+        self.rate_index = resampler.RATES.index(1.0)
+        self.difficulties = chart.difficulties
+        self.buttons = [
+            f"{difficulty.difficulty} ({difficulty.stars:.2f})"
+            for difficulty in self.difficulties
+        ]
         self.selected_button = 0
+        self.density_graphs = dict()
+        self.rate_status = ""
 
     def get_formated_buttons(self) -> list:
         formated_buttons = []
@@ -314,6 +515,38 @@ class Difficulties(Menu):
     def get_selected_button(self) -> int:
         return self.selected_button
 
+    def get_rate(self) -> float:
+        """Used to get the selected playback rate.
+
+        Returns
+        ----------
+        float
+            Playback rate.
+        """
+        return resampler.RATES[self.rate_index]
+
+    def get_density_graph(self, difficulty_index: int) -> pg.surface.Surface:
+        """Used to get the note density graph of a difficulty.
+
+        The graph is rendered once from the cached analysis and reused on
+        every following frame.
+
+        Parameters
+        ----------
+        difficulty_index : int
+            Index of the difficulty.
+
+        Returns
+        ----------
+        pg.surface.Surface
+            Density graph surface.
+        """
+        if difficulty_index not in self.density_graphs:
+            self.density_graphs[difficulty_index] = get_density_graph(
+                self.difficulties[difficulty_index].analysis["density"], (640, 80)
+            )
+        return self.density_graphs[difficulty_index]
+
     def update(self, event: pg.event.Event) -> None:
         if event.type == KEYDOWN:
             if event.key == K_DOWN:
@@ -326,11 +559,24 @@ class Difficulties(Menu):
                     self.selected_button -= 1
                 else:
                     self.selected_button = len(self.buttons) - 1
+            if event.key == K_RIGHT:
+                self.rate_index = min(self.rate_index + 1, len(resampler.RATES) - 1)
+            if event.key == K_LEFT:
+                self.rate_index = max(self.rate_index - 1, 0)
 
     def draw(self, screen: pg.surface.Surface) -> None:
         screen.fill((0, 0, 0))
+        graph = self.get_density_graph(self.selected_button)
+        screen.blit(
+            graph,
+            (
+                screen.get_width() / 2 - graph.get_width() / 2,
+                screen.get_height() - 200,
+            ),
+        )
         surface = text.TextWithShadow(
-            "Difficulties",
+            f"Difficulties ({self.get_rate():.2f}x"
+            + (f", {self.rate_status})" if self.rate_status else ")"),
             self.font,
             enums.Color.WHITE.value,
             enums.Color.BLACK.value,
@@ -343,7 +589,7 @@ class Difficulties(Menu):
         )
 
         surface = text.TextWithShadow(
-            "Press ENTER to select",
+            f"ENTER to select | Offset: {self.offset:+d} ms",
             self.font,
             enums.Color.WHITE.value,
             enums.Color.BLACK.value,
@@ -639,11 +885,168 @@ class Settings(Menu):
             offset += 80
 
 
+class Calibration:
+    """The class used to represent an audio offset calibration screen.
+
+    A metronome is played and the player taps along. The offset of every tap
+    from the nearest beat is recorded, and their mean becomes the audio offset.
+
+    Methods
+    -------
+    start()
+        Used to start the metronome.
+    tick()
+        Used to play the metronome beats that are due.
+    get_result()
+        Used to get the mean and the spread of the tap offsets.
+    update(event)
+        Used to record taps.
+    draw(screen)
+        Used to draw calibration screen on screen.
+    """
+
+    beat_interval = 500  # ms
+    warmup_beats = 4
+    minimum_taps = 8
+
+    def __init__(
+        self, font: pg.font.Font, small_font: pg.font.Font, hitsounds
+    ) -> None:
+        """
+        Parameters
+        ----------
+        font : pg.font.Font
+            Pygame font.
+        small_font : pg.font.Font
+            Pygame font.
+        hitsounds : audioplayer.HitsoundPool
+            Pool used to play the metronome.
+
+        Raises
+        ------
+        AssertionError
+            font or small_font is not an instance of the pg.font.Font class.
+        """
+        assert isinstance(
+            font, pg.font.Font
+        ), "font must be an instance of the pg.font.Font class."
+        assert isinstance(
+            small_font, pg.font.Font
+        ), "small_font must be an instance of the pg.font.Font class."
+        self.font = font
+        self.small_font = small_font
+        self.hitsounds = hitsounds
+        self.start()
+
+    def start(self) -> None:
+        """Used to start the metronome."""
+        self.start_time = pg.time.get_ticks() + 1000
+        self.next_beat = 0
+        self.tap_offsets = []
+
+    def tick(self) -> None:
+        """Used to play the metronome beats that are due."""
+        now = pg.time.get_ticks()
+        if now >= self.start_time + self.next_beat * self.beat_interval:
+            self.hitsounds.play()
+            self.next_beat += 1
+
+    def get_result(self) -> tuple:
+        """Used to get the mean and the spread of the tap offsets.
+
+        Returns
+        ----------
+        tuple
+            Mean and standard deviation of the tap offsets in milliseconds,
+            or None if there are not enough taps.
+        """
+        if len(self.tap_offsets) < self.minimum_taps:
+            return None
+        mean = sum(self.tap_offsets) / len(self.tap_offsets)
+        variance = sum((offset - mean) ** 2 for offset in self.tap_offsets) / len(
+            self.tap_offsets
+        )
+        return mean, variance**0.5
+
+    def update(self, event: pg.event.Event) -> None:
+        """Used to record taps.
+
+        Parameters
+        ----------
+        event : pg.event.Event
+            Pygame event.
+        """
+        if event.type == KEYDOWN and event.key in (K_SPACE, K_d, K_f, K_j, K_k):
+            elapsed = pg.time.get_ticks() - self.start_time
+            beat = round(elapsed / self.beat_interval)
+            if beat >= self.warmup_beats:
+                self.tap_offsets.append(elapsed - beat * self.beat_interval)
+
+    def draw(self, screen: pg.surface.Surface) -> None:
+        """Used to draw calibration screen on screen.
+
+        Parameters
+        ----------
+        screen : pg.surface.Surface
+            Display surface.
+        """
+        screen.fill((0, 0, 0))
+        result = self.get_result()
+        if result is None:
+            summary = f"Taps: {len(self.tap_offsets)}/{self.minimum_taps}"
+        else:
+            summary = f"Offset: {round(result[0])} ms | Spread: {round(result[1])} ms"
+        lines = [
+            ("Calibration", self.font),
+            ("Tap SPACE along with the beat", self.small_font),
+            (summary, self.font),
+        ]
+        offset = 0
+        for line, font in lines:
+            surface = text.TextWithShadow(
+                line, font, enums.Color.WHITE.value, enums.Color.BLACK.value, 4
+            )
+            surface.draw(
+                screen.get_width() / 2 - surface.get_width() / 2, 100 + offset, screen
+            )
+            offset += 120
+
+        elapsed = pg.time.get_ticks() - self.start_time
+        if elapsed >= 0 and elapsed % self.beat_interval < 100:
+            pg.draw.circle(
+                screen,
+                enums.Color.PERFECT.value,
+                (screen.get_width() / 2, 500),
+                30,
+            )
+
+        surface = text.TextWithShadow(
+            "ENTER to save | ESCAPE to cancel",
+            self.small_font,
+            enums.Color.WHITE.value,
+            enums.Color.BLACK.value,
+            4,
+        )
+        surface.draw(
+            screen.get_width() / 2 - surface.get_width() / 2,
+            screen.get_height() - 100,
+            screen,
+        )
+
+
 class Endscreen:
     """The class used to represent an Endscreen.
 
+    The background, texts, hit error histogram and note density graph are
+    composed into one surface on initialization, so showing the endscreen
+    is a single blit per frame.
+
     Methods
     -------
+    get_error_histogram(histogram)
+        Used to render the hit error histogram.
+    compose(background, density)
+        Used to compose the whole endscreen into one surface.
     draw(screen)
         Used to draw menu on screen.
     """
@@ -652,7 +1055,10 @@ class Endscreen:
         self,
         font: pg.font.Font,
         small_font: pg.font.Font,
-        performance: performance.Performance,
+        player_performance: performance.Performance,
+        background: pg.surface.Surface,
+        rank=None,
+        density=None,
     ) -> None:
         """
         Parameters
@@ -661,8 +1067,14 @@ class Endscreen:
             Pygame font.
         small_font : pg.font.Font
             Pygame font.
-        performance : performance.Performance
+        player_performance : performance.Performance
             Player's performance.
+        background : pg.surface.Surface
+            Chart background, scaled to the screen.
+        rank : int, optional
+            Leaderboard rank of the result.
+        density : list, optional
+            Note density of the played difficulty.
 
         Raises
         ------
@@ -671,67 +1083,62 @@ class Endscreen:
         AssertionError
             small_font is not an instance of the pg.font.Font class.
         AssertionError
-            performance is not an instance of the performance.Performance class.
+            player_performance is not an instance of the performance.Performance class.
+        AssertionError
+            background is not an instance of the pg.surface.Surface class.
         """
         assert isinstance(
             small_font, pg.font.Font
         ), "small_font must be an instance of the pg.font.Font class."
         assert isinstance(
-            performance, performance.Performance
-        ), "performance must be an instance of the performance.Performance class."
+            player_performance, performance.Performance
+        ), "player_performance must be an instance of the performance.Performance class."
+        assert isinstance(
+            background, pg.surface.Surface
+        ), "background must be an instance of the pg.surface.Surface class."
         self.font = font
         self.small_font = small_font
         self.data = [
-            "Result",
-            f"Score: {performance.score:,d}",
-            f"Combo: {performance.max_combo:,d}/{performance.max_possible_combo:,d}",
-            f"Accuracy: {round(performance.accuracy, 2)}%",
-            f"Perfect: {performance.perfect_hits} | Good: {performance.good_hits} | Bad: {performance.bad_hits} | Miss: {performance.misses}",
+            "Result" if rank is None else f"Result - Rank #{rank:,d}",
+            f"Score: {player_performance.score:,d}",
+            f"Combo: {player_performance.max_combo:,d}/{player_performance.max_possible_combo:,d}",
+            f"Accuracy: {round(player_performance.accuracy, 2)}%",
         ]
-
-    def draw(self, screen: pg.surface.Surface) -> None:
-        """Used to draw endscreen on screen.
-
-        Parameters
-        ----------
-        screen : pg.surface.Surface
-            Display surface.
-        """
-        dim_surface = pg.Surface(screen.get_size(), pg.SRCALPHA)
-        dim_surface.fill((0, 0, 0, 200))
-        screen.blit(dim_surface, (0, 0))
-        offset = 0
-
-        for surface_text in self.data:
-            if self.data.index(surface_text) == 4:
-                surface = text.TextWithShadow(
-                    surface_text,
-                    self.small_font,
-                    enums.Color.WHITE.value,
-                    enums.Color.BLACK.value,
-                    4,
-                )
-                surface.draw(
-                    screen.get_width() / 2 - surface.get_width() / 2,
-                    100 + offset,
-                    screen,
+        self.small_data = [
+            " | ".join(
+                f"{name[:-1]}: {count}"
+                for name, count in zip(
+                    performance.JUDGEMENT_NAMES,
+                    player_performance.get_judgement_counts(),
                 )
-                offset += 100
-            else:
-                surface = text.TextWithShadow(
-                    surface_text,
-                    self.font,
-                    enums.Color.WHITE.value,
-                    enums.Color.BLACK.value,
-                    4,
-                )
-                surface.draw(
-                    screen.get_width() / 2 - surface.get_width() / 2,
-                    100 + offset,
-                    screen,
-                )
-                offset += 100
-
+            ),
+            f"UR: {player_performance.get_unstable_rate():.1f} | "
+            f"Mean: {player_performance.error_mean:+.1f} ms",
+            "Early/Late: "
+            + " | ".join(
+                f"{lane['early']}/{lane['late']}"
+                for lane in player_performance.get_lane_breakdown()
+            ),
+        ]
+        self.texts = []
+        for line, surface_text in enumerate(self.data):
+            surface = text.TextWithShadow(
+                surface_text,
+                self.font,
+                enums.Color.WHITE.value,
+                enums.Color.BLACK.value,
+                4,
+            )
+            self.texts.append((surface, 70 + line * 75))
+        for line, surface_text in enumerate(self.small_data):
+            surface = text.TextWithShadow(
+                surface_text,
+                self.small_font,
+                enums.Color.WHITE.value,
+                enums.Color.BLACK.value,
+                4,
+            )
+            self.texts.append((surface, 380 + line * 42))
         surface = text.TextWithShadow(
             "Press ESCAPE to close endscreen",
             self.font,
@@ -739,8 +1146,90 @@ class Endscreen:
             enums.Color.BLACK.value,
             4,
         )
-        surface.draw(
-            screen.get_width() / 2 - surface.get_width() / 2,
-            screen.get_height() - 100,
-            screen,
+        self.texts.append((surface, -100))
+        self.histogram = self.get_error_histogram(
+            player_performance.get_error_histogram()
+        )
+        self.surface = self.compose(background, density)
+
+    def get_error_histogram(self, histogram: list) -> pg.surface.Surface:
+        """Used to render the hit error histogram.
+
+        Parameters
+        ----------
+        histogram : list
+            Hit counts of equal bins from early to late.
+
+        Returns
+        ----------
+        pg.surface.Surface
+            Histogram surface.
+        """
+        graph = pg.Surface((480, 70), pg.SRCALPHA)
+        bar_width = graph.get_width() / len(histogram)
+        highest = max(max(histogram), 1)
+        for bin_index, count in enumerate(histogram):
+            center = abs(bin_index + 0.5 - len(histogram) / 2) * 2 / len(histogram)
+            judgement = performance.get_judgement(center * performance.MISS_WINDOW)
+            bar_height = round(graph.get_height() * count / highest)
+            pg.draw.rect(
+                graph,
+                enums.Color[judgement.name].value,
+                (
+                    round(bin_index * bar_width),
+                    graph.get_height() - bar_height,
+                    max(round(bar_width) - 2, 1),
+                    bar_height,
+                ),
+            )
+        pg.draw.line(
+            graph,
+            enums.Color.WHITE.value,
+            (graph.get_width() / 2, 0),
+            (graph.get_width() / 2, graph.get_height()),
         )
+        return graph
+
+    def compose(self, background: pg.surface.Surface, density) -> pg.surface.Surface:
+        """Used to compose the whole endscreen into one surface.
+
+        Parameters
+        ----------
+        background : pg.surface.Surface
+            Chart background, scaled to the screen.
+        density : list or None
+            Note density of the played difficulty.
+
+        Returns
+        ----------
+        pg.surface.Surface
+            Endscreen surface of the size of the background.
+        """
+        surface = background.copy()
+        dim_surface = pg.Surface(surface.get_size(), pg.SRCALPHA)
+        dim_surface.fill((0, 0, 0, 200))
+        surface.blit(dim_surface, (0, 0))
+        width, height = surface.get_size()
+        for text_surface, y in self.texts:
+            if y < 0:
+                y += height
+            text_surface.draw(width / 2 - text_surface.get_width() / 2, y, surface)
+        graph_x = width / 2 - self.histogram.get_width() / 2
+        if density:
+            graph_x = width / 2 - self.histogram.get_width() - 10
+            surface.blit(
+                get_density_graph(density, self.histogram.get_size()),
+                (width / 2 + 10, height - 190),
+            )
+        surface.blit(self.histogram, (graph_x, height - 190))
+        return surface
+
+    def draw(self, screen: pg.surface.Surface) -> None:
+        """Used to draw endscreen on screen.
+
+        Parameters
+        ----------
+        screen : pg.surface.Surface
+            Display surface.
+        """
+        screen.blit(self.surface, (0, 0))
@@ -0,0 +1,240 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+import pygame
+from pygame import mixer
+
+import analysis
+import chart
+
+SAMPLE_RATE = 22050
+FRAME_SIZE = 512
+HOP_SIZE = 128
+FRAMES_PER_BLOCK = 4096
+MAX_LAG = 250  # ms
+MISALIGNED = 10  # ms
+
+
+def init_worker() -> None:
+    """Used to initialize the mixer of a worker process for decoding."""
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    mixer.init(frequency=SAMPLE_RATE, size=-16, channels=1)
+
+
+def decode_audio(song_source: str) -> np.ndarray:
+    """Used to decode a song to mono PCM samples.
+
+    Parameters
+    ----------
+    song_source : str
+        Song file location.
+
+    Returns
+    ----------
+    np.ndarray
+        Samples between -1 and 1 at SAMPLE_RATE.
+    """
+    samples = pygame.sndarray.array(mixer.Sound(song_source))
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    return samples.astype(np.float32) / 32768
+
+
+def get_onset_envelope(samples: np.ndarray) -> np.ndarray:
+    """Used to get the spectral flux of a song.
+
+    The log magnitude spectrum is computed for every hop, and the flux is the
+    sum of all positive changes between neighbouring spectra. Frames are
+    transformed in blocks to keep the memory use flat for long songs.
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        Mono samples.
+
+    Returns
+    ----------
+    np.ndarray
+        Normalized onset strength of every hop.
+    """
+    if samples.size < FRAME_SIZE:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+    window = np.hanning(FRAME_SIZE).astype(np.float32)
+    envelope = np.zeros(len(frames), dtype=np.float32)
+    previous = None
+    for start in range(0, len(frames), FRAMES_PER_BLOCK):
+        block = frames[start : start + FRAMES_PER_BLOCK] * window
+        spectrum = np.log1p(np.abs(np.fft.rfft(block, axis=1))).astype(np.float32)
+        if previous is not None:
+            spectrum = np.vstack((previous, spectrum))
+        flux = np.maximum(np.diff(spectrum, axis=0), 0).sum(axis=1)
+        if previous is None:
+            envelope[start + 1 : start + 1 + len(flux)] = flux
+        else:
+            envelope[start : start + len(flux)] = flux
+        previous = spectrum[-1:]
+    envelope -= np.median(envelope)
+    np.maximum(envelope, 0, out=envelope)
+    highest = envelope.max()
+    if highest > 0:
+        envelope /= highest
+    return envelope
+
+
+def get_best_offset(envelope: np.ndarray, timings: np.ndarray) -> tuple:
+    """Used to cross-correlate note timings with the onset envelope.
+
+    Parameters
+    ----------
+    envelope : np.ndarray
+        Onset strength of every hop.
+    timings : np.ndarray
+        Note timings in milliseconds.
+
+    Returns
+    ----------
+    tuple
+        Offset in milliseconds by which the audio is late compared to the
+        notes, and the confidence of the match in standard deviations.
+    """
+    hop_time = HOP_SIZE / SAMPLE_RATE * 1000
+    if envelope.size == 0 or timings.size == 0:
+        return 0.0, 0.0
+    widened = envelope.copy()
+    widened[1:] = np.maximum(widened[1:], envelope[:-1])
+    widened[:-1] = np.maximum(widened[:-1], envelope[1:])
+
+    max_lag = int(MAX_LAG / hop_time)
+    lags = np.arange(-max_lag, max_lag + 1)
+    note_frames = np.rint(timings / hop_time).astype(np.int64)
+    indices = note_frames[np.newaxis, :] + lags[:, np.newaxis]
+    valid = (indices >= 0) & (indices < widened.size)
+    scores = np.where(valid, widened[np.clip(indices, 0, widened.size - 1)], 0)
+    scores = scores.sum(axis=1) / np.maximum(valid.sum(axis=1), 1)
+
+    best = int(np.argmax(scores))
+    shift = 0.0
+    if 0 < best < len(scores) - 1:
+        left, middle, right = scores[best - 1 : best + 2]
+        curvature = left - 2 * middle + right
+        if curvature < 0:
+            shift = 0.5 * (left - right) / curvature
+    spread = scores.std()
+    confidence = (scores[best] - np.median(scores)) / spread if spread > 0 else 0.0
+    return float((lags[best] + shift) * hop_time), float(confidence)
+
+
+def detect_chart_offsets(chart_name: str, cached_entry=None) -> dict:
+    """Used to find the offset of every difficulty of a chart.
+
+    Parameters
+    ----------
+    chart_name : str
+        The name of the chart folder.
+    cached_entry : dict, optional
+        Entry of the chart in the chart index.
+
+    Returns
+    ----------
+    dict
+        Difficulty file names mapped to their offset and confidence.
+    """
+    selected_chart = chart.Chart(chart_name, cached_entry)
+    try:
+        envelope = get_onset_envelope(decode_audio(selected_chart.audio))
+    except (pygame.error, FileNotFoundError) as error:
+        print(f"Caught {type(error)}: error")
+        return dict()
+    offsets = dict()
+    for difficulty in selected_chart.difficulties:
+        _, _, chord_timings = analysis.get_note_arrays(difficulty.notes)
+        offset, confidence = get_best_offset(envelope, chord_timings)
+        offsets[os.path.basename(difficulty.json_location)] = {
+            "offset": round(offset, 1),
+            "confidence": round(confidence, 2),
+        }
+    return offsets
+
+
+def suggest_offsets(chart_index, workers=None) -> dict:
+    """Used to detect the offsets of all indexed charts in parallel.
+
+    The offset of every difficulty is stored in the chart index, and the
+    median over the confidently detected difficulties becomes the suggested
+    offset of the chart.
+
+    Parameters
+    ----------
+    chart_index : chart.ChartIndex
+        Index of all installed charts.
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+
+    Returns
+    ----------
+    dict
+        Chart names mapped to their suggested offset, None if no difficulty
+        was detected confidently, and the confident difficulties that do not
+        agree with it.
+    """
+    chart_names = chart_index.get_chart_names()
+    cached_entries = [chart_index.charts[chart_name] for chart_name in chart_names]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        results = list(executor.map(detect_chart_offsets, chart_names, cached_entries))
+
+    report = dict()
+    for chart_name, offsets in zip(chart_names, results):
+        if not offsets:
+            continue
+        entry = chart_index.charts[chart_name]
+        for file_name, detected in offsets.items():
+            entry["difficulties"][file_name]["onset_offset"] = detected
+        suggested = chart.get_suggested_offset(entry["difficulties"])
+        if suggested is None:
+            entry.pop("suggested_offset", None)
+            report[chart_name] = {"suggested_offset": None, "misaligned": []}
+            continue
+        entry["suggested_offset"] = suggested
+        report[chart_name] = {
+            "suggested_offset": suggested,
+            "misaligned": [
+                file_name
+                for file_name, detected in offsets.items()
+                if detected["confidence"] >= chart.MIN_ONSET_CONFIDENCE
+                and abs(detected["offset"] - suggested) > MISALIGNED
+            ],
+        }
+    return report
+
+
+if __name__ == "__main__":
+    import settings
+
+    parser = argparse.ArgumentParser(description="Suggest chart offsets from audio.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument(
+        "--apply", action="store_true", help="save suggested offsets to settings"
+    )
+    arguments = parser.parse_args()
+    index = chart.ChartIndex()
+    report = suggest_offsets(index, workers=arguments.workers)
+    index.save()
+    game_settings = settings.Settings()
+    for chart_name, result in report.items():
+        if result["suggested_offset"] is None:
+            print(f"{chart_name}: no confident detection")
+            continue
+        line = f"{chart_name}: {result['suggested_offset']:+d} ms"
+        if result["misaligned"]:
+            line += f", misaligned: {', '.join(result['misaligned'])}"
+        print(line)
+        if arguments.apply:
+            change = result["suggested_offset"] - game_settings.chart_offsets.get(
+                chart_name, 0
+            )
+            game_settings.change_chart_offset(chart_name, change)
+    if arguments.apply:
+        game_settings.save()
@@ -1,5 +1,98 @@
+from bisect import bisect_left
 import json
 import os
+import sqlite3
+import time
+import zlib
+import numpy as np
+import enums
+
+# Upper bounds of the absolute hit error of every judgement but a miss.
+HIT_WINDOWS = (40, 80, 120)  # ms
+MISS_WINDOW = HIT_WINDOWS[-1]
+JUDGEMENTS = tuple(enums.Judgement)
+JUDGEMENT_NAMES = ("Perfect!", "Good!", "Bad!", "Miss!")
+JUDGEMENT_SCORES = (300, 100, 50, 0)
+HISTOGRAM_BINS = 24
+
+
+def get_difficulty_label(difficulty: str, rate: float = 1.0) -> str:
+    """Used to get the name a difficulty is stored under at a playback rate.
+
+    Parameters
+    ----------
+    difficulty : str
+        Difficulty name.
+    rate : float
+        Playback rate.
+
+    Returns
+    ----------
+    str
+        Difficulty name, with the rate appended if it is not 1.
+    """
+    if rate != 1.0:
+        return f"{difficulty} ({rate:.2f}x)"
+    return difficulty
+
+
+def get_score_multiplier(combo: int) -> int:
+    """Used to get the score multiplier of a combo.
+
+    Parameters
+    ----------
+    combo : int
+        Combo before the hit.
+
+    Returns
+    ----------
+    int
+        Multiplier of the judgement score.
+    """
+    if combo < 10:
+        return 1
+    return int(combo * 0.1)
+
+
+def get_accuracy(judgement_counts) -> float:
+    """Used to get the accuracy of a result.
+
+    Parameters
+    ----------
+    judgement_counts : list
+        Hit counts indexed by judgement.
+
+    Returns
+    ----------
+    float
+        Accuracy in percent, 0 if nothing was judged.
+    """
+    judged = sum(judgement_counts)
+    if judged == 0:
+        return 0.0
+    points = sum(
+        JUDGEMENT_SCORES[judgement] * count
+        for judgement, count in enumerate(judgement_counts)
+    )
+    return points / (JUDGEMENT_SCORES[0] * judged) * 100
+
+
+def get_judgement(hit_error: float, hit_windows=HIT_WINDOWS) -> enums.Judgement:
+    """Used to get the judgement of a hit.
+
+    Parameters
+    ----------
+    hit_error : float
+        Difference between the hit time and the note timing in milliseconds.
+    hit_windows : sequence
+        Upper bounds of the absolute hit error of every judgement but a miss.
+
+    Returns
+    ----------
+    enums.Judgement
+        Judgement of the hit.
+    """
+    return JUDGEMENTS[bisect_left(hit_windows, abs(hit_error))]
 
 
 class Performance:
@@ -7,24 +100,42 @@ class Performance:
 
     Methods
     -------
+    reset()
+        Used to reset all counters.
+    record_hit(hit_error, lane, timing)
+        Used to add a hit to the hit error log.
+    record_stray(hit_error, timing)
+        Used to add a press that hit no note to the hit error log.
+    get_error_deviation()
+        Used to get the standard deviation of the hit errors.
+    get_unstable_rate()
+        Used to get the unstable rate.
+    get_error_histogram()
+        Used to get the distribution of the hit errors.
+    get_lane_breakdown(keys)
+        Used to get early and late hits of every lane.
+    get_hit_log()
+        Used to get the hit error log and its statistics.
     update_accuracy()
         Used to update accuracy.
-    update_combo(grade)
+    update_combo(judgement)
         Used to update combo.
-    update_hits_counter(grade)
+    update_hits_counter(judgement)
         Used to update hit counters.
-    get_grade(progress)
-        Used to get a grade regarding progress.
-    add_score(grade)
-        Used to get a grade regarding progress.
+    get_judgement_counts()
+        Used to get the number of hits of every judgement.
+    add_score(judgement)
+        Used to add the score of a hit.
     """
 
-    def __init__(self, player_name: str) -> None:
+    def __init__(self, player_name: str, note_count: int = 0) -> None:
         """
         Parameters
         ----------
         player_name : str
             Player username.
+        note_count : int
+            Number of notes in the chart, used to preallocate the hit log.
 
         Raises
         ------
@@ -32,6 +143,14 @@ class Performance:
             player_name is not a string.
         """
         assert isinstance(player_name, str), "player_name must be a string."
+        self.player_name = player_name
+        self.hit_errors = np.zeros(max(note_count, 1), dtype=np.float32)
+        self.hit_lanes = np.zeros(max(note_count, 1), dtype=np.int8)
+        self.hit_timings = np.zeros(max(note_count, 1), dtype=np.int32)
+        self.reset()
+
+    def reset(self) -> None:
+        """Used to reset all counters."""
         self.score = 0
         self.combo = 0
         self.max_combo = 0
@@ -41,253 +160,523 @@ class Performance:
         self.good_hits = 0
         self.bad_hits = 0
         self.misses = 0
-        self.player_name = player_name
+        self.hit_count = 0
+        self.error_mean = 0.0
+        self.error_m2 = 0.0
+        self.stray_errors = []
+        self.stray_timings = []
+
+    def record_hit(self, hit_error: float, lane: int, timing: int) -> None:
+        """Used to add a hit to the hit error log.
+
+        The mean and variance of the errors are updated with Welford's method,
+        so live statistics cost the same for every hit.
+
+        Parameters
+        ----------
+        hit_error : float
+            Difference between the hit time and the note timing in milliseconds.
+        lane : int
+            Line number of the note, starting from one.
+        timing : int
+            Timing of the note.
+        """
+        if self.hit_count == len(self.hit_errors):
+            size = 2 * len(self.hit_errors)
+            self.hit_errors = np.resize(self.hit_errors, size)
+            self.hit_lanes = np.resize(self.hit_lanes, size)
+            self.hit_timings = np.resize(self.hit_timings, size)
+        self.hit_errors[self.hit_count] = hit_error
+        self.hit_lanes[self.hit_count] = lane
+        self.hit_timings[self.hit_count] = timing
+        self.hit_count += 1
+        delta = hit_error - self.error_mean
+        self.error_mean += delta / self.hit_count
+        self.error_m2 += delta * (hit_error - self.error_mean)
+
+    def record_stray(self, hit_error: float, timing: int) -> None:
+        """Used to add a press that hit no note to the hit error log.
+
+        Stray presses are judged against the next note and can break the
+        combo, so they are kept to replay the result, but they are left out
+        of the error statistics.
+
+        Parameters
+        ----------
+        hit_error : float
+            Difference between the press time and the next note timing in
+            milliseconds.
+        timing : int
+            Timing of the next note.
+        """
+        self.stray_errors.append(round(hit_error, 1))
+        self.stray_timings.append(timing)
+
+    def get_error_deviation(self) -> float:
+        """Used to get the standard deviation of the hit errors.
+
+        Returns
+        ----------
+        float
+            Standard deviation in milliseconds.
+        """
+        if self.hit_count == 0:
+            return 0.0
+        return (self.error_m2 / self.hit_count) ** 0.5
+
+    def get_unstable_rate(self) -> float:
+        """Used to get the unstable rate.
+
+        Returns
+        ----------
+        float
+            Ten times the standard deviation of the hit errors.
+        """
+        return 10 * self.get_error_deviation()
+
+    def get_error_histogram(self) -> list:
+        """Used to get the distribution of the hit errors.
+
+        Errors outside the hit windows are counted in the outer bins.
+
+        Returns
+        ----------
+        list
+            Hit counts of HISTOGRAM_BINS equal bins from early to late.
+        """
+        errors = np.clip(self.hit_errors[: self.hit_count], -MISS_WINDOW, MISS_WINDOW)
+        histogram, _ = np.histogram(
+            errors, bins=HISTOGRAM_BINS, range=(-MISS_WINDOW, MISS_WINDOW)
+        )
+        return histogram.tolist()
+
+    def get_lane_breakdown(self, keys: int = 4) -> list:
+        """Used to get early and late hits of every lane.
+
+        Parameters
+        ----------
+        keys : int
+            Number of lanes.
+
+        Returns
+        ----------
+        list
+            Dictionaries with early and late counts and the mean error of
+            every lane.
+        """
+        errors = self.hit_errors[: self.hit_count]
+        lanes = self.hit_lanes[: self.hit_count].astype(np.int64) - 1
+        early = np.bincount(lanes[errors < 0], minlength=keys)
+        late = np.bincount(lanes[errors > 0], minlength=keys)
+        counts = np.bincount(lanes, minlength=keys)
+        sums = np.bincount(lanes, weights=errors, minlength=keys)
+        means = sums / np.maximum(counts, 1)
+        return [
+            {
+                "early": int(early[lane]),
+                "late": int(late[lane]),
+                "mean": round(float(means[lane]), 2),
+            }
+            for lane in range(keys)
+        ]
+
+    def get_hit_log(self) -> dict:
+        """Used to get the hit error log and its statistics.
+
+        Returns
+        ----------
+        dict
+            Errors, lanes and timings of every hit, errors and timings of
+            every stray press, the rules they were judged with, and the mean,
+            unstable rate, histogram and lane breakdown.
+        """
+        return {
+            "errors": self.hit_errors[: self.hit_count].round(1).tolist(),
+            "lanes": self.hit_lanes[: self.hit_count].tolist(),
+            "timings": self.hit_timings[: self.hit_count].tolist(),
+            "stray_errors": list(self.stray_errors),
+            "stray_timings": list(self.stray_timings),
+            "hit_windows": list(HIT_WINDOWS),
+            "judgement_scores": list(JUDGEMENT_SCORES),
+            "mean": round(self.error_mean, 2),
+            "unstable_rate": round(self.get_unstable_rate(), 2),
+            "histogram": self.get_error_histogram(),
+            "lane_breakdown": self.get_lane_breakdown(),
+        }
 
     def update_accuracy(self) -> None:
         """Used to update accuracy."""
-        chisl = 300 * self.perfect_hits + 100 * self.good_hits + 50 * self.bad_hits
-        znam = 300 * (self.perfect_hits + self.good_hits + self.bad_hits + self.misses)
-        if znam != 0:
-            self.accuracy = chisl / znam * 100
+        judgement_counts = self.get_judgement_counts()
+        if sum(judgement_counts) != 0:
+            self.accuracy = get_accuracy(judgement_counts)
 
-    def update_combo(self, grade: str) -> None:
+    def update_combo(self, judgement: enums.Judgement) -> None:
         """Used to update combo.
 
         Parameters
         ----------
-        grade : str
-            Last grade.
+        judgement : enums.Judgement
+            Judgement of the last hit.
 
         Raises
         ------
         AssertionError
-            grade is not a string.
+            judgement is not an instance of the enums.Judgement class.
         """
-        assert isinstance(grade, str), "grade must be a string."
-        if grade != "Miss!":
+        assert isinstance(
+            judgement, enums.Judgement
+        ), "judgement must be an instance of the enums.Judgement class."
+        if judgement != enums.Judgement.MISS:
             self.combo += 1
         else:
             if self.combo >= self.max_combo:
                 self.max_combo = self.combo
             self.combo = 0
 
-    def update_hits_counter(self, grade: str) -> None:
+    def update_hits_counter(self, judgement: enums.Judgement) -> None:
         """Used to update hit counters.
 
         Parameters
         ----------
-        grade : str
-            Last grade.
+        judgement : enums.Judgement
+            Judgement of the last hit.
 
         Raises
         ------
         AssertionError
-            grade is not a string.
+            judgement is not an instance of the enums.Judgement class.
         """
-        assert isinstance(grade, str), "grade must be a string."
-        if grade == "Perfect!":
+        assert isinstance(
+            judgement, enums.Judgement
+        ), "judgement must be an instance of the enums.Judgement class."
+        if judgement == enums.Judgement.PERFECT:
             self.perfect_hits += 1
-        elif grade == "Good!":
+        elif judgement == enums.Judgement.GOOD:
             self.good_hits += 1
-        elif grade == "Bad!":
+        elif judgement == enums.Judgement.BAD:
             self.bad_hits += 1
         else:
             self.misses += 1
 
-    def get_grade(self, progress: float) -> str:
-        """Used to get a grade regarding progress.
-
-        Parameters
-        ----------
-        progress : float
-            Hit progress.
-
-        Raises
-        ------
-        AssertionError
-            progress is not a float.
+    def get_judgement_counts(self) -> list:
+        """Used to get the number of hits of every judgement.
 
         Returns
         ----------
-        str
-            Grade.
+        list
+            Hit counts indexed by judgement.
         """
-        assert isinstance(progress, float), "progress must be a float."
-        if progress >= 0.7 and progress < 0.8 or progress > 1.2 and progress <= 1.3:
-            return "Bad!"
-        elif progress >= 0.8 and progress < 0.9 or progress > 1.1 and progress <= 1.2:
-            return "Good!"
-        elif progress >= 0.9 and progress <= 1.1:
-            return "Perfect!"
-        else:
-            return "Miss!"
+        return [self.perfect_hits, self.good_hits, self.bad_hits, self.misses]
 
-    def add_score(self, grade: str) -> None:
-        """Used to get a grade regarding progress.
+    def add_score(self, judgement: enums.Judgement) -> None:
+        """Used to add the score of a hit.
 
         Parameters
         ----------
-        grade : str
-            Last grade.
+        judgement : enums.Judgement
+            Judgement of the last hit.
 
         Raises
         ------
         AssertionError
-            grade is not a string.
+            judgement is not an instance of the enums.Judgement class.
         """
-        assert isinstance(grade, str), "grade must be a string."
-        if self.combo < 10:
-            score_multiplier = 1
-        else:
-            score_multiplier = int(self.combo * 0.1)
-        if grade == "Bad!":
-            self.score += 50 * score_multiplier
-        elif grade == "Good!":
-            self.score += 100 * score_multiplier
-        elif grade == "Perfect!":
-            self.score += 300 * score_multiplier
+        assert isinstance(
+            judgement, enums.Judgement
+        ), "judgement must be an instance of the enums.Judgement class."
+        self.score += JUDGEMENT_SCORES[judgement] * get_score_multiplier(self.combo)
 
 
 class Leaderboard:
-    """The abstract class used to represent a menu.
+    """The class used to represent the leaderboards of all charts.
+
+    Scores are stored in an SQLite database keyed by the note hash and the
+    name of their difficulty, so editing a difficulty starts a new
+    leaderboard instead of mixing old and new scores. An index on the score
+    keeps top scores and ranks fast on large tables, and every result is a
+    single atomic insert, which can run on a background writer thread.
 
     Methods
     -------
-    load(chart_name)
-        Used to load leaderboards for a certain chart.
-    save(chart_name)
-        Used to save leaderboards for a certain chart.
-    add(performance)
-        Used to add performance to performances list.
-    remove(performance)
-        Used to remove performance from performances list.
-    get_all_performances()
-        Used to get all performances.
+    add(performance, chart_hash, difficulty, rate)
+        Used to add a result to the leaderboard.
+    get_write_connection()
+        Used to get the connection of the writer thread.
+    insert(row, connection)
+        Used to insert a result row.
+    get_rank(chart_hash, difficulty, score)
+        Used to get the rank a score would have.
+    get_top(chart_hash, difficulty, count)
+        Used to get the best results.
+    get_player_bests(chart_hash, difficulty)
+        Used to get the best score of every player.
+    get_hit_log(score_id)
+        Used to get the hit error log of a result.
+    close_write_connection()
+        Used to close the connection of the writer thread.
+    close()
+        Used to close the database.
     """
 
-    def __init__(self) -> None:
-        self.performances = []
-
-    def load(self, chart_name: str):
-        """Used to load leaderboards for a certain chart.
-
-        Parameters
-        ----------
-        chart_name : str
-            Chart name.
-
-        Raises
-        ------
-        AssertionError
-            chart_name is not a string.
+    def __init__(self, database_location=None, background_writer=None) -> None:
         """
-        assert isinstance(chart_name, str), "chart_name must be a string."
-        chart_locataion = os.path.join("src", "charts", chart_name, "leaderboard.json")
-        try:
-            with open(chart_locataion, "r") as leaderboard:
-                data = json.load(leaderboard)
-                leaderboard.close()
-        except FileNotFoundError as error:
-            print(f"Caught {type(error)}: error")
-
-        self.performances.clear()
-        scores = data["scores"]
-        for result in scores:
-            performance = Performance(result["data"]["player_name"])
-            performance.score = result["data"]["score"]
-            performance.combo = result["data"]["combo"]
-            performance.max_combo = result["data"]["max_combo"]
-            performance.max_possible_combo = result["data"]["max_possible_combo"]
-            performance.accuracy = result["data"]["accuracy"]
-            performance.perfect_hits = result["data"]["perfect_hits"]
-            performance.good_hits = result["data"]["good_hits"]
-            performance.bad_hits = result["data"]["bad_hits"]
-            performance.misses = result["data"]["misses"]
-            self.performances.append(performance)
-
-    def save(self, chart_name: str):
-        """Used to save leaderboards for a certain chart.
-
         Parameters
         ----------
-        chart_name : str
-            Chart name.
-
-        Raises
-        ------
-        AssertionError
-            chart_name is not a string.
+        database_location : str, optional
+            Path of the database file. Defaults to leaderboard.db next to the
+            game.
+        background_writer : writer.BackgroundWriter, optional
+            Writer used to insert results without blocking. Results are
+            inserted right away if missing.
         """
-        assert isinstance(chart_name, str), "chart_name must be a string."
-        file_name = "leaderboard.json"
-        file_location = os.path.join("src", "charts", chart_name, file_name)
-        output = {}
-        performances = []
-        for performance in self.performances:
-            score = {}
-            data = {}
-            score["id"] = self.performances.index(performance)
-            data["score"] = performance.score
-            data["combo"] = performance.combo
-            data["max_combo"] = performance.max_combo
-            data["max_possible_combo"] = performance.max_possible_combo
-            data["accuracy"] = performance.accuracy
-            data["perfect_hits"] = performance.perfect_hits
-            data["good_hits"] = performance.good_hits
-            data["bad_hits"] = performance.bad_hits
-            data["misses"] = performance.misses
-            data["player_name"] = performance.player_name
-            score["data"] = data
-            performances.append(score)
-        output["scores"] = performances
-        try:
-            with open(file_location, "w") as write_file:
-                json.dump(output, write_file)
-        except FileExistsError as error:
-            print(f"Caught {type(error)}: error")
-
-    def add(self, performance: Performance) -> None:
-        """Used to add performance to performances list.
+        if database_location is None:
+            database_location = os.path.join(
+                os.path.dirname(__file__), "leaderboard.db"
+            )
+        self.database_location = database_location
+        self.writer = background_writer
+        self.write_connection = None
+        self.connection = sqlite3.connect(database_location)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS scores (
+                    id INTEGER PRIMARY KEY,
+                    chart_hash TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    player_name TEXT NOT NULL,
+                    score INTEGER NOT NULL,
+                    max_combo INTEGER NOT NULL,
+                    max_possible_combo INTEGER NOT NULL,
+                    accuracy REAL NOT NULL,
+                    perfect_hits INTEGER NOT NULL,
+                    good_hits INTEGER NOT NULL,
+                    bad_hits INTEGER NOT NULL,
+                    misses INTEGER NOT NULL,
+                    rate REAL NOT NULL,
+                    played_at REAL NOT NULL,
+                    hits BLOB
+                );
+                CREATE INDEX IF NOT EXISTS scores_by_score
+                    ON scores (chart_hash, difficulty, score DESC);
+                CREATE INDEX IF NOT EXISTS scores_by_player
+                    ON scores (chart_hash, difficulty, player_name, score DESC);
+                """
+            )
+
+    def add(
+        self,
+        performance: Performance,
+        chart_hash: str,
+        difficulty: str,
+        rate: float = 1.0,
+    ) -> tuple:
+        """Used to add a result to the leaderboard.
 
         Parameters
         ----------
         performance : Performance
             Performance of a player.
+        chart_hash : str
+            Note hash of the difficulty.
+        difficulty : str
+            Difficulty name.
+        rate : float
+            Playback rate.
 
         Raises
         ------
         AssertionError
             performance is not an instance of the Performance class.
+
+        Returns
+        ----------
+        int
+            Rank of the result.
         """
         assert isinstance(
             performance, Performance
         ), "performance must be an instance of the Performance class."
-        self.performances.append(performance)
+        rank = self.get_rank(chart_hash, difficulty, performance.score)
+        hits = zlib.compress(json.dumps(performance.get_hit_log()).encode())
+        row = (
+            chart_hash,
+            difficulty,
+            performance.player_name,
+            performance.score,
+            performance.max_combo,
+            performance.max_possible_combo,
+            performance.accuracy,
+            performance.perfect_hits,
+            performance.good_hits,
+            performance.bad_hits,
+            performance.misses,
+            rate,
+            time.time(),
+            hits,
+        )
+        if self.writer is None:
+            self.insert(row, self.connection)
+        else:
+            self.writer.submit_unique(self.insert, row)
+        return rank
+
+    def get_write_connection(self) -> sqlite3.Connection:
+        """Used to get the connection of the writer thread.
+
+        SQLite connections can't be shared between threads, so the writer
+        thread opens its own on first use.
 
-    def remove(self, performance: Performance) -> None:
-        """Used to remove performance from performances list.
+        Returns
+        ----------
+        sqlite3.Connection
+            Database connection of the writer thread.
+        """
+        if self.write_connection is None:
+            self.write_connection = sqlite3.connect(self.database_location)
+        return self.write_connection
+
+    def insert(self, row: tuple, connection=None) -> None:
+        """Used to insert a result row.
+
+        Without a connection, the writer thread's own connection is used.
 
         Parameters
         ----------
-        performance : Performance
-            Performance of a player.
+        row : tuple
+            Values of the result.
+        connection : sqlite3.Connection, optional
+            Database connection.
+        """
+        if connection is None:
+            connection = self.get_write_connection()
+        with connection:
+            connection.execute(
+                "INSERT INTO scores (chart_hash, difficulty, player_name, score, "
+                "max_combo, max_possible_combo, accuracy, perfect_hits, good_hits, "
+                "bad_hits, misses, rate, played_at, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+
+    def get_rank(self, chart_hash: str, difficulty: str, score: int) -> int:
+        """Used to get the rank a score would have.
 
-        Raises
-        ------
-        AssertionError
-            performance is not an instance of the Performance class.
+        Parameters
+        ----------
+        chart_hash : str
+            Note hash of the difficulty.
+        difficulty : str
+            Difficulty name.
+        score : int
+            Score to rank.
+
+        Returns
+        ----------
+        int
+            Rank, starting from one.
         """
-        assert isinstance(
-            performance, Performance
-        ), "performance must be an instance of the Performance class."
-        self.performances.remove(performance)
+        (better,) = self.connection.execute(
+            "SELECT COUNT(*) FROM scores "
+            "WHERE chart_hash = ? AND difficulty = ? AND score > ?",
+            (chart_hash, difficulty, score),
+        ).fetchone()
+        return better + 1
 
-    def get_all_performances(self) -> list:
-        """Used to get all performances.
+    def get_top(self, chart_hash: str, difficulty: str, count: int = 10) -> list:
+        """Used to get the best results.
+
+        Parameters
+        ----------
+        chart_hash : str
+            Note hash of the difficulty.
+        difficulty : str
+            Difficulty name.
+        count : int
+            Number of results.
 
         Returns
         ----------
         list
-            List of all performances.
+            Performances sorted by score.
+        """
+        rows = self.connection.execute(
+            "SELECT player_name, score, max_combo, max_possible_combo, accuracy, "
+            "perfect_hits, good_hits, bad_hits, misses FROM scores "
+            "WHERE chart_hash = ? AND difficulty = ? ORDER BY score DESC LIMIT ?",
+            (chart_hash, difficulty, count),
+        )
+        performances = []
+        for row in rows:
+            performance = Performance(row[0])
+            (
+                performance.score,
+                performance.max_combo,
+                performance.max_possible_combo,
+                performance.accuracy,
+                performance.perfect_hits,
+                performance.good_hits,
+                performance.bad_hits,
+                performance.misses,
+            ) = row[1:]
+            performances.append(performance)
+        return performances
+
+    def get_player_bests(self, chart_hash: str, difficulty: str) -> dict:
+        """Used to get the best score of every player.
+
+        Parameters
+        ----------
+        chart_hash : str
+            Note hash of the difficulty.
+        difficulty : str
+            Difficulty name.
+
+        Returns
+        ----------
+        dict
+            Player names mapped to their best score.
+        """
+        rows = self.connection.execute(
+            "SELECT player_name, MAX(score) FROM scores "
+            "WHERE chart_hash = ? AND difficulty = ? GROUP BY player_name",
+            (chart_hash, difficulty),
+        )
+        return dict(rows.fetchall())
+
+    def get_hit_log(self, score_id: int):
+        """Used to get the hit error log of a result.
+
+        Parameters
+        ----------
+        score_id : int
+            Id of the result.
+
+        Returns
+        ----------
+        dict or None
+            Hit error log, or None if the result doesn't exist.
+        """
+        row = self.connection.execute(
+            "SELECT hits FROM scores WHERE id = ?", (score_id,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def close_write_connection(self) -> None:
+        """Used to close the connection of the writer thread."""
+        if self.write_connection is not None:
+            self.write_connection.close()
+            self.write_connection = None
+
+    def close(self) -> None:
+        """Used to close the database.
+
+        Results that are still queued are written before the writer thread's
+        connection is closed.
         """
-        return self.performances
+        if self.writer is not None:
+            self.writer.submit(("leaderboard", "close"), self.close_write_connection)
+        self.connection.close()
@@ -0,0 +1,340 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import chart
+import performance
+import resampler
+
+RATING_SCALE = 8.0
+STAR_EXPONENT = 2.0
+ACCURACY_FLOOR = 80.0  # %
+ACCURACY_EXPONENT = 2.0
+WEIGHT_DECAY = 0.95
+BEST_COUNT = 100
+
+
+def get_play_rating(stars: float, accuracy: float) -> float:
+    """Used to get the rating a single result is worth.
+
+    Parameters
+    ----------
+    stars : float
+        Computed rating of the difficulty at the played rate.
+    accuracy : float
+        Accuracy of the result in percent.
+
+    Returns
+    ----------
+    float
+        Rating of the result, zero below ACCURACY_FLOOR.
+    """
+    accuracy_factor = max(accuracy - ACCURACY_FLOOR, 0) / (100 - ACCURACY_FLOOR)
+    return RATING_SCALE * stars**STAR_EXPONENT * accuracy_factor**ACCURACY_EXPONENT
+
+
+def get_player_rating(play_ratings) -> float:
+    """Used to get the rating of a player from their best results.
+
+    The best result counts fully and every following one is worth
+    WEIGHT_DECAY times less than the one before it.
+
+    Parameters
+    ----------
+    play_ratings : iterable
+        Ratings of the best result of every difficulty.
+
+    Returns
+    ----------
+    float
+        Rating of the player.
+    """
+    best = sorted(play_ratings, reverse=True)[:BEST_COUNT]
+    return sum(rating * WEIGHT_DECAY**place for place, rating in enumerate(best))
+
+
+def get_chart_stars(chart_name: str, cached_entry=None) -> dict:
+    """Used to get the star rating of all difficulties of a chart.
+
+    Parameters
+    ----------
+    chart_name : str
+        The name of the chart folder.
+    cached_entry : dict, optional
+        Entry of the chart in the chart index.
+
+    Returns
+    ----------
+    dict
+        Note hashes of the difficulties mapped to the difficulty labels of
+        every playback rate and their stars, empty if the chart can't be
+        read.
+    """
+    try:
+        selected_chart = chart.Chart(chart_name, cached_entry)
+    except (OSError, KeyError, IndexError) as error:
+        print(f"Caught {type(error)}: error")
+        return dict()
+    stars = dict()
+    for difficulty in selected_chart.difficulties:
+        stars[difficulty.hash] = {
+            performance.get_difficulty_label(difficulty.difficulty, rate): (
+                difficulty.stars * rate
+            )
+            for rate in resampler.RATES
+        }
+    return stars
+
+
+class PlayerRatings:
+    """The class used to represent the skill ratings of all players.
+
+    Ratings are kept next to the scores in the leaderboard database. The best
+    rating of every player on every difficulty is stored, so a new result
+    only has to update its own difficulty and re-add the player's best
+    results. Faster playback rates count as proportionally harder.
+
+    Methods
+    -------
+    get_player_rating(player_name)
+        Used to get the rating of a player.
+    add(player_name, chart_hash, difficulty, stars, accuracy)
+        Used to queue a rating update for a new result.
+    update(player_name, chart_hash, difficulty, stars, accuracy, connection)
+        Used to update the rating of a player with a new result.
+    recompute(chart_index, workers)
+        Used to rebuild all ratings from the stored results.
+    get_top(count)
+        Used to get the best rated players.
+    """
+
+    def __init__(self, leaderboard: performance.Leaderboard) -> None:
+        """
+        Parameters
+        ----------
+        leaderboard : performance.Leaderboard
+            Leaderboard whose database holds the ratings.
+
+        Raises
+        ------
+        AssertionError
+            leaderboard is not an instance of the performance.Leaderboard
+            class.
+        """
+        assert isinstance(
+            leaderboard, performance.Leaderboard
+        ), "leaderboard must be an instance of the performance.Leaderboard class."
+        self.leaderboard = leaderboard
+        with leaderboard.connection:
+            leaderboard.connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS play_ratings (
+                    player_name TEXT NOT NULL,
+                    chart_hash TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    rating REAL NOT NULL,
+                    PRIMARY KEY (player_name, chart_hash, difficulty)
+                );
+                CREATE INDEX IF NOT EXISTS play_ratings_by_rating
+                    ON play_ratings (player_name, rating DESC);
+                CREATE TABLE IF NOT EXISTS player_ratings (
+                    player_name TEXT PRIMARY KEY,
+                    rating REAL NOT NULL
+                );
+                """
+            )
+        self.ratings = dict(
+            leaderboard.connection.execute("SELECT * FROM player_ratings")
+        )
+
+    def get_player_rating(self, player_name: str) -> float:
+        """Used to get the rating of a player.
+
+        Parameters
+        ----------
+        player_name : str
+            Player username.
+
+        Returns
+        ----------
+        float
+            Rating of the player, zero if they have no results.
+        """
+        return self.ratings.get(player_name, 0.0)
+
+    def add(
+        self,
+        player_name: str,
+        chart_hash: str,
+        difficulty: str,
+        stars: float,
+        accuracy: float,
+    ) -> None:
+        """Used to queue a rating update for a new result.
+
+        Parameters
+        ----------
+        player_name : str
+            Player username.
+        chart_hash : str
+            Note hash of the difficulty.
+        difficulty : str
+            Difficulty name.
+        stars : float
+            Computed rating of the difficulty at the played rate.
+        accuracy : float
+            Accuracy of the result in percent.
+        """
+        arguments = (player_name, chart_hash, difficulty, stars, accuracy)
+        if self.leaderboard.writer is None:
+            self.update(*arguments, self.leaderboard.connection)
+        else:
+            self.leaderboard.writer.submit_unique(self.update, *arguments)
+
+    def update(
+        self,
+        player_name: str,
+        chart_hash: str,
+        difficulty: str,
+        stars: float,
+        accuracy: float,
+        connection=None,
+    ) -> None:
+        """Used to update the rating of a player with a new result.
+
+        Nothing changes unless the result beats the player's best on the
+        difficulty. Without a connection, the writer thread's own connection
+        is used.
+
+        Parameters
+        ----------
+        player_name : str
+            Player username.
+        chart_hash : str
+            Note hash of the difficulty.
+        difficulty : str
+            Difficulty name.
+        stars : float
+            Computed rating of the difficulty at the played rate.
+        accuracy : float
+            Accuracy of the result in percent.
+        connection : sqlite3.Connection, optional
+            Database connection.
+        """
+        if connection is None:
+            connection = self.leaderboard.get_write_connection()
+        play_rating = get_play_rating(stars, accuracy)
+        with connection:
+            row = connection.execute(
+                "SELECT rating FROM play_ratings "
+                "WHERE player_name = ? AND chart_hash = ? AND difficulty = ?",
+                (player_name, chart_hash, difficulty),
+            ).fetchone()
+            if row is not None and row[0] >= play_rating:
+                return
+            connection.execute(
+                "INSERT OR REPLACE INTO play_ratings VALUES (?, ?, ?, ?)",
+                (player_name, chart_hash, difficulty, play_rating),
+            )
+            best = connection.execute(
+                "SELECT rating FROM play_ratings WHERE player_name = ? "
+                "ORDER BY rating DESC LIMIT ?",
+                (player_name, BEST_COUNT),
+            )
+            rating = get_player_rating(rating for (rating,) in best)
+            connection.execute(
+                "INSERT OR REPLACE INTO player_ratings VALUES (?, ?)",
+                (player_name, rating),
+            )
+        self.ratings[player_name] = rating
+
+    def recompute(self, chart_index: chart.ChartIndex, workers=None) -> int:
+        """Used to rebuild all ratings from the stored results.
+
+        The charts are read and rated in parallel worker processes, then
+        the best accuracy of every player on every difficulty is rated again
+        and all ratings are replaced in one transaction. Results on charts
+        that are no longer installed are skipped.
+
+        Parameters
+        ----------
+        chart_index : chart.ChartIndex
+            Index of all installed charts.
+        workers : int, optional
+            Number of worker processes. Defaults to the number of CPUs.
+
+        Returns
+        ----------
+        int
+            Number of rated players.
+        """
+        chart_names = chart_index.get_chart_names()
+        cached_entries = [chart_index.charts[chart_name] for chart_name in chart_names]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chart_stars = dict()
+            for stars in executor.map(get_chart_stars, chart_names, cached_entries):
+                chart_stars.update(stars)
+
+        connection = self.leaderboard.connection
+        rows = connection.execute(
+            "SELECT player_name, chart_hash, difficulty, MAX(accuracy) FROM scores "
+            "GROUP BY player_name, chart_hash, difficulty"
+        )
+        play_ratings = []
+        player_plays = dict()
+        for player_name, chart_hash, difficulty, accuracy in rows:
+            stars = chart_stars.get(chart_hash, dict()).get(difficulty)
+            if stars is None:
+                continue
+            play_rating = get_play_rating(stars, accuracy)
+            play_ratings.append((player_name, chart_hash, difficulty, play_rating))
+            player_plays.setdefault(player_name, []).append(play_rating)
+        ratings = {
+            player_name: get_player_rating(plays)
+            for player_name, plays in player_plays.items()
+        }
+
+        with connection:
+            connection.execute("DELETE FROM play_ratings")
+            connection.execute("DELETE FROM player_ratings")
+            connection.executemany(
+                "INSERT INTO play_ratings VALUES (?, ?, ?, ?)", play_ratings
+            )
+            connection.executemany(
+                "INSERT INTO player_ratings VALUES (?, ?)", ratings.items()
+            )
+        self.ratings = ratings
+        return len(ratings)
+
+    def get_top(self, count: int = 10) -> list:
+        """Used to get the best rated players.
+
+        Parameters
+        ----------
+        count : int
+            Number of players.
+
+        Returns
+        ----------
+        list
+            Player names and ratings, best first.
+        """
+        return sorted(self.ratings.items(), key=lambda item: item[1], reverse=True)[
+            :count
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or rebuild player ratings.")
+    parser.add_argument(
+        "--recompute", action="store_true", help="rebuild all ratings from scores"
+    )
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    arguments = parser.parse_args()
+    leaderboard = performance.Leaderboard()
+    player_ratings = PlayerRatings(leaderboard)
+    if arguments.recompute:
+        rated = player_ratings.recompute(chart.ChartIndex(), workers=arguments.workers)
+        print(f"Recomputed the ratings of {rated} players.")
+    for place, (player_name, rating) in enumerate(player_ratings.get_top(), start=1):
+        print(f"{place}. {player_name}: {rating:.0f} pp")
+    leaderboard.close()
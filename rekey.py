@@ -0,0 +1,155 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import chart
+import history
+import performance
+import rating
+import resampler
+import sync
+
+
+def get_key_changes(chart_name: str, cached_entry=None) -> list:
+    """Used to get the old and new keys of the results of a chart.
+
+    Results used to be keyed by the hash of the song, and are now keyed by
+    the note hash of their difficulty.
+
+    Parameters
+    ----------
+    chart_name : str
+        The name of the chart folder.
+    cached_entry : dict, optional
+        Entry of the chart in the chart index.
+
+    Returns
+    ----------
+    list
+        Song hash, difficulty label of every playback rate and note hash of
+        every difficulty, empty if the chart can't be read.
+    """
+    try:
+        selected_chart = chart.Chart(chart_name, cached_entry)
+        song_hash = selected_chart.get_hash()
+    except (OSError, KeyError, IndexError) as error:
+        print(f"Caught {type(error)}: error")
+        return []
+    return [
+        (
+            song_hash,
+            performance.get_difficulty_label(difficulty.difficulty, rate),
+            difficulty.hash,
+        )
+        for difficulty in selected_chart.difficulties
+        for rate in resampler.RATES
+    ]
+
+
+def split_ambiguous(key_changes: list) -> tuple:
+    """Used to separate the key changes whose new key can't be told apart.
+
+    Charts that share their audio and a difficulty name have the same old
+    key, so their results can't be assigned to one of the new keys.
+
+    Parameters
+    ----------
+    key_changes : list
+        Song hash, difficulty label and note hash of every difficulty.
+
+    Returns
+    ----------
+    tuple
+        Unambiguous key changes, and the song hashes and difficulty labels
+        that map to more than one note hash.
+    """
+    new_keys = dict()
+    for old_key, label, new_key in key_changes:
+        new_keys.setdefault((old_key, label), set()).add(new_key)
+    changes = [
+        (old_key, label, next(iter(keys)))
+        for (old_key, label), keys in new_keys.items()
+        if len(keys) == 1
+    ]
+    ambiguous = sorted(old_pair for old_pair, keys in new_keys.items() if len(keys) > 1)
+    return changes, ambiguous
+
+
+def migrate_keys(
+    leaderboard: performance.Leaderboard,
+    play_history: history.PlayHistory,
+    chart_index: chart.ChartIndex,
+    workers=None,
+) -> dict:
+    """Used to key stored results by the note hash of their difficulty.
+
+    Songs are hashed in parallel worker processes. The leaderboard is
+    rewritten in one transaction, the moved results are queued to be
+    uploaded again and the player ratings are rebuilt from the leaderboard.
+    Results of charts that are no longer installed, and of difficulties that
+    share their audio and name with another chart, keep their old keys.
+
+    Parameters
+    ----------
+    leaderboard : performance.Leaderboard
+        Leaderboard to migrate.
+    play_history : history.PlayHistory
+        Play history to migrate.
+    chart_index : chart.ChartIndex
+        Index of all installed charts.
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+
+    Returns
+    ----------
+    dict
+        Number of moved results and plays, and the skipped song hashes and
+        difficulty labels that are ambiguous.
+    """
+    chart_names = chart_index.get_chart_names()
+    cached_entries = [chart_index.charts[chart_name] for chart_name in chart_names]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        key_changes = [
+            change
+            for changes in executor.map(get_key_changes, chart_names, cached_entries)
+            for change in changes
+        ]
+    key_changes, ambiguous = split_ambiguous(key_changes)
+    connection = leaderboard.connection
+    with connection:
+        moved_ids = [
+            score_id
+            for old_key, label, _ in key_changes
+            for (score_id,) in connection.execute(
+                "SELECT id FROM scores WHERE chart_hash = ? AND difficulty = ?",
+                (old_key, label),
+            )
+        ]
+        before = connection.total_changes
+        connection.executemany(
+            "UPDATE scores SET chart_hash = ? WHERE chart_hash = ? AND difficulty = ?",
+            [(new_key, old_key, label) for old_key, label, new_key in key_changes],
+        )
+        moved_results = connection.total_changes - before
+        sync.queue_uploads(connection, moved_ids)
+    rating.PlayerRatings(leaderboard).recompute(chart_index, workers)
+    return {
+        "results": moved_results,
+        "plays": play_history.migrate_keys(key_changes),
+        "ambiguous": ambiguous,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Key stored results by the note hash of their difficulty."
+    )
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    arguments = parser.parse_args()
+    leaderboard = performance.Leaderboard()
+    moved = migrate_keys(
+        leaderboard, history.PlayHistory(), chart.ChartIndex(), arguments.workers
+    )
+    print(f"Moved {moved['results']} results and {moved['plays']} plays.")
+    for song_hash, label in moved["ambiguous"]:
+        print(f"Skipped {song_hash[:8]} {label}: shared by several charts.")
+    leaderboard.close()
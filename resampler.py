@@ -0,0 +1,257 @@
+import os
+import threading
+import wave
+
+import numpy as np
+import pygame
+from pygame import mixer
+
+import assets
+
+RATES = (0.75, 1.0, 1.25, 1.5)
+
+
+class Resampler:
+    """The class used to prepare songs played at a different rate.
+
+    Songs are decoded, resampled with NumPy and written as PCM wave files to
+    cache/rates, keyed by the song hash and the rate, so a song only has to be
+    resampled once per rate. Songs in the asset store reuse their asset key as
+    hash. Other songs are hashed on the background thread, like all other
+    work, so the game thread never reads a whole song file.
+
+    Methods
+    -------
+    is_stored(song_source)
+        Used to check if a song is in the asset store.
+    get_song_hash(song_source)
+        Used to get the hash that keys the resampled copies of a song.
+    get_cache_location(song_source, rate)
+        Used to get the location of a resampled song.
+    resample(song_source, rate)
+        Used to resample a song and write it to the cache.
+    run_job(song_source, rate)
+        Used to resample a song on a background thread and keep its error.
+    request(song_source, rate)
+        Used to resample a song in the background.
+    is_pending(song_source, rate)
+        Used to check if a song is still being resampled.
+    get_error(song_source, rate)
+        Used to get the error of a failed resample.
+    get_song(song_source, rate)
+        Used to get the location of a song played at a rate.
+    """
+
+    def __init__(self) -> None:
+        self.cache_directory = os.path.join(
+            os.path.dirname(__file__), "cache", "rates"
+        )
+        self.asset_directory = os.path.abspath(assets.AssetStore().root)
+        self.song_hashes = dict()
+        self.jobs = dict()
+        self.errors = dict()
+        self.lock = threading.Lock()
+
+    def is_stored(self, song_source: str) -> bool:
+        """Used to check if a song is in the asset store.
+
+        Parameters
+        ----------
+        song_source : str
+            Song file location.
+
+        Returns
+        ----------
+        bool
+            The song is a stored asset, so its name is its hash.
+        """
+        directory = os.path.dirname(os.path.dirname(os.path.abspath(song_source)))
+        return directory == self.asset_directory
+
+    def get_song_hash(self, song_source: str) -> str:
+        """Used to get the hash that keys the resampled copies of a song.
+
+        Parameters
+        ----------
+        song_source : str
+            Song file location.
+
+        Returns
+        ----------
+        str
+            Asset key of a stored song, or the hash of the song file.
+
+        Raises
+        ------
+        OSError
+            The song file can't be read.
+        """
+        if song_source not in self.song_hashes:
+            if self.is_stored(song_source):
+                song_hash = os.path.splitext(os.path.basename(song_source))[0]
+            else:
+                song_hash = assets.get_file_hash(song_source)
+            self.song_hashes[song_source] = song_hash
+        return self.song_hashes[song_source]
+
+    def get_cache_location(self, song_source: str, rate: float) -> str:
+        """Used to get the location of a resampled song.
+
+        Parameters
+        ----------
+        song_source : str
+            Song file location.
+        rate : float
+            Playback rate.
+
+        Returns
+        ----------
+        str
+            Location of the resampled song in the cache.
+        """
+        file_name = f"{self.get_song_hash(song_source)}_{rate:.2f}.wav"
+        return os.path.join(self.cache_directory, file_name)
+
+    def resample(self, song_source: str, rate: float) -> str:
+        """Used to resample a song and write it to the cache.
+
+        Parameters
+        ----------
+        song_source : str
+            Song file location.
+        rate : float
+            Playback rate.
+
+        Returns
+        ----------
+        str
+            Location of the resampled song.
+        """
+        cache_location = self.get_cache_location(song_source, rate)
+        if os.path.isfile(cache_location):
+            return cache_location
+        frequency, _, channels = mixer.get_init()
+        samples = pygame.sndarray.array(mixer.Sound(song_source))
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        length = int(samples.shape[0] / rate)
+        positions = np.arange(length, dtype=np.float64) * rate
+        source_positions = np.arange(samples.shape[0], dtype=np.float64)
+        resampled = np.empty((length, samples.shape[1]), dtype=np.int16)
+        for channel in range(samples.shape[1]):
+            resampled[:, channel] = np.interp(
+                positions, source_positions, samples[:, channel]
+            )
+
+        os.makedirs(self.cache_directory, exist_ok=True)
+        temporary_location = f"{cache_location}.{threading.get_ident()}.tmp"
+        with wave.open(temporary_location, "wb") as wave_file:
+            wave_file.setnchannels(samples.shape[1])
+            wave_file.setsampwidth(2)
+            wave_file.setframerate(frequency)
+            wave_file.writeframes(resampled.tobytes())
+        os.replace(temporary_location, cache_location)
+        return cache_location
+
+    def run_job(self, song_source: str, rate: float) -> None:
+        """Used to resample a song on a background thread and keep its error.
+
+        Parameters
+        ----------
+        song_source : str
+            Song file location.
+        rate : float
+            Playback rate.
+        """
+        try:
+            self.resample(song_source, rate)
+        except Exception as error:
+            self.errors[(song_source, rate)] = error
+            print(f"Caught {type(error)}: error")
+
+    def request(self, song_source: str, rate: float) -> None:
+        """Used to resample a song in the background.
+
+        A song that failed to resample is not tried again.
+
+        Parameters
+        ----------
+        song_source : str
+            Song file location.
+        rate : float
+            Playback rate.
+        """
+        if rate == 1.0:
+            return
+        with self.lock:
+            if (song_source, rate) in self.jobs:
+                return
+            job = threading.Thread(
+                target=self.run_job, args=(song_source, rate), daemon=True
+            )
+            self.jobs[(song_source, rate)] = job
+        job.start()
+
+    def is_pending(self, song_source: str, rate: float) -> bool:
+        """Used to check if a song is still being resampled.
+
+        Parameters
+        ----------
+        song_source : str
+            Song file location.
+        rate : float
+            Playback rate.
+
+        Returns
+        ----------
+        bool
+            The background job is running.
+        """
+        job = self.jobs.get((song_source, rate))
+        return job is not None and job.is_alive()
+
+    def get_error(self, song_source: str, rate: float):
+        """Used to get the error of a failed resample.
+
+        Parameters
+        ----------
+        song_source : str
+            Song file location.
+        rate : float
+            Playback rate.
+
+        Returns
+        ----------
+        Exception or None
+            Error of the background job, or None if it did not fail.
+        """
+        return self.errors.get((song_source, rate))
+
+    def get_song(self, song_source: str, rate: float):
+        """Used to get the location of a song played at a rate.
+
+        Never waits for the background job or hashes the song, so it is safe
+        to call on the game thread. A song that isn't hashed yet is handed to
+        the background job, which hashes it and finds its cached copy.
+
+        Parameters
+        ----------
+        song_source : str
+            Song file location.
+        rate : float
+            Playback rate.
+
+        Returns
+        ----------
+        str or None
+            Location of the song to play, or None if it is still being
+            resampled or resampling failed.
+        """
+        if rate == 1.0:
+            return song_source
+        if song_source in self.song_hashes or self.is_stored(song_source):
+            cache_location = self.get_cache_location(song_source, rate)
+            if os.path.isfile(cache_location):
+                return cache_location
+        self.request(song_source, rate)
+        return None
@@ -0,0 +1,335 @@
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import json
+import zlib
+
+import analysis
+import chart
+import enums
+import performance
+import resampler
+import sync
+
+
+def get_chart_notes(chart_name: str, cached_entry=None) -> dict:
+    """Used to get the notes of all difficulties of a chart.
+
+    Parameters
+    ----------
+    chart_name : str
+        The name of the chart folder.
+    cached_entry : dict, optional
+        Entry of the chart in the chart index.
+
+    Returns
+    ----------
+    dict
+        Note hashes of the difficulties mapped to the difficulty labels of
+        every playback rate and the note timings and lanes played at that
+        rate, empty if the chart can't be read.
+    """
+    try:
+        selected_chart = chart.Chart(chart_name, cached_entry)
+    except (OSError, KeyError, IndexError) as error:
+        print(f"Caught {type(error)}: error")
+        return dict()
+    notes = dict()
+    for difficulty in selected_chart.difficulties:
+        timings, lanes, _ = analysis.get_note_arrays(difficulty.notes)
+        notes[difficulty.hash] = {
+            performance.get_difficulty_label(difficulty.difficulty, rate): (
+                [int(timing / rate) for timing in timings.tolist()],
+                (lanes + 1).tolist(),
+            )
+            for rate in resampler.RATES
+        }
+    return notes
+
+
+def rescore_hits(
+    hit_log: dict,
+    note_timings: list,
+    note_lanes: list,
+    hit_windows=performance.HIT_WINDOWS,
+    judgement_scores=performance.JUDGEMENT_SCORES,
+) -> tuple:
+    """Used to score a result again with the given scoring rules.
+
+    Hits and stray presses are judged from their stored errors. Notes that
+    have no hit were let through, which breaks the combo like it does in the
+    game.
+
+    Parameters
+    ----------
+    hit_log : dict
+        Stored hit error log of the result.
+    note_timings : list
+        Timings of all notes at the played rate.
+    note_lanes : list
+        Lanes of all notes.
+    hit_windows : sequence
+        Upper bounds of the absolute hit error of every judgement but a miss.
+    judgement_scores : sequence
+        Score of every judgement.
+
+    Returns
+    ----------
+    tuple
+        Score, accuracy, max combo and the hit counts of every judgement.
+    """
+    hits = list(zip(hit_log["timings"], hit_log["lanes"]))
+    passed = Counter(zip(note_timings, note_lanes)) - Counter(hits)
+    presses = list(zip(hit_log["timings"], hit_log["errors"])) + list(
+        zip(hit_log.get("stray_timings", []), hit_log.get("stray_errors", []))
+    )
+    events = [
+        (timing + error, performance.get_judgement(error, hit_windows))
+        for timing, error in presses
+    ]
+    events += [
+        (timing + hit_windows[-1], None)
+        for (timing, _), count in passed.items()
+        for _ in range(count)
+    ]
+    events.sort(key=lambda event: event[0])
+
+    score = combo = max_combo = 0
+    judgement_counts = [0] * len(performance.JUDGEMENTS)
+    for _, judgement in events:
+        if judgement is not None:
+            score += judgement_scores[judgement] * (
+                performance.get_score_multiplier(combo)
+            )
+            judgement_counts[judgement] += 1
+        if judgement is None or judgement == enums.Judgement.MISS:
+            max_combo = max(max_combo, combo)
+            combo = 0
+        else:
+            combo += 1
+    max_combo = max(max_combo, combo)
+    accuracy = performance.get_accuracy(judgement_counts)
+    if sum(judgement_counts) == 0:
+        accuracy = 100.0
+    return score, accuracy, max_combo, judgement_counts
+
+
+def rescore_chart(notes: dict, rows: list) -> tuple:
+    """Used to score all stored results of a difficulty again.
+
+    Every result is first replayed with the rules it was stored with. Results
+    whose replay doesn't give their stored score and hit counts have an
+    incomplete hit log, so they are not rescored.
+
+    Parameters
+    ----------
+    notes : dict
+        Difficulty labels mapped to note timings and lanes.
+    rows : list
+        Id, difficulty, compressed hit log, score and hit counts of every
+        result.
+
+    Returns
+    ----------
+    tuple
+        Id, score, accuracy, max combo and hit counts of every result that
+        has a hit log and a known difficulty, and the ids of the results
+        whose replay doesn't match.
+    """
+    rescored = []
+    mismatched = []
+    for score_id, difficulty, hits, stored_score, *stored_counts in rows:
+        if hits is None or difficulty not in notes:
+            continue
+        hit_log = json.loads(zlib.decompress(hits))
+        replayed_score, _, _, replayed_counts = rescore_hits(
+            hit_log,
+            *notes[difficulty],
+            hit_log.get("hit_windows", performance.HIT_WINDOWS),
+            hit_log.get("judgement_scores", performance.JUDGEMENT_SCORES),
+        )
+        if replayed_score != stored_score or replayed_counts != stored_counts:
+            mismatched.append(score_id)
+            continue
+        score, accuracy, max_combo, judgement_counts = rescore_hits(
+            hit_log, *notes[difficulty]
+        )
+        rescored.append((score_id, score, accuracy, max_combo, *judgement_counts))
+    return rescored, mismatched
+
+
+def get_rankings(rows) -> dict:
+    """Used to rank results on every leaderboard.
+
+    Parameters
+    ----------
+    rows : iterable
+        Id, chart hash, difficulty and score of every result.
+
+    Returns
+    ----------
+    dict
+        Result ids mapped to their rank on their leaderboard.
+    """
+    boards = dict()
+    for score_id, chart_hash, difficulty, score in rows:
+        boards.setdefault((chart_hash, difficulty), []).append((-score, score_id))
+    ranks = dict()
+    for results in boards.values():
+        results.sort()
+        for rank, (_, score_id) in enumerate(results, start=1):
+            ranks[score_id] = rank
+    return ranks
+
+
+def rescore_leaderboard(
+    leaderboard: performance.Leaderboard,
+    chart_index: chart.ChartIndex,
+    workers=None,
+    dry_run: bool = False,
+) -> dict:
+    """Used to score every stored result again and rewrite the leaderboard.
+
+    Charts are read and their results scored in parallel worker processes.
+    All changed results are written in a single transaction, so the
+    leaderboard is never left half migrated, and are queued to be uploaded
+    again. Results of difficulties that
+    were edited or are no longer installed keep their scores, and so do
+    results whose hit log doesn't replay to their stored score.
+
+    Parameters
+    ----------
+    leaderboard : performance.Leaderboard
+        Leaderboard to rewrite.
+    chart_index : chart.ChartIndex
+        Index of all installed charts.
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    dry_run : bool
+        Only report the changes.
+
+    Returns
+    ----------
+    dict
+        Number of rescored, changed and skipped results, the results whose
+        hit log doesn't match and the rank changes of every result that
+        moved.
+    """
+    connection = leaderboard.connection
+    rows = connection.execute(
+        "SELECT id, chart_hash, difficulty, player_name, score, hits, "
+        "perfect_hits, good_hits, bad_hits, misses FROM scores"
+    ).fetchall()
+    chart_names = chart_index.get_chart_names()
+    cached_entries = [chart_index.charts[chart_name] for chart_name in chart_names]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chart_notes = dict()
+        for notes in executor.map(get_chart_notes, chart_names, cached_entries):
+            chart_notes.update(notes)
+        chart_rows = dict()
+        for score_id, chart_hash, difficulty, _, score, hits, *counts in rows:
+            if chart_hash in chart_notes:
+                chart_rows.setdefault(chart_hash, []).append(
+                    (score_id, difficulty, hits, score, *counts)
+                )
+        rescored = []
+        mismatched_ids = set()
+        for chart_rescored, chart_mismatched in executor.map(
+            rescore_chart,
+            [chart_notes[chart_hash] for chart_hash in chart_rows],
+            chart_rows.values(),
+        ):
+            rescored += chart_rescored
+            mismatched_ids.update(chart_mismatched)
+
+    stored = {
+        row[0]: row[1:]
+        for row in connection.execute(
+            "SELECT id, score, accuracy, max_combo, perfect_hits, good_hits, "
+            "bad_hits, misses FROM scores"
+        )
+    }
+    updated = [row for row in rescored if tuple(row[1:]) != stored[row[0]]]
+    old_scores = {row[0]: row[4] for row in rows}
+    changed = [row for row in rescored if row[1] != old_scores[row[0]]]
+    new_scores = dict(old_scores)
+    new_scores.update((row[0], row[1]) for row in rescored)
+    old_ranks = get_rankings((row[0], row[1], row[2], row[4]) for row in rows)
+    new_ranks = get_rankings(
+        (row[0], row[1], row[2], new_scores[row[0]]) for row in rows
+    )
+    moved = [
+        {
+            "player_name": player_name,
+            "chart_hash": chart_hash,
+            "difficulty": difficulty,
+            "old_rank": old_ranks[score_id],
+            "new_rank": new_ranks[score_id],
+        }
+        for score_id, chart_hash, difficulty, player_name, *_ in rows
+        if old_ranks[score_id] != new_ranks[score_id]
+    ]
+    mismatched = [
+        {
+            "id": score_id,
+            "player_name": player_name,
+            "chart_hash": chart_hash,
+            "difficulty": difficulty,
+        }
+        for score_id, chart_hash, difficulty, player_name, *_ in rows
+        if score_id in mismatched_ids
+    ]
+
+    if not dry_run:
+        with connection:
+            connection.executemany(
+                "UPDATE scores SET score = ?, accuracy = ?, max_combo = ?, "
+                "perfect_hits = ?, good_hits = ?, bad_hits = ?, misses = ? "
+                "WHERE id = ?",
+                [(*row[1:], row[0]) for row in updated],
+            )
+            sync.queue_uploads(connection, [row[0] for row in updated])
+    return {
+        "rescored": len(rescored),
+        "changed": len(changed),
+        "skipped": len(rows) - len(rescored),
+        "mismatched": mismatched,
+        "moved": moved,
+    }
+
+
+if __name__ == "__main__":
+    import rating
+
+    parser = argparse.ArgumentParser(
+        description="Score all stored results again with the current rules."
+    )
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only report the changes"
+    )
+    arguments = parser.parse_args()
+    leaderboard = performance.Leaderboard()
+    index = chart.ChartIndex()
+    report = rescore_leaderboard(
+        leaderboard, index, arguments.workers, arguments.dry_run
+    )
+    print(
+        f"Rescored {report['rescored']} results, {report['changed']} changed, "
+        f"{report['skipped']} skipped."
+    )
+    for result in report["mismatched"]:
+        print(
+            f"Skipped result {result['id']} of {result['player_name']} on "
+            f"{result['chart_hash'][:8]} {result['difficulty']}: its hit log "
+            "doesn't replay to its stored score."
+        )
+    for move in report["moved"]:
+        print(
+            f"{move['player_name']} on {move['chart_hash'][:8]} "
+            f"{move['difficulty']}: #{move['old_rank']} -> #{move['new_rank']}"
+        )
+    if not arguments.dry_run:
+        rated = rating.PlayerRatings(leaderboard).recompute(index, arguments.workers)
+        print(f"Recomputed the ratings of {rated} players.")
+    leaderboard.close()
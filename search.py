@@ -0,0 +1,150 @@
+from bisect import bisect_left
+
+
+class SearchIndex:
+    """The class used to search charts by title, artist and mapper.
+
+    Terms shorter than three characters are matched as word prefixes through a
+    sorted word list, longer terms as substrings through a trigram index. When
+    the query only grows, the previous results are filtered instead of
+    searching again.
+
+    Methods
+    -------
+    add(row, fields)
+        Used to add a row to the index.
+    matches(term, row)
+        Used to check if a row matches a single term.
+    search_term(term, rows)
+        Used to get all rows that match a single term.
+    search(query)
+        Used to get all rows that match the query.
+    """
+
+    def __init__(self) -> None:
+        self.texts = []
+        self.row_words = []
+        self.words = []
+        self.trigrams = dict()
+        self.sorted = True
+        self.last_query = ""
+        self.last_results = []
+
+    def add(self, row: int, fields: list) -> None:
+        """Used to add a row to the index.
+
+        Parameters
+        ----------
+        row : int
+            Row number. Rows must be added in order, starting from zero.
+        fields : list
+            Searchable strings of the row.
+
+        Raises
+        ------
+        AssertionError
+            row is not the next row number.
+        """
+        assert row == len(self.texts), "rows must be added in order."
+        text = " ".join(str(field) for field in fields).lower()
+        self.texts.append(text)
+        self.row_words.append(text.split())
+        for word in set(text.split()):
+            self.words.append((word, row))
+        for position in range(len(text) - 2):
+            self.trigrams.setdefault(text[position : position + 3], set()).add(row)
+        self.sorted = False
+        self.last_query = ""
+
+    def matches(self, term: str, row: int) -> bool:
+        """Used to check if a row matches a single term.
+
+        Parameters
+        ----------
+        term : str
+            Lowercase search term without spaces.
+        row : int
+            Row number.
+
+        Returns
+        ----------
+        bool
+            The row matches the term.
+        """
+        if len(term) < 3:
+            return any(word.startswith(term) for word in self.row_words[row])
+        return term in self.texts[row]
+
+    def search_term(self, term: str, rows=None) -> set:
+        """Used to get all rows that match a single term.
+
+        Parameters
+        ----------
+        term : str
+            Lowercase search term without spaces.
+        rows : iterable, optional
+            Rows to search in. All rows are searched if missing.
+
+        Returns
+        ----------
+        set
+            Matching rows.
+        """
+        if rows is not None:
+            return {row for row in rows if self.matches(term, row)}
+        if len(term) < 3:
+            if not self.sorted:
+                self.words.sort()
+                self.sorted = True
+            matches = set()
+            position = bisect_left(self.words, (term, -1))
+            while position < len(self.words) and self.words[position][0].startswith(
+                term
+            ):
+                matches.add(self.words[position][1])
+                position += 1
+            return matches
+        candidates = None
+        for position in range(len(term) - 2):
+            rows_with_trigram = self.trigrams.get(term[position : position + 3])
+            if not rows_with_trigram:
+                return set()
+            if candidates is None:
+                candidates = set(rows_with_trigram)
+            else:
+                candidates &= rows_with_trigram
+        return {row for row in candidates if term in self.texts[row]}
+
+    def search(self, query: str) -> list:
+        """Used to get all rows that match the query.
+
+        Parameters
+        ----------
+        query : str
+            Search query. Every word of the query must match.
+
+        Returns
+        ----------
+        list
+            Sorted matching rows.
+        """
+        assert isinstance(query, str), "query must be a string."
+        query = query.lower().strip()
+        if not query:
+            results = list(range(len(self.texts)))
+        elif (
+            self.last_query
+            and query.startswith(self.last_query)
+            and len(query.split()) == len(self.last_query.split())
+            and (len(query.split()[-1]) < 3) == (len(self.last_query.split()[-1]) < 3)
+        ):
+            term = query.split()[-1]
+            results = sorted(self.search_term(term, self.last_results))
+        else:
+            matches = None
+            for term in query.split():
+                matches = self.search_term(term, matches)
+            results = sorted(matches)
+        self.last_query = query
+        self.last_results = results
+        return results
@@ -1,5 +1,6 @@
 import json
 import os
+import writer
 
 
 class Settings:
@@ -31,10 +32,22 @@ class Settings:
         Used to increment volume.
     decrement_volume()
         Used to decrement volume.
+    get_offset(chart_name)
+        Used to get the audio offset for a chart.
+    change_chart_offset(chart_name, change)
+        Used to change the offset of a chart.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, background_writer=None) -> None:
+        """
+        Parameters
+        ----------
+        background_writer : writer.BackgroundWriter, optional
+            Writer used to save the settings without blocking. Settings are
+            saved right away if missing.
+        """
         self.settings_path = "settings.json"
+        self.writer = background_writer
         if self.file_exists():
             self.load()
         else:
@@ -55,6 +68,11 @@ class Settings:
                 self.note_speed = round(data["note_speed"], 1)
                 self.background_dim = data["background_dim"]
                 self.volume = data["volume"]
+                self.audio_frequency = data.get("audio_frequency", 44100)
+                self.audio_buffer = data.get("audio_buffer", 512)
+                self.audio_offset = data.get("audio_offset", 25)
+                self.chart_offsets = data.get("chart_offsets", dict())
+                self.sync_url = data.get("sync_url", "")
         except FileNotFoundError as error:
             print(f"Caught {type(error)}: error")
         self.background_alpha = self.calculate_background_alpha()
@@ -63,6 +81,9 @@ class Settings:
     def save(self) -> None:
         """Used to save settings to a file.
 
+        The file is replaced atomically. With a background writer, the write
+        is queued and repeated saves are coalesced.
+
         Raises
         ------
         OSError
@@ -73,10 +94,18 @@ class Settings:
             "note_speed": round(self.note_speed, 1),
             "background_dim": self.background_dim,
             "volume": self.volume,
+            "audio_frequency": self.audio_frequency,
+            "audio_buffer": self.audio_buffer,
+            "audio_offset": self.audio_offset,
+            "chart_offsets": self.chart_offsets,
+            "sync_url": self.sync_url,
         }
+        content = json.dumps(data)
+        if self.writer is not None:
+            self.writer.write_text(self.settings_path, content)
+            return
         try:
-            with open(self.settings_path, "w") as settings_file:
-                json.dump(data, settings_file)
+            writer.write_text_atomic(self.settings_path, content)
         except OSError as error:
             print(f"Caught {type(error)}: error")
 
@@ -87,6 +116,11 @@ class Settings:
         self.background_dim = 0
         self.background_alpha = self.calculate_background_alpha()
         self.volume = 100
+        self.audio_frequency = 44100
+        self.audio_buffer = 512
+        self.audio_offset = 25
+        self.chart_offsets = dict()
+        self.sync_url = ""
         self.time_to_react = self.calculate_time_to_react()
 
     def file_exists(self) -> bool:
@@ -154,3 +188,34 @@ class Settings:
         """Used to decrement volume."""
         if self.volume > 0:
             self.volume -= 5
+
+    def get_offset(self, chart_name: str) -> int:
+        """Used to get the audio offset for a chart.
+
+        Parameters
+        ----------
+        chart_name : str
+            The name of the chart.
+
+        Returns
+        ----------
+        int
+            Global offset plus the offset of the chart, in milliseconds.
+        """
+        return self.audio_offset + self.chart_offsets.get(chart_name, 0)
+
+    def change_chart_offset(self, chart_name: str, change: int) -> None:
+        """Used to change the offset of a chart.
+
+        Parameters
+        ----------
+        chart_name : str
+            The name of the chart.
+        change : int
+            Offset change in milliseconds.
+        """
+        offset = self.chart_offsets.get(chart_name, 0) + change
+        if offset == 0:
+            self.chart_offsets.pop(chart_name, None)
+        else:
+            self.chart_offsets[chart_name] = offset
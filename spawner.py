@@ -1,3 +1,4 @@
+from bisect import bisect_left, bisect_right
 import chart
 import pygame as pg
 import os
@@ -6,6 +7,92 @@ import spritesheet
 import enums
 
 
+class ScrollTable:
+    """The class used to map song positions to scroll positions.
+
+    Every timing point starts a segment with a constant scroll speed: the BPM
+    of the point relative to the main BPM, times its slider velocity. The
+    scroll position at the start of every segment is precomputed, so the
+    position at any time takes one binary search.
+
+    Methods
+    -------
+    get_base_bpm(timing_points, end)
+        Used to get the BPM that lasts the longest.
+    get_position(timing)
+        Used to get the scroll position at a song position.
+    """
+
+    def __init__(self, timing_points: list, end: int, rate: float = 1.0) -> None:
+        """
+        Parameters
+        ----------
+        timing_points : list
+            List of [timing, bpm, slider velocity] changes sorted by timing.
+        end : int
+            Timing of the last note.
+        rate : float
+            Playback rate. Segment timings are scaled to the resampled song.
+        """
+        self.starts = [0.0]
+        self.positions = [0.0]
+        self.speeds = [1.0]
+        if not timing_points:
+            return
+        base_bpm = self.get_base_bpm(timing_points, end)
+        self.starts.clear()
+        self.positions.clear()
+        self.speeds.clear()
+        position = 0.0
+        for timing, bpm, velocity in timing_points:
+            start = timing / rate
+            if self.starts:
+                position += (start - self.starts[-1]) * self.speeds[-1]
+            speed = velocity * bpm / base_bpm if base_bpm > 0 else velocity
+            self.starts.append(start)
+            self.positions.append(position)
+            self.speeds.append(speed)
+
+    def get_base_bpm(self, timing_points: list, end: int) -> float:
+        """Used to get the BPM that lasts the longest.
+
+        Parameters
+        ----------
+        timing_points : list
+            List of [timing, bpm, slider velocity] changes sorted by timing.
+        end : int
+            Timing of the last note.
+
+        Returns
+        ----------
+        float
+            Main BPM of the chart.
+        """
+        durations = dict()
+        for index, (timing, bpm, _) in enumerate(timing_points):
+            next_timing = end
+            if index + 1 < len(timing_points):
+                next_timing = timing_points[index + 1][0]
+            durations[bpm] = durations.get(bpm, 0) + max(next_timing - timing, 0)
+        return max(durations, key=durations.get)
+
+    def get_position(self, timing: float) -> float:
+        """Used to get the scroll position at a song position.
+
+        Parameters
+        ----------
+        timing : float
+            Song position in milliseconds.
+
+        Returns
+        ----------
+        float
+            Scroll position in milliseconds at the main scroll speed.
+        """
+        index = max(bisect_right(self.starts, timing) - 1, 0)
+        return self.positions[index] + (timing - self.starts[index]) * self.speeds[index]
+
+
 class Spawner:
     """The class used to represent a notes spawner.
 
@@ -19,14 +106,18 @@ class Spawner:
         Used to image the surface relative to the spawn line.
     spawn_notes(screen)
         Used to spawn notes.
+    get_note_index(position)
+        Used to get the index of the first note at or after a position.
     """
 
-    def __init__(self, difficulty: chart.Difficulty) -> None:
+    def __init__(self, difficulty: chart.Difficulty, rate: float = 1.0) -> None:
         """
         Parameters
         ----------
         difficulty : chart.Difficulty
             Selected difficulty.
+        rate : float
+            Playback rate. Note timings are scaled to the resampled song.
 
         Raises
         ------
@@ -37,6 +128,11 @@ class Spawner:
             difficulty, chart.Difficulty
         ), "difficulty must be an instance of the chart.Difficulty class."
         self.selected_difficulty = difficulty
+        self.rate = rate
+        self.timings = []
+        notes = difficulty.notes
+        end = int(max(notes, key=int)) if notes else 0
+        self.scroll_table = ScrollTable(difficulty.timing_points, end, rate)
         self.note_images = self.get_note_images()
 
     def get_note_images(self) -> list:
@@ -91,6 +187,9 @@ class Spawner:
     def spawn_notes(self, screen: pg.surface.Surface) -> list:
         """Used to spawn notes.
 
+        Notes are spawned in order of their timing, whatever the order of the
+        difficulty file, because seeking and note culling rely on it.
+
         Parameters
         ----------
         screen : pg.surface.Surface
@@ -102,10 +201,11 @@ class Spawner:
             List of spawned notes.
         """
         notes = []
-        for timing in self.selected_difficulty.notes:
+        self.timings = []
+        for timing in sorted(self.selected_difficulty.notes, key=int):
             note_positions = self.selected_difficulty.notes[timing]
             spawn_lines = self.get_spawn_lines(note_positions)
-            timing = int(int(timing) - 350 / 2)
+            timing = int(int(timing) / self.rate)
             for line in spawn_lines:
                 image = self.get_image_for_note(line)
                 note = Note(
@@ -114,5 +214,22 @@ class Spawner:
                     timing=timing,
                     display_surf=screen,
                 )
+                note.scroll_position = self.scroll_table.get_position(timing)
                 notes.append(note)
+                self.timings.append(timing)
         return notes
+
+    def get_note_index(self, position: int) -> int:
+        """Used to get the index of the first note at or after a position.
+
+        Parameters
+        ----------
+        position : int
+            Song position in milliseconds.
+
+        Returns
+        ----------
+        int
+            Index into the spawned notes.
+        """
+        return bisect_left(self.timings, position)
@@ -0,0 +1,508 @@
+import argparse
+import http.client
+import json
+import queue
+import random
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+import uuid
+
+BATCH_SIZE = 50
+TOP_COUNT = 10
+SYNC_INTERVAL = 30.0  # s
+RETRIES = 4
+BACKOFF_BASE = 0.5  # s
+BACKOFF_LIMIT = 8.0  # s
+TIMEOUT = 5.0  # s
+UPLOADED_COLUMNS = (
+    "id",
+    "chart_hash",
+    "difficulty",
+    "player_name",
+    "score",
+    "max_combo",
+    "max_possible_combo",
+    "accuracy",
+    "perfect_hits",
+    "good_hits",
+    "bad_hits",
+    "misses",
+    "rate",
+    "played_at",
+)
+
+
+class SyncError(Exception):
+    """The exception raised when the leaderboard service can't be reached."""
+
+
+def queue_uploads(connection: sqlite3.Connection, score_ids) -> None:
+    """Used to upload results again after they were rewritten.
+
+    Results are only uploaded once by id, so tools that change stored results
+    queue them here, inside the transaction that changes them.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        Database connection.
+    score_ids : iterable
+        Ids of the changed results.
+    """
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS sync_pending ("
+        "score_id INTEGER PRIMARY KEY, queued_at INTEGER NOT NULL)"
+    )
+    queued_at = time.time_ns()
+    connection.executemany(
+        "INSERT OR REPLACE INTO sync_pending VALUES (?, ?)",
+        [(score_id, queued_at) for score_id in score_ids],
+    )
+
+
+class ConnectionPool:
+    """The class used to represent a pool of keep-alive HTTP connections.
+
+    Connections are reused between requests, so a batch does not pay for a
+    new TCP handshake. A connection that failed is dropped instead of being
+    returned to the pool.
+
+    Methods
+    -------
+    request(method, path, body)
+        Used to send a request and read its JSON response.
+    close()
+        Used to close all pooled connections.
+    """
+
+    def __init__(self, url: str, size: int = 2) -> None:
+        """
+        Parameters
+        ----------
+        url : str
+            Base URL of the leaderboard service.
+        size : int
+            Number of idle connections kept open.
+
+        Raises
+        ------
+        AssertionError
+            url is not an http or https URL.
+        """
+        parts = urlsplit(url)
+        assert parts.scheme in ("http", "https"), "url must be an http(s) URL."
+        self.connection_class = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.netloc = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    def request(self, method: str, path: str, body=None):
+        """Used to send a request and read its JSON response.
+
+        Parameters
+        ----------
+        method : str
+            HTTP method.
+        path : str
+            Path below the base URL, including the query.
+        body : dict, optional
+            JSON body of the request.
+
+        Returns
+        ----------
+        dict
+            Decoded response.
+
+        Raises
+        ------
+        SyncError
+            The request failed or the service answered with an error.
+        """
+        try:
+            connection = self.idle.get_nowait()
+        except queue.Empty:
+            connection = self.connection_class(self.netloc, timeout=TIMEOUT)
+        headers = {"Connection": "keep-alive"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        try:
+            connection.request(method, self.base_path + path, payload, headers)
+            response = connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException) as error:
+            connection.close()
+            raise SyncError(f"{method} {path} failed: {error}") from error
+        if response.will_close:
+            connection.close()
+        else:
+            try:
+                self.idle.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+        if response.status >= 400:
+            raise SyncError(f"{method} {path} answered {response.status}")
+        return json.loads(content) if content else dict()
+
+    def close(self) -> None:
+        """Used to close all pooled connections."""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class SyncClient:
+    """The class used to share results with a central leaderboard service.
+
+    A background thread uploads new local results in batches and pulls the
+    leaderboards that changed since the last sync. It has its own database
+    connection and never holds the game thread: failed requests are retried
+    with exponential backoff and otherwise left for the next sync.
+
+    Methods
+    -------
+    start()
+        Used to start the sync thread.
+    notify()
+        Used to request a sync soon, for example after a new result.
+    run()
+        Used to sync until the client is closed.
+    sync(connection)
+        Used to upload new results and pull changed leaderboards once.
+    request(method, path, body)
+        Used to send a request with retries.
+    upload(connection)
+        Used to upload all results that were not uploaded yet.
+    upload_queued(connection, cabinet_id)
+        Used to upload the results that were queued again.
+    pull(connection)
+        Used to pull the leaderboards that changed since the last pull.
+    get_state(connection, key, default)
+        Used to read a sync state value.
+    set_state(connection, key, value)
+        Used to write a sync state value.
+    close()
+        Used to stop the sync thread without waiting for the network.
+    """
+
+    def __init__(self, database_location: str, url: str) -> None:
+        """
+        Parameters
+        ----------
+        database_location : str
+            Path of the leaderboard database.
+        url : str
+            Base URL of the leaderboard service.
+        """
+        self.database_location = database_location
+        self.pool = ConnectionPool(url)
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.last_error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        connection = sqlite3.connect(database_location)
+        with connection:
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS sync_pending (
+                    score_id INTEGER PRIMARY KEY,
+                    queued_at INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS remote_scores (
+                    chart_hash TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    place INTEGER NOT NULL,
+                    player_name TEXT NOT NULL,
+                    score INTEGER NOT NULL,
+                    accuracy REAL NOT NULL,
+                    PRIMARY KEY (chart_hash, difficulty, place)
+                );
+                """
+            )
+        if self.get_state(connection, "cabinet_id") is None:
+            self.set_state(connection, "cabinet_id", uuid.uuid4().hex)
+        connection.close()
+
+    def start(self) -> None:
+        """Used to start the sync thread."""
+        self.thread.start()
+
+    def notify(self) -> None:
+        """Used to request a sync soon, for example after a new result."""
+        self.wake.set()
+
+    def run(self) -> None:
+        """Used to sync until the client is closed."""
+        connection = sqlite3.connect(self.database_location)
+        try:
+            while not self.stopped.is_set():
+                try:
+                    self.sync(connection)
+                    self.last_error = None
+                except (SyncError, sqlite3.Error, ValueError) as error:
+                    self.last_error = error
+                    print(f"Caught {type(error)}: error")
+                self.wake.wait(SYNC_INTERVAL)
+                self.wake.clear()
+        finally:
+            connection.close()
+            self.pool.close()
+
+    def sync(self, connection: sqlite3.Connection) -> None:
+        """Used to upload new results and pull changed leaderboards once.
+
+        Parameters
+        ----------
+        connection : sqlite3.Connection
+            Database connection of the sync thread.
+        """
+        self.upload(connection)
+        self.pull(connection)
+
+    def request(self, method: str, path: str, body=None):
+        """Used to send a request with retries.
+
+        Waits between attempts grow exponentially with random jitter, so
+        cabinets that lost the service at the same time don't retry in step.
+
+        Parameters
+        ----------
+        method : str
+            HTTP method.
+        path : str
+            Path below the base URL, including the query.
+        body : dict, optional
+            JSON body of the request.
+
+        Returns
+        ----------
+        dict
+            Decoded response.
+
+        Raises
+        ------
+        SyncError
+            All attempts failed or the client was closed.
+        """
+        for attempt in range(RETRIES + 1):
+            try:
+                return self.pool.request(method, path, body)
+            except SyncError:
+                if attempt == RETRIES:
+                    raise
+            delay = min(BACKOFF_BASE * 2**attempt, BACKOFF_LIMIT)
+            if self.stopped.wait(delay * random.uniform(0.5, 1.0)):
+                raise SyncError("The sync client is closed.")
+
+    def upload(self, connection: sqlite3.Connection) -> int:
+        """Used to upload all results that were not uploaded yet.
+
+        Results are sent in batches of BATCH_SIZE in the order they were
+        stored, after the results that were rewritten and queued again. The
+        service ignores results it already has unchanged, so a batch that is
+        sent again after a lost response is not counted twice.
+
+        Parameters
+        ----------
+        connection : sqlite3.Connection
+            Database connection of the sync thread.
+
+        Returns
+        ----------
+        int
+            Number of uploaded results.
+        """
+        cabinet_id = self.get_state(connection, "cabinet_id")
+        uploaded = self.upload_queued(connection, cabinet_id)
+        while not self.stopped.is_set():
+            last_id = int(self.get_state(connection, "last_uploaded_id", 0))
+            rows = connection.execute(
+                f"SELECT {', '.join(UPLOADED_COLUMNS)} FROM scores "
+                "WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, BATCH_SIZE),
+            ).fetchall()
+            if not rows:
+                break
+            results = [dict(zip(UPLOADED_COLUMNS, row)) for row in rows]
+            self.request(
+                "POST", "/scores", {"cabinet_id": cabinet_id, "results": results}
+            )
+            self.set_state(connection, "last_uploaded_id", rows[-1][0])
+            uploaded += len(rows)
+        return uploaded
+
+    def upload_queued(self, connection: sqlite3.Connection, cabinet_id: str) -> int:
+        """Used to upload the results that were queued again.
+
+        A result is only taken off the queue if it was not queued again while
+        its batch was sent.
+
+        Parameters
+        ----------
+        connection : sqlite3.Connection
+            Database connection of the sync thread.
+        cabinet_id : str
+            Id of this cabinet.
+
+        Returns
+        ----------
+        int
+            Number of uploaded results.
+        """
+        uploaded = 0
+        while not self.stopped.is_set():
+            queued = connection.execute(
+                "SELECT score_id, queued_at FROM sync_pending "
+                "ORDER BY score_id LIMIT ?",
+                (BATCH_SIZE,),
+            ).fetchall()
+            if not queued:
+                break
+            rows = connection.execute(
+                f"SELECT {', '.join(UPLOADED_COLUMNS)} FROM scores "
+                f"WHERE id IN ({', '.join('?' * len(queued))}) ORDER BY id",
+                [score_id for score_id, _ in queued],
+            ).fetchall()
+            results = [dict(zip(UPLOADED_COLUMNS, row)) for row in rows]
+            if results:
+                self.request(
+                    "POST", "/scores", {"cabinet_id": cabinet_id, "results": results}
+                )
+            with connection:
+                connection.executemany(
+                    "DELETE FROM sync_pending WHERE score_id = ? AND queued_at = ?",
+                    queued,
+                )
+            uploaded += len(rows)
+        return uploaded
+
+    def pull(self, connection: sqlite3.Connection) -> int:
+        """Used to pull the leaderboards that changed since the last pull.
+
+        Only boards that changed after the stored cursor are sent by the
+        service, each with its TOP_COUNT best results, and they replace the
+        local copies in one transaction.
+
+        Parameters
+        ----------
+        connection : sqlite3.Connection
+            Database connection of the sync thread.
+
+        Returns
+        ----------
+        int
+            Number of updated leaderboards.
+        """
+        cursor = int(self.get_state(connection, "pull_cursor", 0))
+        response = self.request("GET", f"/top?since={cursor}&count={TOP_COUNT}")
+        boards = response.get("boards", [])
+        with connection:
+            for board in boards:
+                connection.execute(
+                    "DELETE FROM remote_scores WHERE chart_hash = ? AND difficulty = ?",
+                    (board["chart_hash"], board["difficulty"]),
+                )
+                connection.executemany(
+                    "INSERT INTO remote_scores VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            board["chart_hash"],
+                            board["difficulty"],
+                            place,
+                            result["player_name"],
+                            result["score"],
+                            result["accuracy"],
+                        )
+                        for place, result in enumerate(board["top"], start=1)
+                    ],
+                )
+            connection.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?)",
+                ("pull_cursor", str(response.get("cursor", cursor))),
+            )
+        return len(boards)
+
+    def get_state(self, connection: sqlite3.Connection, key: str, default=None):
+        """Used to read a sync state value.
+
+        Parameters
+        ----------
+        connection : sqlite3.Connection
+            Database connection.
+        key : str
+            Name of the value.
+        default : optional
+            Value returned if it was never written.
+
+        Returns
+        ----------
+        str
+            Stored value or the default.
+        """
+        row = connection.execute(
+            "SELECT value FROM sync_state WHERE key = ?", (key,)
+        ).fetchone()
+        return default if row is None else row[0]
+
+    def set_state(self, connection: sqlite3.Connection, key: str, value) -> None:
+        """Used to write a sync state value.
+
+        Parameters
+        ----------
+        connection : sqlite3.Connection
+            Database connection.
+        key : str
+            Name of the value.
+        value
+            New value, stored as text.
+        """
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (key, str(value))
+            )
+
+    def close(self) -> None:
+        """Used to stop the sync thread without waiting for the network.
+
+        A request that is in flight is abandoned, and what was not uploaded
+        is sent on the next start.
+        """
+        self.stopped.set()
+        self.wake.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout=0.1)
+
+
+if __name__ == "__main__":
+    import performance
+
+    parser = argparse.ArgumentParser(description="Sync the leaderboard once.")
+    parser.add_argument("url", help="leaderboard service URL")
+    arguments = parser.parse_args()
+    leaderboard = performance.Leaderboard()
+    client = SyncClient(leaderboard.database_location, arguments.url)
+    start = time.perf_counter()
+    try:
+        sent = client.upload(leaderboard.connection)
+        pulled = client.pull(leaderboard.connection)
+        print(
+            f"Uploaded {sent} results and pulled {pulled} leaderboards "
+            f"in {(time.perf_counter() - start) * 1000:.0f} ms."
+        )
+    except SyncError as error:
+        print(f"Caught {type(error)}: error")
+    client.pool.close()
+    leaderboard.close()
@@ -0,0 +1,195 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def get_percentiles(values, percentiles=(1, 50, 95, 99)) -> dict:
+    """Used to get percentiles of a list of values.
+
+    Parameters
+    ----------
+    values : list
+        Measured values.
+    percentiles : tuple
+        Percentiles to compute.
+
+    Returns
+    ----------
+    dict
+        Percentiles mapped to their values, empty if there are no values.
+    """
+    if len(values) == 0:
+        return dict()
+    results = np.percentile(np.asarray(values, dtype=np.float64), percentiles)
+    return {
+        f"p{percentile}": float(value)
+        for percentile, value in zip(percentiles, results)
+    }
+
+
+def fit_clock(samples: np.ndarray) -> tuple:
+    """Used to fit a line through song positions sampled against wall time.
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        Rows of [wall time, song position] in milliseconds.
+
+    Returns
+    ----------
+    tuple
+        Slope and intercept of the song position over wall time.
+    """
+    if len(samples) < 2:
+        return 1.0, 0.0
+    slope, intercept = np.polyfit(samples[:, 0], samples[:, 1], 1)
+    return float(slope), float(intercept)
+
+
+def run_sync_diagnostic(
+    chart_name: str,
+    difficulty_index: int = 0,
+    duration: float = 10.0,
+    pause_at: float = 5.0,
+    pause_time: float = 1.0,
+    real_audio: bool = False,
+) -> dict:
+    """Used to play a chart headlessly and measure how the song clock drifts.
+
+    Every frame the song position is sampled against a monotonic clock, and
+    the positions of the rendered notes are turned back into the song time
+    they show. The song is paused once in the middle of the run. The game
+    runs on a temporary leaderboard and play history without syncing, and
+    the settings are not saved, so nothing of the run is kept.
+
+    Parameters
+    ----------
+    chart_name : str
+        The name of the chart folder.
+    difficulty_index : int
+        Index of the difficulty in the chart.
+    duration : float
+        Playing time in seconds, without the pause.
+    pause_at : float
+        Playing time in seconds after which the song is paused.
+    pause_time : float
+        Length of the pause in seconds.
+    real_audio : bool
+        Use the real audio device instead of the SDL dummy driver.
+
+    Returns
+    ----------
+    dict
+        Clock step, drift, pause and skew measurements.
+    """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    if not real_audio:
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+    import pygame
+    import main
+
+    storage = tempfile.TemporaryDirectory()
+    game = main.Game(1280, 720, 0, storage.name)
+    game.settings.sync_url = ""
+    game.on_init()
+    game.select_chart(chart_name)
+    game.start_chart(difficulty_index)
+
+    clock_samples = []
+    skew_samples = []
+    paused = False
+    paused_for = 0.0
+    start = time.perf_counter()
+    while True:
+        elapsed = time.perf_counter() - start - paused_for
+        if elapsed >= duration or not game.running:
+            break
+        if not paused and elapsed >= pause_at:
+            pause_start = time.perf_counter()
+            game.audioPlayer.mixer.music.pause()
+            time.sleep(pause_time)
+            game.audioPlayer.mixer.music.unpause()
+            paused_for = time.perf_counter() - pause_start
+            paused = True
+        game.on_loop()
+        game.on_render()
+        wall = (time.perf_counter() - start - paused_for) * 1000
+        clock_samples.append((wall, game.audioPlayer.songPosition, paused))
+        for index in range(game.note_cursor, game.visible_end):
+            note = game.notes[index]
+            if note.is_active and note.rect.y > 0:
+                shown = note.scroll_position - (
+                    (1 - note.rect.y / note.perfect_hit_position)
+                    * game.settings.time_to_react
+                )
+                skew_samples.append((wall, shown, paused))
+                break
+    game.audioPlayer.mixer.music.stop()
+    game.preview_player.stop(fade=False)
+    game.leaderboard.close()
+    game.writer.close()
+    pygame.quit()
+    storage.cleanup()
+
+    samples = np.asarray(clock_samples, dtype=np.float64)
+    segments = [samples[samples[:, 2] == 0], samples[samples[:, 2] == 1]]
+    fits = [fit_clock(segment[:, :2]) for segment in segments]
+
+    positions = samples[:, 1]
+    changed = np.nonzero(np.diff(positions) != 0)[0] + 1
+    steps = np.diff(positions[changed]) if changed.size else np.zeros(0)
+    change_times = samples[changed, 0]
+    stalls = np.diff(change_times) if change_times.size else np.zeros(0)
+
+    pause_jump = 0.0
+    if len(segments[1]):
+        resumed = segments[1][0, 0]
+        pause_jump = (fits[1][0] - fits[0][0]) * resumed + fits[1][1] - fits[0][1]
+
+    skews = []
+    table = game.spawner.scroll_table
+    for wall, shown, segment_index in skew_samples:
+        slope, intercept = fits[int(segment_index)]
+        expected = table.get_position(slope * wall + intercept)
+        skews.append(shown - expected)
+
+    return {
+        "frames": len(samples),
+        "stale_frames": float(1 - changed.size / max(len(samples) - 1, 1)),
+        "clock_step_ms": get_percentiles(steps),
+        "clock_stall_ms": get_percentiles(stalls),
+        "drift_ms_per_minute": (fits[0][0] - 1) * 60000,
+        "drift_after_resume_ms_per_minute": (fits[1][0] - 1) * 60000,
+        "pause_jump_ms": float(pause_jump),
+        "frame_skew_ms": get_percentiles(skews),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure audio/video sync drift.")
+    parser.add_argument("chart", help="chart folder name")
+    parser.add_argument("--difficulty", type=int, default=0, help="difficulty index")
+    parser.add_argument("--seconds", type=float, default=10.0, help="playing time")
+    parser.add_argument("--pause-at", type=float, default=5.0, help="pause time")
+    parser.add_argument("--pause", type=float, default=1.0, help="pause length")
+    parser.add_argument(
+        "--real-audio", action="store_true", help="use the real audio device"
+    )
+    arguments = parser.parse_args()
+    results = run_sync_diagnostic(
+        arguments.chart,
+        arguments.difficulty,
+        arguments.seconds,
+        arguments.pause_at,
+        arguments.pause,
+        arguments.real_audio,
+    )
+    for name, value in results.items():
+        if isinstance(value, dict):
+            value = ", ".join(f"{key} {round(item, 2)}" for key, item in value.items())
+            print(f"{name}: {value}")
+        else:
+            print(f"{name}: {round(value, 2)}")
@@ -0,0 +1,208 @@
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+
+class LeaderboardService:
+    """The class used to represent the state of a stand-in leaderboard service.
+
+    Results are kept in memory. Every leaderboard remembers the version at
+    which it last changed, so clients can ask for the boards that changed
+    after the version they saw last. A result that is uploaded again with
+    new values replaces the old one, even if it moved to another board.
+
+    Methods
+    -------
+    add_results(cabinet_id, results)
+        Used to add uploaded results.
+    get_changed_boards(since, count)
+        Used to get the leaderboards that changed after a version.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.version = 0
+        self.results = dict()
+        self.boards = dict()
+
+    def add_results(self, cabinet_id: str, results: list) -> int:
+        """Used to add uploaded results.
+
+        Results the service already has unchanged are ignored, so a batch can
+        safely be sent again.
+
+        Parameters
+        ----------
+        cabinet_id : str
+            Id of the uploading cabinet.
+        results : list
+            Uploaded results.
+
+        Returns
+        ----------
+        int
+            Number of new or changed results.
+        """
+        added = 0
+        with self.lock:
+            for result in results:
+                key = (cabinet_id, result["id"])
+                old_result = self.results.get(key)
+                if old_result == result:
+                    continue
+                self.results[key] = result
+                self.version += 1
+                if old_result is not None:
+                    old_board = self.boards[
+                        (old_result["chart_hash"], old_result["difficulty"])
+                    ]
+                    old_board["results"].remove(old_result)
+                    old_board["version"] = self.version
+                board = self.boards.setdefault(
+                    (result["chart_hash"], result["difficulty"]),
+                    {"version": 0, "results": []},
+                )
+                board["version"] = self.version
+                board["results"].append(result)
+                board["results"].sort(key=lambda item: item["score"], reverse=True)
+                added += 1
+        return added
+
+    def get_changed_boards(self, since: int, count: int) -> dict:
+        """Used to get the leaderboards that changed after a version.
+
+        Parameters
+        ----------
+        since : int
+            Version the client saw last.
+        count : int
+            Number of best results of every board.
+
+        Returns
+        ----------
+        dict
+            Current version and the changed boards with their best results.
+        """
+        with self.lock:
+            boards = [
+                {
+                    "chart_hash": chart_hash,
+                    "difficulty": difficulty,
+                    "top": [
+                        {
+                            "player_name": result["player_name"],
+                            "score": result["score"],
+                            "accuracy": result["accuracy"],
+                        }
+                        for result in board["results"][:count]
+                    ],
+                }
+                for (chart_hash, difficulty), board in self.boards.items()
+                if board["version"] > since
+            ]
+            return {"cursor": self.version, "boards": boards}
+
+
+class SyncRequestHandler(BaseHTTPRequestHandler):
+    """The class used to answer the requests of sync clients.
+
+    HTTP/1.1 is used, so clients can keep their connections open. With a
+    failure rate set, requests are randomly answered with 503 to exercise
+    client retries.
+
+    Methods
+    -------
+    send_json(status, data)
+        Used to send a JSON response.
+    do_GET()
+        Used to answer leaderboard pulls.
+    do_POST()
+        Used to accept uploaded results.
+    """
+
+    protocol_version = "HTTP/1.1"
+    service = None
+    failure_rate = 0.0
+
+    def send_json(self, status: int, data: dict) -> None:
+        """Used to send a JSON response.
+
+        Parameters
+        ----------
+        status : int
+            HTTP status code.
+        data : dict
+            Response body.
+        """
+        content = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        if random.random() < self.failure_rate:
+            self.send_json(503, {"error": "unavailable"})
+        elif parts.path != "/top":
+            self.send_json(404, {"error": "not found"})
+        else:
+            query = parse_qs(parts.query)
+            since = int(query.get("since", ["0"])[0])
+            count = int(query.get("count", ["10"])[0])
+            self.send_json(200, self.service.get_changed_boards(since, count))
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if random.random() < self.failure_rate:
+            self.send_json(503, {"error": "unavailable"})
+        elif self.path != "/scores":
+            self.send_json(404, {"error": "not found"})
+        else:
+            added = self.service.add_results(body["cabinet_id"], body["results"])
+            self.send_json(200, {"added": added})
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def create_server(port: int = 8765, failure_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Used to create a stand-in leaderboard server.
+
+    Parameters
+    ----------
+    port : int
+        Port to listen on, 0 for any free port.
+    failure_rate : float
+        Share of requests that are answered with 503.
+
+    Returns
+    ----------
+    ThreadingHTTPServer
+        Server that is ready to serve_forever.
+    """
+    handler = type(
+        "Handler",
+        (SyncRequestHandler,),
+        {"service": LeaderboardService(), "failure_rate": failure_rate},
+    )
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local leaderboard service.")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on")
+    parser.add_argument(
+        "--failure-rate", type=float, default=0.0, help="share of failed requests"
+    )
+    arguments = parser.parse_args()
+    server = create_server(arguments.port, arguments.failure_rate)
+    print(f"Serving the leaderboard on http://127.0.0.1:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
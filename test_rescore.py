@@ -0,0 +1,84 @@
+import enums
+import performance
+import rescore
+
+
+def get_hit_log(note_timings: list, note_lanes: list, errors: list) -> dict:
+    """Used to get the hit log of a play that hit every note.
+
+    Parameters
+    ----------
+    note_timings : list
+        Timings of all notes.
+    note_lanes : list
+        Lanes of all notes.
+    errors : list
+        Hit error of every note.
+
+    Returns
+    ----------
+    dict
+        Hit log without stray presses.
+    """
+    return {
+        "errors": errors,
+        "timings": note_timings,
+        "lanes": note_lanes,
+        "stray_errors": [],
+        "stray_timings": [],
+    }
+
+
+def test_full_combo_is_rescored_as_one():
+    note_timings = [index * 500 for index in range(20)]
+    note_lanes = [index % 4 + 1 for index in range(20)]
+    hit_log = get_hit_log(note_timings, note_lanes, [0.0] * 20)
+
+    _, accuracy, max_combo, judgement_counts = rescore.rescore_hits(
+        hit_log, note_timings, note_lanes
+    )
+
+    assert max_combo == 20
+    assert accuracy == 100.0
+    assert judgement_counts[enums.Judgement.PERFECT] == 20
+
+
+def test_stray_presses_are_replayed_as_misses():
+    note_timings = [index * 500 for index in range(20)]
+    note_lanes = [index % 4 + 1 for index in range(20)]
+    hit_log = get_hit_log(note_timings, note_lanes, [0.0] * 20)
+    hit_log["stray_timings"] = [2500, 5000, 7500, 9000]
+    hit_log["stray_errors"] = [-300.0, -300.0, -300.0, -300.0]
+
+    _, accuracy, max_combo, judgement_counts = rescore.rescore_hits(
+        hit_log, note_timings, note_lanes
+    )
+
+    assert judgement_counts == [20, 0, 0, 4]
+    assert round(accuracy, 2) == 83.33
+    assert max_combo == 5
+
+
+def test_replay_matches_the_game():
+    note_timings = [index * 500 for index in range(8)]
+    note_lanes = [index % 4 + 1 for index in range(8)]
+    errors = [0.0, 50.0, -90.0, 10.0, 0.0, 0.0, 20.0, -30.0]
+    player_performance = performance.Performance("player", len(note_timings))
+    presses = list(zip(note_timings, note_lanes, errors))
+    presses.insert(3, (note_timings[3], None, -200.0))
+    for timing, lane, error in presses:
+        judgement = performance.get_judgement(error)
+        player_performance.add_score(judgement)
+        player_performance.update_combo(judgement)
+        player_performance.update_hits_counter(judgement)
+        if lane is None:
+            player_performance.record_stray(error, timing)
+        else:
+            player_performance.record_hit(error, lane, timing)
+
+    score, _, _, judgement_counts = rescore.rescore_hits(
+        player_performance.get_hit_log(), note_timings, note_lanes
+    )
+
+    assert score == player_performance.score
+    assert judgement_counts == player_performance.get_judgement_counts()
@@ -0,0 +1,155 @@
+import itertools
+import os
+import tempfile
+import threading
+
+
+def write_text_atomic(file_path: str, content: str) -> None:
+    """Used to replace the content of a file in one step.
+
+    The content is written to a temporary file in the same directory, which
+    is then renamed over the target, so readers never see a partial file.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file.
+    content : str
+        New content of the file.
+
+    Raises
+    ------
+    OSError
+        Unable to write the file.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w") as temporary_file:
+            temporary_file.write(content)
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+        os.replace(temporary_path, file_path)
+    except OSError:
+        if os.path.isfile(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+class BackgroundWriter:
+    """The class used to run disk writes on a single background thread.
+
+    Jobs are queued under a key. A job that is queued again under the same
+    key before it ran replaces the waiting one, so bursts of saves of the
+    same file are coalesced into one write.
+
+    Methods
+    -------
+    submit(key, job, *arguments)
+        Used to queue a write.
+    submit_unique(job, *arguments)
+        Used to queue a write that is never coalesced.
+    write_text(file_path, content)
+        Used to queue an atomic file write.
+    run()
+        Used to run queued jobs until the writer is closed.
+    flush()
+        Used to wait until all queued jobs ran.
+    close()
+        Used to run all queued jobs and stop the thread.
+    """
+
+    def __init__(self) -> None:
+        self.pending = dict()
+        self.condition = threading.Condition()
+        self.busy = False
+        self.closed = False
+        self.unique_keys = itertools.count()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, key, job, *arguments) -> None:
+        """Used to queue a write.
+
+        Parameters
+        ----------
+        key : hashable
+            Key of the write. A waiting job with the same key is replaced.
+        job : callable
+            Function that performs the write.
+        *arguments
+            Arguments of the function.
+
+        Raises
+        ------
+        RuntimeError
+            The writer is closed.
+        """
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("The writer is closed.")
+            self.pending.pop(key, None)
+            self.pending[key] = (job, arguments)
+            self.condition.notify_all()
+
+    def submit_unique(self, job, *arguments) -> None:
+        """Used to queue a write that is never coalesced.
+
+        Parameters
+        ----------
+        job : callable
+            Function that performs the write.
+        *arguments
+            Arguments of the function.
+        """
+        self.submit(("unique", next(self.unique_keys)), job, *arguments)
+
+    def write_text(self, file_path: str, content: str) -> None:
+        """Used to queue an atomic file write.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to the file.
+        content : str
+            New content of the file.
+        """
+        self.submit(
+            ("file", os.path.abspath(file_path)), write_text_atomic, file_path, content
+        )
+
+    def run(self) -> None:
+        """Used to run queued jobs until the writer is closed.
+
+        A failing job is reported and skipped, so it never stops the thread.
+        """
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                key = next(iter(self.pending))
+                job, arguments = self.pending.pop(key)
+                self.busy = True
+            try:
+                job(*arguments)
+            except Exception as error:
+                print(f"Caught {type(error)}: error")
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def flush(self) -> None:
+        """Used to wait until all queued jobs ran."""
+        with self.condition:
+            while self.pending or self.busy:
+                self.condition.wait()
+
+    def close(self) -> None:
+        """Used to run all queued jobs and stop the thread."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()